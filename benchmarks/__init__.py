@@ -0,0 +1 @@
+# Offline benchmarks for Vibe Travel. Run a module with: python -m benchmarks.<name>
@@ -0,0 +1,97 @@
+# Measures the export turn with sections passed by value (the model re-emits every section as a tool
+# argument) against passing them by reference through the session artifact store (my_agent/artifacts.py).
+#
+# The model side is estimated from the function-call arguments the model has to generate: output tokens,
+# and decode time at --decode-tokens-per-second. The tool side runs export_trip_plan_to_google_doc against
+# the local fakes both ways and checks that the same document content reaches the Docs API.
+#
+# Usage: python -m benchmarks.bench_artifacts [--days 7] [--decode-tokens-per-second 80] [--backend memory|sqlite]
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from benchmarks.fakes import Counters, fake_trip_sections
+
+
+class _Context:
+    """Stand-in for the ADK ToolContext: session state plus the session ID."""
+
+    def __init__(self, session_id: str):
+        self.state: Dict[str, Any] = {}
+        self.session = SimpleNamespace(id=session_id)
+
+
+def _call_tokens(args: Dict[str, Any]) -> int:
+    from my_agent.context import estimate_tokens
+
+    return estimate_tokens(json.dumps({"name": "export_trip_plan_to_google_doc", "args": args}))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export turn cost with sections by value vs by artifact key.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--decode-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--tavily-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import artifacts, tools
+
+    sections = fake_trip_sections(args.days)
+    by_value = dict(sections, document_title="Paris Trip")
+    by_reference = {"document_title": "Paris Trip"}
+
+    counters = Counters()
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        artifacts._store = artifacts.ArtifactStore(os.path.join(data_dir, "artifacts.sqlite3") if args.backend == "sqlite" else None)
+        context = _Context("bench-session")
+        # What save_agent_outputs stores once the sub-agents have run
+        for key, text in sections.items():
+            artifacts.save_artifact(context, "food_data" if key == "food_recommendations_data" else key, text)
+
+        outcomes = {}
+        for label, call_args in (("by value", by_value), ("by key", by_reference)):
+            counters.reset()
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                result = tools.export_trip_plan_to_google_doc(**call_args, tool_context=context)
+                timings.append((time.perf_counter() - start) * 1000)
+                if result["status"] != "success":
+                    print(f"{label}: export failed: {result['message']}")
+                    return 1
+            _, sent = counters.snapshot()
+            tokens = _call_tokens(call_args)
+            outcomes[label] = (tokens, sent.get("google", 0))
+            print(f"{label:<9} output tokens={tokens:6d}  decode={tokens / args.decode_tokens_per_second * 1000:8.1f} ms  "
+                  f"tool p50={statistics.median(timings):6.2f} ms  docs bytes/run={sent.get('google', 0) / args.runs:8.0f}")
+
+        # A key that names an artifact this conversation has not saved is an error, not section text
+        missing = tools.export_trip_plan_to_google_doc(itinerary_data="itinerary_data", tool_context=_Context("other-session"))
+        print(f"missing   {missing['status']}: {missing.get('message')}")
+        if missing["status"] != "error":
+            return 1
+
+    (value_tokens, value_bytes), (key_tokens, key_bytes) = outcomes["by value"], outcomes["by key"]
+    saved_ms = (value_tokens - key_tokens) / args.decode_tokens_per_second * 1000
+    print(f"export turn: {value_tokens - key_tokens} fewer output tokens ({1 - key_tokens / value_tokens:.0%}), "
+          f"~{saved_ms:.0f} ms less decoding; artifact store {artifacts.artifact_stats()}")
+    if value_bytes != key_bytes:
+        print("documents differ between the two ways of passing the sections")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# Benchmarks the budget engine (my_agent/budget.py): one vectorized pass over a scenario grid against
+# the per-scenario Python arithmetic it replaces, and the latency of the compare_budget_scenarios tool.
+#
+# Usage: python -m benchmarks.bench_budget [--tiers 20] [--lengths 30] [--currencies 10] [--runs 20]
+import argparse
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from my_agent.budget import CATEGORIES, budget_table, compare_budget_scenarios, get_exchange_rates
+
+
+def scalar(costs: np.ndarray, budget: float, fx: np.ndarray) -> List[tuple]:
+    rows = []
+    for tier in costs.tolist():
+        for categories in tier:
+            total = sum(categories)
+            difference = budget - total
+            rows.append((total, difference, difference / budget * 100, [total * rate for rate in fx.tolist()]))
+    return rows
+
+
+def _best_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vectorized budget engine benchmark.")
+    parser.add_argument("--tiers", type=int, default=20)
+    parser.add_argument("--lengths", type=int, default=30)
+    parser.add_argument("--currencies", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(3)
+    rates = get_exchange_rates()
+    fx = rates.vector(rates.codes[:args.currencies])
+    costs = rng.uniform(20, 400, (args.tiers, args.lengths, len(CATEGORIES)))
+    budget = 3000.0
+
+    figures = budget_table(costs, np.array(budget))
+    rows = scalar(costs, budget, fx)
+    if not np.allclose(figures["total"].ravel(), [row[0] for row in rows]):
+        print("vectorized totals differ from the scalar loop")
+        return 1
+
+    scenarios = args.tiers * args.lengths * len(fx)
+    vectorized = _best_ms(lambda: budget_table(costs, np.array(budget))["total"][..., None] * fx, args.runs)
+    looped = _best_ms(lambda: scalar(costs, budget, fx), args.runs)
+    print(f"grid     {scenarios} scenarios: numpy {vectorized:.3f} ms, python loop {looped:.3f} ms ({looped / vectorized:.1f}x)")
+
+    tiers = {f"tier {i}": float(rate) for i, rate in enumerate(rng.uniform(40, 400, min(args.tiers, 10)))}
+    tool = _best_ms(lambda: compare_budget_scenarios(budget, 600, tiers, list(range(2, 16)), 40, 30,
+                                                     rates.codes[:min(args.currencies, 5)]), args.runs)
+    print(f"tool     compare_budget_scenarios({len(tiers)} tiers x 14 lengths x {min(args.currencies, 5)} currencies): {tool:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Benchmarks the offline destination index (my_agent/destinations.py) on a large synthetic dataset.
+#
+# Places are scattered around the bundled destinations (dense clusters) and uniformly over the globe, with
+# random interest tags and costs. Reports build/save/load cost, the .npz size and query latency of the grid
+# index against a brute-force scan of every place, and checks that both return the same top k.
+#
+# Usage: python -m benchmarks.bench_destinations [--places 150000] [--queries 500] [--k 5]
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from my_agent.destinations import DESTINATIONS_PATH, DestinationIndex, haversine_km
+
+
+def synthetic_records(places: int, seed: int = 7) -> list:
+    seeds = DestinationIndex.from_csv(DESTINATIONS_PATH)
+    tags = [str(tag) for tag in seeds.tag_names]
+    rng = np.random.default_rng(seed)
+    clustered = places * 3 // 4
+    anchors = rng.integers(0, len(seeds), clustered)
+    lat = np.concatenate([seeds.lat[anchors] + rng.normal(0, 1.5, clustered),
+                          np.degrees(np.arcsin(rng.uniform(-1, 1, places - clustered)))])
+    lon = np.concatenate([seeds.lon[anchors] + rng.normal(0, 1.5, clustered), rng.uniform(-180, 180, places - clustered)])
+    lat = np.clip(lat, -89.9, 89.9)
+    lon = (lon + 180) % 360 - 180
+    costs = rng.lognormal(4.8, 0.5, places)
+    tag_counts = rng.integers(1, 6, places)
+    return [
+        (f"Place {i}", "Synthetia", float(lat[i]), float(lon[i]), float(costs[i]),
+         [tags[t] for t in rng.choice(len(tags), tag_counts[i], replace=False)])
+        for i in range(places)
+    ]
+
+
+def brute_force(index: DestinationIndex, lat: float, lon: float, interests: List[str], k: int) -> List[str]:
+    mask, _ = index.tag_mask(interests)
+    wanted = bin(int(mask)).count("1")
+    coverage = np.bitwise_count(index.tags & mask) / wanted if wanted else np.ones(len(index))
+    distance = haversine_km(lat, lon, index.lat, index.lon)
+    rank = np.where(coverage > 0, distance * (2 - coverage), np.inf)
+    top = np.argsort(rank)[:k]
+    return [index.name(int(i)) for i in top if np.isfinite(rank[i])]
+
+
+def _ms(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    return f"p50={statistics.median(ordered):7.3f} ms  p95={ordered[int(0.95 * (len(ordered) - 1))]:7.3f} ms"
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Destination index build and query benchmark.")
+    parser.add_argument("--places", type=int, default=150_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    records = synthetic_records(args.places)
+    start = time.perf_counter()
+    index = DestinationIndex.from_records(records)
+    print(f"build    {len(index)} places in {time.perf_counter() - start:.2f}s ({len(index.tag_names)} tags)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "places.npz")
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        index = DestinationIndex.load(path)
+        print(f"save     {saved * 1000:.1f} ms, load {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{os.path.getsize(path) / len(index):.1f} bytes/place ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    rng = np.random.default_rng(11)
+    tags = [str(tag) for tag in index.tag_names]
+    queries = []
+    for _ in range(args.queries):
+        anchor = int(rng.integers(0, len(index)))
+        queries.append((float(index.lat[anchor]) + rng.normal(0, 0.5), float(index.lon[anchor]) + rng.normal(0, 0.5),
+                        [tags[t] for t in rng.choice(len(tags), int(rng.integers(0, 4)), replace=False)]))
+
+    indexed, scanned, mismatches, scored = [], [], 0, []
+    for lat, lon, interests in queries:
+        lat = max(min(lat, 89.9), -89.9)
+        lon = (lon + 180) % 360 - 180
+        start = time.perf_counter()
+        result = index.nearest(lat, lon, interests, k=args.k)
+        indexed.append((time.perf_counter() - start) * 1000)
+        scored.append(result["candidates_scored"])
+        start = time.perf_counter()
+        expected = brute_force(index, lat, lon, interests, args.k)
+        scanned.append((time.perf_counter() - start) * 1000)
+        got = [place["name"] for place in result["destinations"]]
+        # Equal-rank ties may come back in either order
+        mismatches += sorted(got) != sorted(expected)
+    print(f"grid     {_ms(indexed)}  (median {statistics.median(scored):.0f} of {len(index)} places scored)")
+    print(f"scan     {_ms(scanned)}")
+    print(f"top-{args.k} mismatches against the full scan: {mismatches} of {len(queries)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
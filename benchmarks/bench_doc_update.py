@@ -0,0 +1,68 @@
+# Compares updating an exported trip document in place (document_id, my_agent/docs_sections.py) with
+# exporting a new document, against the local fakes. The fake Docs API applies the requests to an
+# in-memory document, so each updated document is also checked against a fresh export of the same content.
+#
+# Usage: python -m benchmarks.bench_doc_update [--days 7] [--google-latency 0.03]
+import argparse
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import Counters, FakeGoogleHttp, fake_trip_sections
+
+
+def _edited(sections: Dict[str, str], key: str) -> Dict[str, str]:
+    changed = dict(sections)
+    changed[key] = sections[key].replace("Hotel 1", "Hôtel du Louvre").replace("4 stars", "5 stars") + "\n* _Late checkout_"
+    return changed
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="In-place section updates against new document exports.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--tavily-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.03)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import docs_sections, tools
+
+    counters = Counters()
+    sections = fake_trip_sections(args.days)
+    hotels_changed = _edited(sections, "hotel_data")
+    failures = 0
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        docs_sections._manifests = docs_sections.DocManifests(f"{data_dir}/doc_manifests.sqlite3")
+        document_id = tools.export_trip_plan_to_google_doc(document_title="Trip", **sections)["document_id"]
+
+        def run(label: str, **kwargs) -> dict:
+            counters.reset()
+            start = time.perf_counter()
+            result = tools.export_trip_plan_to_google_doc(document_title="Trip", **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+            calls, sent = counters.snapshot()
+            print(f"{label:<22} calls={calls.get('google', 0)}  bytes sent={sent.get('google', 0):6d}  {elapsed:7.1f} ms  "
+                  f"{result.get('message', '')}")
+            return result
+
+        run("new document", **hotels_changed)
+        run("update, unchanged", document_id=document_id, **sections)
+        run("update, hotels edited", document_id=document_id, **hotels_changed)
+        run("update, food edited", document_id=document_id, **dict(hotels_changed, food_recommendations_data="* **Chez Nous**: bistro"))
+
+        expected = tools.export_trip_plan_to_google_doc(
+            document_title="Expected", **dict(hotels_changed, food_recommendations_data="* **Chez Nous**: bistro"))["document_id"]
+        updated, fresh = FakeGoogleHttp.documents[document_id], FakeGoogleHttp.documents[expected]
+        if updated.paragraphs() != fresh.paragraphs():
+            print("the updated document differs from a fresh export of the same content")
+            failures += 1
+        else:
+            print("updated document matches a fresh export of the same content")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
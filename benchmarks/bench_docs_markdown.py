@@ -0,0 +1,170 @@
+# Compares the old per-segment markdown request generator with my_agent.docs_markdown
+# on large synthetic itineraries: request counts, payload bytes, batches and compile time.
+#
+# Usage: python -m benchmarks.bench_docs_markdown
+import json
+import re
+import time
+
+from my_agent.docs_markdown import compile_sections
+
+
+# --- Previous implementation (from my_agent/tools.py), kept here as the baseline
+def _legacy_markdown_requests(text_content: str, start_index: int) -> (list, int): # type: ignore
+    """
+    Parses text_content for markdown (bold, italics, bullets) and generates Google Docs API requests.
+    Returns a list of requests and the new current_index after this content.
+    """
+    requests = []
+    current_doc_index = start_index
+
+    for line_with_ending in text_content.splitlines(keepends=True):
+        line_content = line_with_ending.rstrip('\r\n')
+        has_newline = line_with_ending.endswith(('\n', '\r\n'))
+
+        line_start_index_for_paragraph_styling = current_doc_index
+        is_bullet_line = False
+
+        # Handle bullet points
+        bullet_marker_match = re.match(r"^(\*\s+)", line_content) # Only match lines starting with "* "
+        if bullet_marker_match:
+            is_bullet_line = True
+            # Insert the bullet marker text itself, but don't style it yet
+            # The createParagraphBullets will handle the visual bullet
+            # We just need to insert the text content after the marker
+            content_after_bullet = line_content[len(bullet_marker_match.group(1)):].lstrip()
+            text_to_process_inline = content_after_bullet
+        else:
+            text_to_process_inline = line_content
+
+        # Process inline markdown (bold, italics)
+        # Regex to find **bold** or *italic* or _italic_
+        # It captures the content inside the markdown
+        parts = re.split(r'(\*\*.*?\*\*|\*.*?\*|_.*?_)', text_to_process_inline)
+ 
+        for part in parts:
+            if not part:
+                continue
+ 
+            is_bold_segment = False
+            is_italic_segment = False
+            actual_text_to_insert = part
+ 
+            if part.startswith('**') and part.endswith('**') and len(part) > 4:
+                actual_text_to_insert = part[2:-2]
+                is_bold_segment = True
+            elif (part.startswith('*') and part.endswith('*') and len(part) > 2) or \
+                 (part.startswith('_') and part.endswith('_') and len(part) > 2):
+                actual_text_to_insert = part[1:-1]
+                is_italic_segment = True
+ 
+            if actual_text_to_insert:
+                requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': actual_text_to_insert}})
+                # Always apply text style to explicitly set/unset bold and italic for the segment
+                requests.append({'updateTextStyle': {
+                    'range': {'startIndex': current_doc_index, 'endIndex': current_doc_index + len(actual_text_to_insert)},
+                    'textStyle': {
+                        'bold': is_bold_segment,
+                        'italic': is_italic_segment
+                        # Other styles like underline, strikethrough, etc., default to false/unset
+                        # unless explicitly handled.
+                    },
+                    'fields': "bold,italic" # Specify that we are updating bold and italic properties
+                }})
+                current_doc_index += len(actual_text_to_insert)
+ 
+        # Add the newline character if the original line had one
+        if has_newline:
+            requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': '\n'}})
+            current_doc_index += 1
+        # If it's a bullet line with no actual text content (e.g., "* "),
+        # and it didn't have a newline from the source (meaning it's the last line of input),
+        # we must insert a newline to make it a paragraph for the bullet style to apply correctly.
+        elif is_bullet_line and not text_to_process_inline and not has_newline:
+            requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': '\n'}})
+            current_doc_index += 1
+ 
+        # Apply bullet paragraph style if it was a bullet line.
+        # current_doc_index is now at the end of the paragraph (after its newline, if any).
+        # line_start_index_for_paragraph_styling is at the beginning of the paragraph's text content.
+        if is_bullet_line:
+            if current_doc_index > line_start_index_for_paragraph_styling: # Ensure the paragraph has content
+                requests.append({'createParagraphBullets': {
+                    'range': {
+                        'startIndex': line_start_index_for_paragraph_styling,
+                        'endIndex': current_doc_index # This range includes the paragraph's own newline
+                    },
+                    'bulletPreset': 'BULLET_DISC_CIRCLE_SQUARE' # Or other presets
+                }})
+    return requests, current_doc_index
+
+
+def _legacy_document_requests(sections):
+    requests = []
+    current_index = 1
+    for title, data_content in sections:
+        heading_text = f"{title}\n"
+        requests.append({'insertText': {'location': {'index': current_index}, 'text': heading_text}})
+        requests.append({'updateParagraphStyle': {
+            'range': {'startIndex': current_index, 'endIndex': current_index + len(heading_text) - 1},
+            'paragraphStyle': {'namedStyleType': 'HEADING_1'}, 'fields': 'namedStyleType'}})
+        requests.append({'updateTextStyle': {
+            'range': {'startIndex': current_index, 'endIndex': current_index + len(heading_text) - 1},
+            'textStyle': {'bold': True}, 'fields': 'bold'}})
+        current_index += len(heading_text)
+        data_requests, current_index = _legacy_markdown_requests(data_content, current_index)
+        requests.extend(data_requests)
+        if data_content and not data_content.endswith('\n'):
+            requests.append({'insertText': {'location': {'index': current_index}, 'text': "\n"}})
+            current_index += 1
+    return requests
+
+
+def _itinerary(days: int) -> list:
+    flights = "\n".join(
+        f"**Airline:** Air {i}\n* Route: _LAX_ to **CDG**\n* Price: **${300 + i}**\n* Notes: *non-stop*, 11h" for i in range(5)
+    )
+    hotels = "\n".join(
+        f"**Hotel Name:** Grand Hotel {i}\n* Rating: _4 stars_\n* Amenities:\n  * Pool\n  * Gym\n* Price: **${120 + i}/night**"
+        for i in range(8)
+    )
+    itinerary = "\n".join(
+        f"**Day {d}:**\n"
+        f"* _Morning:_ Visit the **Eiffel Tower** and walk along the *Seine* (about $30)\n"
+        f"* _Afternoon:_ Explore the *Louvre Museum*, see the **Mona Lisa** and _Winged Victory_\n"
+        f"* _Evening:_ Dinner in **Le Marais** followed by a river cruise 🚢\n"
+        f"Tip: buy the **Paris Museum Pass** to skip lines; metro tickets cost *€2.15*."
+        for d in range(1, days + 1)
+    )
+    food = "\n".join(
+        f"**Restaurant Name:** Bistro {i}\n* Cuisine: French\n* Notes: _Classic Parisian cafe, great for lunch near the Louvre._"
+        for i in range(days * 2)
+    )
+    return [("Flights", flights), ("Hotels", hotels), ("Itinerary", itinerary), ("Food", food)]
+
+
+def _payload_bytes(requests: list) -> int:
+    return len(json.dumps({'requests': requests}))
+
+
+def main() -> None:
+    print(f"{'days':>5} {'impl':<8} {'requests':>9} {'bytes':>10} {'batches':>8} {'compile ms':>11}")
+    for days in (3, 14, 60, 240):
+        sections = _itinerary(days)
+
+        start = time.perf_counter()
+        legacy = _legacy_document_requests(sections)
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        batches = list(compile_sections(sections).batches())
+        compiled_ms = (time.perf_counter() - start) * 1000
+        compiled = [request for batch in batches for request in batch]
+
+        print(f"{days:>5} {'legacy':<8} {len(legacy):>9} {_payload_bytes(legacy):>10} {1:>8} {legacy_ms:>11.2f}")
+        print(f"{days:>5} {'compiled':<8} {len(compiled):>9} {sum(_payload_bytes(b) for b in batches):>10} "
+              f"{len(batches):>8} {compiled_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
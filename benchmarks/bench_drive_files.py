@@ -0,0 +1,117 @@
+# Measures cleaning up agent-created Drive files (my_agent/drive_files.py) with the local fakes: deleting them
+# one request per file, as delete_google_file_by_id does, against the garbage collector's batch requests.
+# Then checks that the collector only deletes files past the TTL, keeps going when individual deletions in a
+# batch are throttled, and stays within the configured drive rate limit.
+#
+# Usage: python -m benchmarks.bench_drive_files [--files 400] [--google-latency 0.05] [--concurrency 4]
+import argparse
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fakes import Counters, FakeGoogleHttp, FaultInjector, fake_trip_sections
+
+
+DAY = 24 * 60 * 60
+
+
+def _register(count: int, prefix: str, age_days: float) -> List[str]:
+    from my_agent import drive_files
+
+    created_at = time.time() - age_days * DAY
+    file_ids = [f"{prefix}-{i}" for i in range(count)]
+    for file_id in file_ids:
+        drive_files.get_created_files().add(file_id, "document", f"Trip {file_id}", "bench-user", "bench-session", created_at)
+    return file_ids
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="One-by-one Drive deletion against batched garbage collection.")
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--single-files", type=int, default=40, help="files deleted one request at a time")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.1, help="share of deletions answered with 429/503")
+    parser.add_argument("--drive-rate", type=float, default=400.0, help="drive requests per second in the rate-limited run")
+    parser.add_argument("--tavily-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import docs_sections, drive_files, export_jobs, google_clients, resilience, tools
+
+    counters = Counters()
+    failures = 0
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        docs_sections._manifests = docs_sections.DocManifests(f"{data_dir}/doc_manifests.sqlite3")
+
+        # Exports register what they create, including those run as jobs for a conversation
+        sections = fake_trip_sections(days=2)
+        with drive_files.created_for("bench-user", "bench-session"):
+            doc = tools.export_trip_plan_to_google_doc(document_title="Registered doc", **sections)
+        export_jobs._jobs = export_jobs.ExportJobs(f"{data_dir}/export_jobs.sqlite3", workers=1)
+        job_id = export_jobs.get_export_jobs().submit("google_sheet", {
+            "financial_data": {"Flights": 400, "Hotels": 600, "Budget": 1500}, "spreadsheet_title": "Registered sheet",
+            "origin": ["job-user", "job-session"]})
+        export_jobs.get_export_jobs().wait(job_id, 10)
+        registered = {file["title"]: file for file in drive_files.get_created_files().list()}
+        print(f"registry  doc owner={registered['Registered doc']['owner']}  "
+              f"sheet owner={registered['Registered sheet']['owner']} session={registered['Registered sheet']['scope']}")
+        failures += 0 if (registered["Registered doc"]["file_id"] == doc["document_id"]
+                          and registered["Registered sheet"]["scope"] == "job-session") else 1
+
+        single = _register(args.single_files, "single", age_days=40)
+        start = time.perf_counter()
+        calls_before = counters.snapshot()[0].get("google", 0)
+        for file_id in single:
+            tools.delete_google_file_by_id(file_id)
+        elapsed = time.perf_counter() - start
+        requests = counters.snapshot()[0].get("google", 0) - calls_before
+        print(f"single    {len(single):4d} files  {requests:4d} requests  {elapsed:6.2f}s  {len(single) / elapsed:7.1f} files/s")
+
+        expired = _register(args.files, "old", age_days=40)
+        fresh = _register(20, "new", age_days=1)
+        start = time.perf_counter()
+        calls_before = counters.snapshot()[0].get("google", 0)
+        totals = drive_files.collect_garbage(ttl_seconds=30 * DAY, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        requests = counters.snapshot()[0].get("google", 0) - calls_before
+        print(f"gc        {totals['total']:4d} files  {requests:4d} requests  {elapsed:6.2f}s  {totals['total'] / elapsed:7.1f} files/s  "
+              f"batches={totals['batches']}  deleted={len(totals['deleted'])}  failed={len(totals['failed'])}")
+        left = set(drive_files.get_created_files().expired(time.time(), scope="bench-session"))
+        failures += 0 if len(totals["deleted"]) == len(expired) and set(fresh) <= left and not left & set(expired) else 1
+
+        # Injected 429s and 503s on individual deletions of a batch are retried; already deleted files count as gone
+        faults = FaultInjector(error_rate=args.error_rate, retry_after=0.02)
+        google_clients.registry = google_clients.GoogleClientRegistry(
+            credentials_factory=google_clients.registry._credentials_factory,
+            http_factory=lambda credentials: FakeGoogleHttp(counters, latency=args.google_latency, faults=faults))
+        flaky = _register(args.files, "flaky", age_days=40) + expired[:10]
+        totals = drive_files.delete_files(flaky, concurrency=args.concurrency)
+        print(f"faults    {totals['total']:4d} files  injected={faults.injected}  deleted={len(totals['deleted'])}  "
+              f"not found={len(totals['not_found'])}  failed={len(totals['failed'])}")
+        # A deletion throttled on every attempt is reported as failed and stays registered for the next run
+        accounted = len(totals["deleted"]) + len(totals["not_found"]) + len(totals["failed"]) == len(flaky)
+        failures += 0 if accounted and len(totals["not_found"]) == 10 and len(totals["failed"]) <= len(flaky) // 100 else 1
+
+        # With a drive rate limit, each batch draws one token per deletion
+        faults.error_rate = 0.0
+        resilience.RATE_LIMITS = f"drive={args.drive_rate:g}:100"
+        resilience._upstreams.clear()
+        limited = _register(args.files, "limited", age_days=40)
+        start = time.perf_counter()
+        totals = drive_files.collect_garbage(ttl_seconds=30 * DAY, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        floor = (totals["total"] - 100) / args.drive_rate
+        print(f"limited   {totals['total']:4d} files  {elapsed:6.2f}s (rate limit allows no less than {floor:.2f}s)  "
+              f"throttled={resilience.resilience_stats()['drive']['throttled_seconds']}s  deleted={len(totals['deleted'])}")
+        # Files left over by the faults run are collected as well
+        failures += 0 if elapsed >= floor * 0.95 and set(limited) <= set(totals["deleted"]) else 1
+        print(f"registry  {drive_files.get_created_files().stats()}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# Measures how long an agent turn waits on a Google export when the export runs inline (tools.py)
+# against submitting it as a background job (my_agent/export_jobs.py), with the local fakes.
+# Also simulates a restart: jobs left queued or running by a process that died are run by the next one,
+# even when it has the same PID, and a job interrupted after creating its document reuses and shares that document.
+#
+# Usage: python -m benchmarks.bench_export_jobs [--jobs 10] [--google-latency 0.15]
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fakes import Counters, FakeGoogleHttp, fake_trip_sections
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Turn latency of inline exports against background export jobs.")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tavily-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import docs_sections, export_jobs, tools
+
+    counters = Counters()
+    sections = fake_trip_sections()
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        docs_sections._manifests = docs_sections.DocManifests(f"{data_dir}/doc_manifests.sqlite3")
+        jobs_path = f"{data_dir}/export_jobs.sqlite3"
+
+        inline, inline_ids = [], []
+        for i in range(args.jobs):
+            start = time.perf_counter()
+            inline_ids.append(tools.export_trip_plan_to_google_doc(document_title=f"Inline {i}", **sections)["document_id"])
+            inline.append((time.perf_counter() - start) * 1000)
+
+        export_jobs._jobs = export_jobs.ExportJobs(jobs_path, workers=args.workers)
+        submitted, ids = [], []
+        start_all = time.perf_counter()
+        for i in range(args.jobs):
+            start = time.perf_counter()
+            ids.append(export_jobs.submit_google_doc_export(document_title=f"Job {i}", **sections)["job_id"])
+            submitted.append((time.perf_counter() - start) * 1000)
+        finished = [export_jobs.get_export_job_status(job_id, wait_seconds=10) for job_id in ids]
+        drained = time.perf_counter() - start_all
+        print(f"inline   turn waits p50={statistics.median(inline):7.1f} ms  total={sum(inline) / 1000:5.2f} s")
+        print(f"jobs     turn waits p50={statistics.median(submitted):7.1f} ms  all {args.jobs} done in {drained:5.2f} s "
+              f"with {args.workers} workers  states={[job['state'] for job in finished].count('succeeded')} succeeded")
+
+        # Restart: a process that died left jobs running and others queued; nobody runs them until the
+        # next process opens the store. One ran in a process with another PID, one in a process with this
+        # PID (a restarted container), and that one had already created its document.
+        stalled = export_jobs.ExportJobs(jobs_path, workers=0)
+        pending = [stalled.submit("google_doc", dict(sections, document_title=f"Pending {i}")) for i in range(4)]
+        with stalled._lock:
+            stalled._conn.execute("UPDATE export_jobs SET state = 'running', owner = 999999999, instance = 'dead', attempts = 1"
+                                  " WHERE job_id = ?", (pending[0],))
+            stalled._conn.execute("UPDATE export_jobs SET state = 'running', owner = ?, instance = 'restarted', attempts = 1,"
+                                  " file_id = ? WHERE job_id = ?", (os.getpid(), inline_ids[0], pending[1]))
+            stalled._conn.commit()
+        # The interrupted run may have stopped before sharing its document
+        tools.USER_EMAIL_TO_SHARE_WITH = "bench@example.com"
+        restarted = export_jobs.ExportJobs(jobs_path, workers=args.workers)
+        done = [restarted.wait(job_id, 10) for job_id in pending]
+        states = [job["state"] for job in done]
+        resumed = done[1]["result"].get("document_id")
+        print(f"restart  requeued {restarted.requeued} interrupted job(s); pending jobs after restart: {states}")
+        shared = inline_ids[0] in FakeGoogleHttp.shared_files
+        print(f"resume   job created {inline_ids[0]} before the restart, finished with {resumed}, shared again: {shared}")
+        print(f"store    {restarted.stats()}")
+    return 0 if all(state == "succeeded" for state in states) and restarted.requeued == 2 and resumed == inline_ids[0] and shared else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Compares the batched food search (my_agent/food.py) with one sequential search per itinerary slot,
+# as food_recommender used to issue them, against the local fakes.
+#
+# Usage: python -m benchmarks.bench_food [--days 7] [--tavily-latency 0.3]
+import argparse
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fakes import Counters
+
+# Free-form days: sentences, "and" between places and a time of day after the place it belongs to
+_FREE_FORM = [
+    ("Eiffel Tower at lunch. Louvre in the evening.", [("lunch", "Eiffel Tower"), ("dinner", "Louvre")]),
+    ("Visit Le Marais for dinner and the Louvre in the afternoon", [("dinner", "Le Marais"), ("lunch", "Louvre")]),
+    ("Arts and Crafts Museum in the morning! St. Germain at noon", [("breakfast", "Arts and Crafts Museum"), ("lunch", "St. Germain")]),
+]
+# A bare kind of place joins no named one: Louvre, Museum, Central Park, Park
+_GROUPS = (["Louvre Museum", "Museum", "Central Park", "Louvre", "Park", "the Louvre Museum area"], [[0, 3, 5], [1], [2], [4]])
+_PLACES = ["Eiffel Tower", "Louvre Museum", "Le Marais", "Montmartre", "Latin Quarter", "Saint-Germain", "Louvre", "Eiffel Tower area"]
+
+
+def sample_itinerary(days: int) -> str:
+    lines = []
+    for day in range(days):
+        morning, afternoon, evening = (_PLACES[(day * 3 + i) % len(_PLACES)] for i in range(3))
+        lines.append(f"Day {day + 1}: {morning} in the morning, {afternoon} around lunchtime, {evening} for dinner")
+    lines += [f"Day {days + i + 1}: {text}" for i, (text, _) in enumerate(_FREE_FORM)]
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batched food search against per-slot searches.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--tavily-latency", type=float, default=0.3)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import search
+    from my_agent.food import food_search, group_slots, parse_slots
+
+    counters = Counters()
+    itinerary = sample_itinerary(args.days)
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        slots = parse_slots(itinerary)
+        free_form = [(slot["meal"], slot["place"]) for slot in slots if slot["day"] > args.days]
+        expected = [pair for _, pairs in _FREE_FORM for pair in pairs]
+        if free_form != expected:
+            print(f"free-form days parsed as {free_form}, expected {expected}")
+            return 1
+        groups = [area["slots"] for area in group_slots([{"place": place} for place in _GROUPS[0]])]
+        if groups != _GROUPS[1]:
+            print(f"places {_GROUPS[0]} grouped as {groups}, expected {_GROUPS[1]}")
+            return 1
+
+        start = time.perf_counter()
+        for slot in slots:
+            search.search(f"best restaurants for {slot['meal']} near {slot['place']}, Paris (per slot)", max_results=3)
+        per_slot = time.perf_counter() - start
+        calls, _ = counters.snapshot()
+        print(f"per slot  {len(slots)} slots -> tavily={calls.get('tavily', 0)}  wall={per_slot * 1000:7.1f} ms")
+
+        counters.reset()
+        start = time.perf_counter()
+        result = food_search(itinerary, "Paris", ["French"])
+        batched = time.perf_counter() - start
+        calls, _ = counters.snapshot()
+        print(f"batched   {len(result['slots'])} slots -> tavily={calls.get('tavily', 0)}  wall={batched * 1000:7.1f} ms  "
+              f"({result['searches']} areas)")
+        unmapped = [slot for slot in result["slots"] if "area_index" not in slot]
+        if unmapped:
+            print(f"{len(unmapped)} slots were not mapped to an area")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
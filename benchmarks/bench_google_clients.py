@@ -0,0 +1,48 @@
+# Measures the per-call Google API client setup cost paid by the export tools.
+#
+# "rebuild" mirrors the old _get_sheets_service() helper: new credentials plus
+# build() for Sheets, Drive and Docs on every tool call.
+# "registry" is my_agent.google_clients, where clients are built once and reused.
+#
+# Usage: python -m benchmarks.bench_google_clients [calls]
+import statistics
+import sys
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+
+from my_agent.google_clients import SERVICE_VERSIONS, GoogleClientRegistry
+
+
+def _rebuild_all():
+    creds = AnonymousCredentials()
+    return tuple(
+        build(name, version, credentials=creds, static_discovery=True, cache_discovery=False)
+        for name, version in SERVICE_VERSIONS.items()
+    )
+
+
+def _timed(fn, calls: int) -> list:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples: list) -> None:
+    print(f"{label:<22} first={samples[0]:8.3f} ms  median={statistics.median(samples):8.4f} ms  "
+          f"total={sum(samples):9.2f} ms over {len(samples)} calls")
+
+
+def main(calls: int = 50) -> None:
+    registry = GoogleClientRegistry(credentials_factory=AnonymousCredentials)
+    _report("rebuild per call", _timed(_rebuild_all, calls))
+    _report("registry (sheets)", _timed(lambda: registry.get('sheets'), calls))
+    _report("registry (all three)", _timed(lambda: [registry.get(name) for name in SERVICE_VERSIONS], calls))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
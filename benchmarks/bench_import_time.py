@@ -0,0 +1,82 @@
+# Measures cold import time of the my_agent entry points with `python -X importtime`.
+#
+# Each module is imported in a fresh interpreter (best of --runs). The check fails when an import
+# takes longer than its threshold or pulls in a heavy dependency that should only load on first use.
+#
+# Usage: python -m benchmarks.bench_import_time [--runs 5] [--scale 1.0] [--top 5]
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+# module -> maximum cumulative import time in milliseconds
+THRESHOLDS_MS: Dict[str, float] = {
+    "my_agent": 20,
+    "my_agent.agent": 150,
+    "my_agent.agent2": 150,
+    "my_agent.tools": 150,
+    "my_agent.test": 250,
+    "my_agent.test2": 250,
+}
+# Packages that must not be imported by merely importing the modules above
+DEFERRED_PACKAGES = ["google.adk", "google.generativeai", "googleapiclient", "google.oauth2", "tavily"]
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(module: str) -> Tuple[float, Dict[str, Tuple[float, float]]]:
+    """Imports `module` in a new interpreter; returns its cumulative ms and {module: (self ms, cumulative ms)}."""
+    env = dict(os.environ, PYTHONPATH=_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.setdefault("MODEL_ID", "gemini-2.5-flash")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env, cwd=_ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    timings = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)) / 1000, int(match.group(2)) / 1000)
+    return timings[module][1], timings
+
+
+def check(module: str, runs: int, scale: float, top: int) -> List[str]:
+    samples = [importtime(module) for _ in range(runs)]
+    best, timings = min(samples, key=lambda sample: sample[0])
+    threshold = THRESHOLDS_MS[module] * scale
+    print(f"{module:<18} {best:8.1f} ms  (threshold {threshold:.0f} ms, {len(timings)} modules)")
+    for name, (self_ms, _) in sorted(timings.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"    {self_ms:8.1f} ms  {name}")
+
+    failures = []
+    if best > threshold:
+        failures.append(f"{module} imports in {best:.1f} ms, over the {threshold:.0f} ms threshold")
+    loaded = sorted({package for package in DEFERRED_PACKAGES for name in timings
+                     if name == package or name.startswith(package + ".")})
+    if loaded:
+        failures.append(f"{module} eagerly imports {', '.join(loaded)}")
+    return failures
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time regression check for my_agent.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module; the fastest run counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for every threshold (e.g. on slow CI machines)")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports (self time) listed per module")
+    parser.add_argument("modules", nargs="*", default=list(THRESHOLDS_MS))
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in args.modules:
+        failures += check(module, args.runs, args.scale, args.top)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
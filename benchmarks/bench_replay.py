@@ -0,0 +1,127 @@
+# Records a burst of traffic (itinerary requests and agent turns) against the local fakes with
+# my_agent/replay.py, then replays the trace at the recorded timing, faster, and back to back, with the
+# fakes out of the picture. Reports how closely each replay follows the recorded wall-clock time and
+# latencies, and checks that a replayed itinerary is the text that was recorded.
+#
+# Usage: python -m benchmarks.bench_replay [--itineraries 12] [--turns 6] [--gap 0.1] [--speed 4]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from benchmarks.fakes import Counters, fake_llm_class
+
+
+CITIES = ["Paris", "Rome", "Lisbon", "Kyoto", "Mexico City"]
+
+
+async def _record_traffic(args: argparse.Namespace) -> List[str]:
+    """Starts the itinerary requests and agent turns `gap` seconds apart; returns the itineraries."""
+    from my_agent import agent2
+    from my_agent.server import AgentServer
+    from my_agent.test import get_trip_itinerary
+
+    server = AgentServer(agent2.root_agent)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=args.itineraries)
+    itineraries: List[str] = []
+
+    async def itinerary(i: int) -> None:
+        await asyncio.sleep(i * args.gap)
+        result = await loop.run_in_executor(executor, lambda: get_trip_itinerary(CITIES[i % len(CITIES)], ["art", "food"], 1000 + 100 * i, 3))
+        itineraries.append(result["itinerary"])
+
+    async def turn(i: int) -> None:
+        await asyncio.sleep((i + 0.5) * args.gap)
+        await server.run_turn(f"user-{i}", f"session-{i}", f"Where should we eat on our trip to {CITIES[i % len(CITIES)]}?")
+
+    await asyncio.gather(*(itinerary(i) for i in range(args.itineraries)), *(turn(i) for i in range(args.turns)))
+    executor.shutdown()
+    await server.drain(0)
+    return itineraries
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Record traffic against the fakes and replay it at several speeds.")
+    parser.add_argument("--itineraries", type=int, default=12)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--gap", type=float, default=0.1, help="seconds between the starts of recorded requests")
+    parser.add_argument("--speed", type=float, default=4.0, help="speed-up of the fast replay")
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--tavily-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    parser.add_argument("--google-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent import agent2, replay, resilience, search
+
+    counters = Counters()
+    failures = 0
+    live_limits = resilience.RATE_LIMITS
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        FakeLlm = fake_llm_class()
+        FakeLlm.counters = counters
+        FakeLlm.latency = args.model_latency
+        agent2.MODEL_ID = "fake-model"
+        trace = os.path.join(data_dir, "trace.jsonl.gz")
+
+        recorder = replay.start_recording(trace)
+        start = time.perf_counter()
+        recorded = asyncio.run(_record_traffic(args))
+        recorded_wall = time.perf_counter() - start
+        replay.stop_recording()
+        info = replay.trace_info(trace)
+        print(f"recorded  {recorder.records} records in {recorded_wall:.2f}s, trace {info['file_bytes'] / 1024:.1f} KiB  "
+              f"calls={ {name: int(c['calls']) for name, c in info['upstreams'].items()} }  fake calls={counters.snapshot()[0]}")
+
+        counters.reset()
+        # Replays run under the production rate limits, which only the live APIs are subject to
+        resilience.RATE_LIMITS = live_limits
+        resilience.reset_upstreams()
+        live_stores = (search._client, search._cache)
+        for speed in (1.0, args.speed, 0.0):
+            # Each replay puts back what it replaced, so the next one can start
+            report = asyncio.run(replay.replay(trace, speed=speed))
+            if (search._client, search._cache) != live_stores:
+                print("          replay left its client or cache installed")
+                failures += 1
+            throttled = sum(stats.get("throttled_seconds", 0) for stats in report["resilience"].values())
+            if throttled or resilience.RATE_LIMITS != live_limits:
+                print(f"          replay was throttled for {throttled:.2f}s or did not restore the rate limits")
+                failures += 1
+            expected = recorded_wall / speed if speed else None
+            summary = "  ".join(f"{kind} p50={s['p50_ms']} ms (recorded {s['recorded']['p50_ms']})"
+                                for kind, s in report["entries"].items())
+            errors = sum(s["errors"] for s in report["entries"].values())
+            print(f"speed {speed:<4g} wall={report['wall_seconds']:.2f}s"
+                  + (f" (expected ~{expected:.2f}s)" if expected else "") + f"  {summary}  errors={errors}  upstreams={report['upstreams']}")
+            failures += errors
+            if expected and abs(report["wall_seconds"] - expected) > 0.25 * expected + 0.1:
+                print(f"          replay at speed {speed:g} drifted from the recorded timing")
+                failures += 1
+
+        fake_calls = counters.snapshot()[0]
+        if fake_calls:
+            print(f"replays reached the fakes: {fake_calls}")
+            failures += 1
+        # A replayed request gets exactly the text that was recorded for it
+        replay.start_replay([record for record in replay.read_trace(trace) if record["kind"] == "call"], speed=0)
+        search._cache = search.SearchCache(os.path.join(data_dir, "replayed_search_cache.sqlite3"))
+        from my_agent.test import get_trip_itinerary
+
+        replayed = get_trip_itinerary(CITIES[0], ["art", "food"], 1000, 3)["itinerary"]
+        matches = replayed in recorded
+        print(f"replayed itinerary matches the recorded one: {matches}")
+        failures += 0 if matches else 1
+        replay.stop_replay()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# Exercises my_agent/resilience.py against the local fakes with injected 429 and 503 responses.
+#
+# 1. Each upstream (Tavily search, Gemini streaming, Sheets export) at several error rates:
+#    success rate, retries and latency.
+# 2. A full outage: search falls back to expired cache entries, Gemini fails fast once its circuit opens.
+# 3. The shared token bucket: several processes drawing from one bucket together stay at its rate.
+#
+# Usage: python -m benchmarks.bench_resilience [--calls 40] [--error-rates 0,0.1,0.3] [--processes 4]
+import argparse
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.fakes import Counters, FakeGenerativeModel, FakeGoogleHttp, FakeTavilyClient, FaultInjector
+
+
+def _install(counters: Counters, faults: FaultInjector, data_dir: str) -> None:
+    import google.generativeai as genai
+    from my_agent import drive_files, google_clients, resilience, search, tracing
+
+    search._client = FakeTavilyClient(counters, latency=0.002, faults=faults)
+    search._cache = search.SearchCache(os.path.join(data_dir, "search_cache.sqlite3"))
+    FakeGenerativeModel.counters = counters
+    FakeGenerativeModel.faults = faults
+    FakeGenerativeModel.latency = FakeGenerativeModel.first_chunk_latency = 0.002
+    genai.GenerativeModel = FakeGenerativeModel
+    google_clients.registry = google_clients.GoogleClientRegistry(
+        credentials_factory=AnonymousCredentials,
+        http_factory=lambda credentials: FakeGoogleHttp(counters, latency=0.002, faults=faults),
+    )
+    drive_files._files = drive_files.CreatedFiles(os.path.join(data_dir, "drive_files.sqlite3"))
+    tracing.set_exporter(None)
+    resilience.RATE_LIMITS = ""
+    resilience.RATE_LIMIT_DIR = data_dir
+    resilience._upstreams.clear()
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _run(label: str, upstream: str, fn: Callable[[int], object], calls: int) -> None:
+    from my_agent import resilience
+
+    before = dict(resilience.get_upstream(upstream).counters)
+    ok, samples = 0, []
+    for i in range(calls):
+        start = time.perf_counter()
+        try:
+            result = fn(i)
+            ok += not (isinstance(result, dict) and result.get("status") == "error")
+        except Exception:
+            pass
+        samples.append((time.perf_counter() - start) * 1000)
+    after = resilience.get_upstream(upstream).counters
+    print(f"  {label:<10} success={ok / calls:6.1%}  retries={after['retries'] - before['retries']:4.0f}  "
+          f"failures={after['failures'] - before['failures']:3.0f}  p50={statistics.median(samples):7.1f} ms  "
+          f"p95={_percentile(samples, 0.95):7.1f} ms")
+
+
+def _error_rates(args: argparse.Namespace, faults: FaultInjector) -> None:
+    from my_agent import resilience, tools
+    from my_agent.search import search
+    from my_agent.streaming import collect, stream_generate
+
+    financial = {"Flights": 600, "Hotels": 700, "Itinerary": 200, "Food": 300, "Budget": 2000}
+    for rate in args.error_rates:
+        faults.error_rate = rate
+        print(f"\nerror rate {rate:.0%} (half 429 with Retry-After {faults.retry_after}s, half 503)")
+        for upstream in ("tavily", "gemini", "sheets", "drive"):
+            resilience.configure_upstream(upstream, failure_threshold=10 ** 6)
+        _run("search", "tavily", lambda i: search(f"museums in city {rate} {i}"), args.calls)
+        _run("generate", "gemini", lambda i: collect(stream_generate(f"plan {i}")), args.calls)
+        _run("sheet", "sheets", lambda i: tools.export_trip_plan_to_google_sheet(
+            financial, "Paris", "Berlin", "Within budget."), args.calls)
+
+
+def _outage(faults: FaultInjector) -> None:
+    from my_agent import resilience, search
+    from my_agent.streaming import collect, stream_generate
+
+    print("\nfull outage (every call 503s)")
+    faults.error_rate = 0.0
+    search.search("louvre opening hours")
+    search.get_search_cache().ttl_seconds = 0 # Every stored entry is now expired
+    search.get_search_cache()._memory.clear()
+    resilience.configure_upstream("tavily", failure_threshold=3, reset_seconds=60)
+    resilience.configure_upstream("gemini", failure_threshold=3, reset_seconds=60)
+    faults.outage = True
+    try:
+        result = search.search("louvre opening hours")
+        print(f"  search     served expired cache entry: {bool(result.get('results'))}")
+        for i in range(6):
+            start = time.perf_counter()
+            try:
+                collect(stream_generate("plan"))
+                outcome = "ok"
+            except Exception as e:
+                outcome = type(e).__name__
+            print(f"  generate   call {i + 1}: {outcome:<20} {(time.perf_counter() - start) * 1000:7.1f} ms  "
+                  f"circuit={resilience.get_upstream('gemini').breaker.state}")
+    finally:
+        faults.outage = False
+
+
+def _drain(path: str, rate: float, tokens: int) -> None:
+    from my_agent.resilience import TokenBucket
+
+    bucket = TokenBucket("shared", rate, 1, path)
+    for _ in range(tokens):
+        bucket.acquire()
+
+
+def _shared_bucket(processes: int, data_dir: str) -> None:
+    rate, tokens = 50.0, 25
+    path = os.path.join(data_dir, "shared.bucket")
+    _drain(path, rate, 1) # Empties the burst so the measurement starts from a known state
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=_drain, args=(path, rate, tokens)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print(f"\nshared bucket: {processes} processes x {tokens} requests at {rate:.0f}/s -> "
+          f"{processes * tokens / elapsed:.1f} requests/s combined ({elapsed:.2f}s)")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Retry, circuit breaker and shared rate limit behavior against faulty fakes.")
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--error-rates", type=lambda value: [float(v) for v in value.split(",")], default=[0.0, 0.1, 0.3])
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    from my_agent import resilience
+
+    resilience.RETRY_BASE_SECONDS = 0.01
+    logging.getLogger("my_agent").setLevel(logging.ERROR) # One warning per retry would drown the report
+    with tempfile.TemporaryDirectory() as data_dir:
+        faults = FaultInjector(retry_after=0.02)
+        _install(Counters(), faults, data_dir)
+        _error_rates(args, faults)
+        _outage(faults)
+        _shared_bucket(args.processes, data_dir)
+        print(f"\ninjected faults: {faults.injected}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# Load generator for the serving entry point (my_agent/server.py). By default it serves the travel planner
+# in-process against the local fakes (a fake google.adk model plus the Tavily and Google fakes) and drives it
+# over HTTP with concurrent keep-alive clients, reporting throughput, tail latency and how many turns were
+# turned away with 429/503. Three phases: load within capacity, overload, and a drain started while turns
+# are in flight (every admitted turn must still complete).
+#
+# Usage: python -m benchmarks.bench_server [--clients 8] [--turns 20] [--workers 8] [--queue-size 8]
+#        python -m benchmarks.bench_server --target http://127.0.0.1:8080   # drive a running server instead
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.fakes import Counters, fake_llm_class
+
+
+CITIES = ["Paris", "Rome", "Lisbon", "Kyoto", "Mexico City"]
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection to the server."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any]]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self._writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        response = json.loads(await self._reader.readexactly(int(headers.get("content-length", "0"))) or b"{}")
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def _drive(host: str, port: int, clients: int, turns: int, label: str) -> Dict[int, List[float]]:
+    """`clients` concurrent users, each sending `turns` turns in its own session one after another."""
+    latencies: Dict[int, List[float]] = {}
+
+    async def user(i: int) -> None:
+        client = Client(host, port)
+        try:
+            for turn in range(turns):
+                start = time.perf_counter()
+                try:
+                    status, _ = await client.request("POST", "/run", {
+                        "user_id": f"{label}-user-{i}", "session_id": f"{label}-session-{i}",
+                        "message": f"Where should we eat on our trip to {CITIES[(i + turn) % len(CITIES)]}?",
+                    })
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    client.close()
+                    status = 0
+                latencies.setdefault(status, []).append((time.perf_counter() - start) * 1000)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    ok = latencies.get(200, [])
+    rejected = [ms for status, values in latencies.items() if status in (429, 503) for ms in values]
+    others = {status: len(values) for status, values in latencies.items() if status not in (200, 429, 503)}
+    print(f"{label:<9} clients={clients:3d}  ok={len(ok):4d}  429={len(latencies.get(429, [])):4d}  "
+          f"503={len(latencies.get(503, [])):4d}  {len(ok) / elapsed:6.1f} turns/s  "
+          f"ok p50={_percentile(ok, 0.5):7.1f} p95={_percentile(ok, 0.95):7.1f} p99={_percentile(ok, 0.99):7.1f} ms  "
+          f"rejected p50={_percentile(rejected, 0.5):6.1f} p99={_percentile(rejected, 0.99):6.1f} ms" + (f"  other={others}" if others else ""))
+    return latencies
+
+
+async def _self_hosted(args: argparse.Namespace) -> int:
+    from benchmarks.suite import install_fakes
+    from my_agent import agent2
+    from my_agent.server import AgentServer
+
+    counters = Counters()
+    failures = 0
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        FakeLlm = fake_llm_class()
+        FakeLlm.counters = counters
+        FakeLlm.latency = args.model_latency
+        agent2.MODEL_ID = "fake-model"
+        server = AgentServer(agent2.root_agent, workers=args.workers, queue_size=args.queue_size,
+                             queue_timeout=args.queue_timeout, model_concurrency=args.model_concurrency)
+        port = await server.start("127.0.0.1", 0)
+
+        steady = await _drive("127.0.0.1", port, args.clients, args.turns, "steady")
+        failures += sum(len(values) for status, values in steady.items() if status != 200)
+        overload = await _drive("127.0.0.1", port, args.overload_clients or 4 * (args.workers + args.queue_size),
+                                args.turns, "overload")
+        rejected = [ms for status, values in overload.items() if status in (429, 503) for ms in values]
+        if not rejected:
+            print("overload  no turns were rejected; raise --overload-clients")
+        failures += sum(len(values) for status, values in overload.items() if status not in (200, 429, 503))
+
+        # Drain while a full pool of turns is running: all of them finish, later turns are refused
+        in_flight = asyncio.ensure_future(_drive("127.0.0.1", port, args.workers, 1, "drain"))
+        await asyncio.sleep(args.model_latency)
+        start = time.perf_counter()
+        finished = await server.drain(args.drain_seconds)
+        drained = await in_flight
+        try:
+            await Client("127.0.0.1", port).request("GET", "/healthz")
+            refused = False
+        except ConnectionError:
+            refused = True
+        print(f"drain     finished in {(time.perf_counter() - start) * 1000:.1f} ms  all turns completed={finished}  "
+              f"in-flight ok={len(drained.get(200, []))}/{args.workers}  new connections refused={refused}")
+        failures += 0 if finished and refused and len(drained.get(200, [])) == args.workers else 1
+
+        calls, _ = counters.snapshot()
+        stats = server.stats()
+        print(f"upstream  model calls={calls.get('model', 0)}  tavily calls={calls.get('tavily', 0)}  "
+              f"sessions={stats['sessions']}  server turn p99={stats['turn_ms']['p99']} ms")
+    return 1 if failures else 0
+
+
+async def _remote(args: argparse.Namespace) -> int:
+    target = urlsplit(args.target)
+    host, port = target.hostname, target.port or 80
+    await _drive(host, port, args.clients, args.turns, "steady")
+    await _drive(host, port, args.overload_clients or 4 * args.clients, args.turns, "overload")
+    status, stats = await Client(host, port).request("GET", "/stats")
+    print(f"stats     {json.dumps({key: stats.get(key) for key in ('responses', 'turn_ms', 'sessions')})}")
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Throughput, tail latency and backpressure of the HTTP server.")
+    parser.add_argument("--target", help="URL of a running server; by default one is started against the fakes")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent users in the steady phase")
+    parser.add_argument("--overload-clients", type=int, default=0, help="default: 4 x (workers + queue size)")
+    parser.add_argument("--turns", type=int, default=20, help="turns per user")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--queue-timeout", type=float, default=5.0)
+    parser.add_argument("--model-concurrency", type=int, default=None, help="default: the gemini entry of UPSTREAM_CONCURRENCY")
+    parser.add_argument("--drain-seconds", type=float, default=10.0)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--tavily-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    return asyncio.run(_remote(args) if args.target else _self_hosted(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
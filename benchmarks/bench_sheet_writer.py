@@ -0,0 +1,101 @@
+# Measures the buffered sheet writer (my_agent/sheet_writer.py) with a stand-in flush function: how long the
+# acks of fast spreadsheets wait while another spreadsheet is slow, with one flusher against several.
+# Then checks that a bad row fails only its own append, and that an append whose ack times out before it
+# was written is taken back instead of being written later.
+#
+# Usage: python -m benchmarks.bench_sheet_writer [--sheets 6] [--slow-latency 1.0] [--fast-latency 0.05]
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fakes import Counters
+
+
+def _fast_acks(writer, sheets: int) -> List[float]:
+    """Submits one row to a slow spreadsheet and to `sheets` fast ones; returns the fast acks' latencies in ms."""
+    start = time.perf_counter()
+    writer.submit("slow", {"values": []})
+    futures = [writer.submit(f"fast-{i}", {"values": []}) for i in range(sheets)]
+    latencies = []
+    for future in futures:
+        future.result(timeout=30)
+        latencies.append((time.perf_counter() - start) * 1000)
+    writer.flush()
+    return latencies
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Buffered sheet writer: concurrent flushes, bad rows and cancelled appends.")
+    parser.add_argument("--sheets", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=20, help="rows in the batch with one bad row")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--fast-latency", type=float, default=0.05)
+    parser.add_argument("--tavily-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--google-latency", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    from my_agent.sheet_writer import BufferedSheetWriter
+
+    calls: Dict[str, int] = {}
+    calls_lock = threading.Lock()
+
+    def flush_rows(spreadsheet_id: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with calls_lock:
+            calls[spreadsheet_id] = calls.get(spreadsheet_id, 0) + 1
+        time.sleep(args.slow_latency if spreadsheet_id == "slow" else args.fast_latency)
+        if any(row.get("bad") for row in rows):
+            raise ValueError("invalid cell value")
+        return {"round_trips": 1}
+
+    failures = 0
+    outcomes = {}
+    for workers in (1, 4):
+        writer = BufferedSheetWriter(flush_rows, max_delay=0.01, workers=workers)
+        latencies = _fast_acks(writer, args.sheets)
+        writer.close()
+        outcomes[workers] = statistics.median(latencies)
+        print(f"workers={workers}  fast acks p50={outcomes[workers]:7.1f} ms  max={max(latencies):7.1f} ms  "
+              f"(slow sheet takes {args.slow_latency * 1000:.0f} ms)")
+    # With concurrent flushes the fast spreadsheets are acknowledged before the slow one is written
+    failures += 0 if outcomes[4] < args.slow_latency * 1000 / 2 else 1
+
+    # One bad row in a batch: the batch is written again row by row and only that row fails
+    writer = BufferedSheetWriter(flush_rows, max_rows=args.rows, max_delay=60, workers=2)
+    futures = [writer.submit("batch", {"values": [], "bad": i == args.rows // 2}) for i in range(args.rows)]
+    writer.flush("batch")
+    failed = [i for i, future in enumerate(futures) if future.exception() is not None]
+    print(f"bad row   {args.rows} rows  written={writer.rows_written}  failed rows={failed}  flush calls={calls['batch']}")
+    failures += 0 if failed == [args.rows // 2] and writer.rows_written == args.rows - 1 else 1
+
+    # An append whose ack times out while the row is still buffered is cancelled and never written
+    future = writer.submit("cancelled", {"values": []})
+    cancelled = writer.cancel("cancelled", future)
+    writer.close()
+    print(f"cancel    cancelled={cancelled}  future cancelled={future.cancelled()}  written={calls.get('cancelled', 0)}")
+    failures += 0 if cancelled and future.cancelled() and "cancelled" not in calls else 1
+
+    # The same through the export tool: a timed out append reports an error and leaves nothing to write
+    from benchmarks.suite import install_fakes
+    from my_agent import sheet_writer, tools
+
+    counters = Counters()
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        sheet_writer._writer = BufferedSheetWriter(tools._flush_finance_rows, max_delay=0.5)
+        tools.SHEETS_APPEND_ACK_TIMEOUT_SECONDS = 0.05
+        result = tools.export_trip_plan_to_google_sheet(
+            {"Flights": 400, "Budget": 1500}, "LAX", "CDG", spreadsheet_id="fake-sheet", append_data=True)
+        sheet_writer._writer.close()
+        google_calls = counters.snapshot()[0].get("google", 0)
+        print(f"tool      timed out append -> {result['status']}: {result['message']}  google calls after close={google_calls}")
+        failures += 0 if result["status"] == "error" and not google_calls else 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
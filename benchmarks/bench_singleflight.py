@@ -0,0 +1,100 @@
+# Measures request coalescing (my_agent/singleflight.py) against the local fakes.
+#
+# N concurrent callers ask for the same trip (threads) and the same search (asyncio tasks); the report
+# shows how many Tavily and Gemini calls were actually made and what the callers waited.
+# Each round uses a fresh trip and query, so the caches never answer and only coalescing is measured.
+# Finally checks that a stream every caller stopped reading early is not produced to the end for nobody.
+#
+# Usage: python -m benchmarks.bench_singleflight [--callers 20] [--rounds 3]
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from benchmarks.fakes import Counters
+
+
+def _trips(callers: int, round_: int, counters: Counters) -> None:
+    from my_agent import test
+
+    def one(_):
+        start = time.perf_counter()
+        result = test.get_trip_itinerary(f"City {round_}", ["art", "food"], 1500, 3)
+        return time.perf_counter() - start, result["timing"]["coalesced"]
+
+    counters.reset()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        outcomes = list(pool.map(one, range(callers)))
+    calls, _ = counters.snapshot()
+    latencies = [seconds * 1000 for seconds, _ in outcomes]
+    print(f"  trips    {callers} callers -> gemini={calls.get('gemini', 0)} tavily={calls.get('tavily', 0)}  "
+          f"shared={sum(coalesced for _, coalesced in outcomes)}  p50={statistics.median(latencies):6.1f} ms  "
+          f"max={max(latencies):6.1f} ms")
+
+
+def _searches(callers: int, round_: int, counters: Counters) -> None:
+    from my_agent.search import search_async
+
+    async def run():
+        return await asyncio.gather(*(search_async(f"night markets round {round_}") for _ in range(callers)))
+
+    counters.reset()
+    start = time.perf_counter()
+    asyncio.run(run())
+    calls, _ = counters.snapshot()
+    print(f"  searches {callers} tasks   -> tavily={calls.get('tavily', 0)}  wall={(time.perf_counter() - start) * 1000:6.1f} ms")
+
+
+def _abandoned_stream(chunks: int = 20) -> bool:
+    from my_agent.singleflight import SingleFlight
+
+    produced = []
+
+    def produce():
+        for i in range(chunks):
+            produced.append(i)
+            time.sleep(0.01)
+            yield i
+
+    flight = SingleFlight("bench")
+    leader = flight.stream("trip", produce)
+    next(leader)
+    follower = flight.stream("trip", produce)
+    next(follower)
+    follower.close()
+    leader.close()
+    time.sleep(chunks * 0.01 + 0.1) # Long enough for a background drain to run to the end
+    print(f"abandoned stream: {len(produced)} of {chunks} chunks produced after both readers stopped")
+    return len(produced) < chunks
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Upstream calls made by concurrent identical requests.")
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tavily-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--google-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from benchmarks.suite import install_fakes
+    from my_agent.singleflight import singleflight_stats
+
+    counters = Counters()
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        for round_ in range(args.rounds):
+            print(f"round {round_ + 1}")
+            _trips(args.callers, round_, counters)
+            _searches(args.callers, round_, counters)
+        for name, stats in singleflight_stats().items():
+            print(f"{name:<10} {stats}")
+    return 0 if _abandoned_stream() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
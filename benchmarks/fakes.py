@@ -0,0 +1,390 @@
+# Local stand-ins for Tavily, Gemini and the Google Workspace APIs used by the benchmarks.
+# Each fake sleeps for a configurable latency and records calls and request bytes in a shared Counters.
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Tuple
+
+import httplib2
+
+
+class Counters:
+    """Thread-safe call and payload counters, keyed by upstream name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.request_bytes: Dict[str, int] = {}
+
+    def record(self, upstream: str, payload_bytes: int) -> None:
+        with self._lock:
+            self.calls[upstream] = self.calls.get(upstream, 0) + 1
+            self.request_bytes[upstream] = self.request_bytes.get(upstream, 0) + payload_bytes
+
+    def snapshot(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        with self._lock:
+            return dict(self.calls), dict(self.request_bytes)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.request_bytes.clear()
+
+
+class FaultInjector:
+    """
+    Decides which fake calls fail: a seeded share `error_rate` of calls gets a 429 (with Retry-After) or a 503,
+    and while `outage` is set every call gets a 503. Counts the injected faults per status.
+    """
+
+    def __init__(self, error_rate: float = 0.0, throttle_share: float = 0.5, retry_after: float = 0.05, seed: int = 0):
+        self.error_rate = error_rate
+        self.throttle_share = throttle_share
+        self.retry_after = retry_after
+        self.outage = False
+        self.injected: Dict[int, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_status(self) -> Optional[int]:
+        """HTTP status the current call should fail with, or None to let it succeed."""
+        with self._lock:
+            if self.outage:
+                status = 503
+            elif self._random.random() < self.error_rate:
+                status = 429 if self._random.random() < self.throttle_share else 503
+            else:
+                return None
+            self.injected[status] = self.injected.get(status, 0) + 1
+            return status
+
+    def headers(self, status: int) -> Dict[str, str]:
+        return {"retry-after": f"{self.retry_after:g}"} if status == 429 else {}
+
+
+def _tavily_error(status: int, faults: FaultInjector) -> Exception:
+    # What tavily.TavilyClient raises: UsageLimitExceededError for 429, requests' HTTPError for 5xx
+    import requests
+    from tavily.errors import UsageLimitExceededError
+
+    if status == 429:
+        return UsageLimitExceededError("Rate limit exceeded")
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(faults.headers(status))
+    return requests.HTTPError(f"{status} Server Error", response=response)
+
+
+def _gemini_error(status: int, faults: FaultInjector) -> Exception:
+    # What google.generativeai raises through google.api_core
+    from google.api_core import exceptions
+
+    return exceptions.from_http_status(status, "Resource has been exhausted" if status == 429 else "The model is overloaded")
+
+
+class FakeTavilyClient:
+    """Stands in for tavily.TavilyClient with deterministic results of a configurable size."""
+
+    def __init__(self, counters: Counters, latency: float = 0.05, results: int = 5, content_chars: int = 600,
+                 faults: Optional[FaultInjector] = None):
+        self.counters = counters
+        self.latency = latency
+        self.results = results
+        self.content_chars = content_chars
+        self.faults = faults
+
+    def search(self, query: str, max_results: int = 5, **kwargs) -> Dict[str, Any]:
+        self.counters.record("tavily", len(query))
+        time.sleep(self.latency)
+        status = self.faults.next_status() if self.faults is not None else None
+        if status is not None:
+            raise _tavily_error(status, self.faults)
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        body = (f"{query}: opening hours, prices, tips and reviews. " * (self.content_chars // 40 + 1))[:self.content_chars]
+        return {
+            "query": query,
+            "results": [
+                {"title": f"{query} - guide {i}", "url": f"https://example.com/{slug}/{i}", "content": body, "score": 1 - i / 10}
+                for i in range(min(max_results, self.results))
+            ],
+        }
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Stands in for google.generativeai.GenerativeModel. Streaming responses yield `chunks` chunks,
+    the first after `first_chunk_latency` seconds and the rest spread over the remaining `latency`.
+    """
+
+    counters: Optional[Counters] = None
+    faults: Optional[FaultInjector] = None
+    latency = 0.2
+    first_chunk_latency = 0.05
+    chunks = 20
+    chunk_chars = 200
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+
+    def _stream(self, prompt: str) -> Iterator[_Chunk]:
+        time.sleep(self.first_chunk_latency)
+        step = max(self.latency - self.first_chunk_latency, 0) / max(self.chunks - 1, 1)
+        for i in range(self.chunks):
+            if i:
+                time.sleep(step)
+            yield _Chunk((f"**Day {i + 1}:** * visit a museum, eat local food. " * 8)[:self.chunk_chars] + "\n")
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        if self.counters is not None:
+            self.counters.record("gemini", len(str(prompt).encode("utf-8")))
+        status = self.faults.next_status() if self.faults is not None else None
+        if status is not None:
+            raise _gemini_error(status, self.faults)
+        chunks = self._stream(str(prompt))
+        if stream:
+            return chunks
+        return _Chunk("".join(chunk.text for chunk in chunks))
+
+
+_fake_llm_class = None
+
+
+def fake_llm_class():
+    """
+    A google.adk model for names starting with "fake-", registered with ADK's model registry on first call,
+    so agents built with model="fake-..." run against it. Each call sleeps `latency` seconds. When the request
+    offers a tool named in `tool_plan` and the last content is not a tool result, the fake calls that tool
+    with the arguments the plan builds from the user's message; otherwise it answers with text.
+    """
+    global _fake_llm_class
+    if _fake_llm_class is not None:
+        return _fake_llm_class
+    import asyncio
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.adk.models.registry import LLMRegistry
+    from google.genai import types
+
+    def city(text: str) -> str:
+        match = re.search(r"\bto ([A-Z][\w ]*?)[?.!]*$", text.strip())
+        return match.group(1) if match else "Paris"
+
+    class FakeLlm(BaseLlm):
+        counters: ClassVar[Optional[Counters]] = None
+        latency: ClassVar[float] = 0.05
+        tool_plan: ClassVar[Dict[str, Any]] = {
+            "food_recommender": lambda text: {"request": text},
+            "food_search": lambda text: {"itinerary": fake_trip_sections(2)["itinerary_data"], "city": city(text)},
+        }
+
+        @classmethod
+        def supported_models(cls) -> List[str]:
+            return [r"fake-.*"]
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            contents = llm_request.contents or []
+            if self.counters is not None:
+                self.counters.record("model", sum(len(str(content)) for content in contents))
+            await asyncio.sleep(self.latency)
+            last = contents[-1] if contents else None
+            answered = last is not None and any(part.function_response for part in last.parts or [])
+            text = next((part.text for content in contents if content.role == "user"
+                         for part in content.parts or [] if part.text), "")
+            tool = next((name for name in self.tool_plan if name in llm_request.tools_dict), None)
+            if tool is not None and not answered:
+                part = types.Part(function_call=types.FunctionCall(name=tool, args=self.tool_plan[tool](text)))
+            else:
+                part = types.Part(text=f"Here is what I found for: {text[:80]}")
+            usage = types.GenerateContentResponseUsageMetadata(prompt_token_count=sum(len(str(c)) for c in contents) // 4,
+                                                               candidates_token_count=20)
+            yield LlmResponse(content=types.Content(role="model", parts=[part]), usage_metadata=usage)
+
+    LLMRegistry.register(FakeLlm)
+    _fake_llm_class = FakeLlm
+    return FakeLlm
+
+
+class FakeDocument:
+    """
+    Body of a fake Google Doc: its text and each paragraph's named style, enough to apply the insert,
+    delete and paragraph style requests tools.py sends and to answer documents().get like the real API.
+    Character k of `text` is document index k + 1; a paragraph's style is stored at its newline.
+    """
+
+    def __init__(self):
+        self.text = "\n"
+        self.styles = ["NORMAL_TEXT"]
+        self.revision = 1
+
+    def apply(self, request: Dict[str, Any]) -> None:
+        kind, args = next(iter(request.items()))
+        if kind == "insertText":
+            at = args["location"]["index"] - 1
+            # New text joins the paragraph it is inserted into, style included
+            style = self.styles[self.text.index("\n", at)]
+            self.text = self.text[:at] + args["text"] + self.text[at:]
+            self.styles[at:at] = [style] * len(args["text"])
+        elif kind == "deleteContentRange":
+            start, end = args["range"]["startIndex"] - 1, args["range"]["endIndex"] - 1
+            if not 0 <= start < end < len(self.text):
+                raise ValueError(f"deleteContentRange {args['range']} outside the body")
+            self.text = self.text[:start] + self.text[end:]
+            del self.styles[start:end]
+        elif kind == "updateParagraphStyle":
+            start, end = args["range"]["startIndex"] - 1, args["range"]["endIndex"] - 1
+            last = self.text.index("\n", max(start, end - 1))
+            for k in range(start, last + 1):
+                if self.text[k] == "\n":
+                    self.styles[k] = args["paragraphStyle"]["namedStyleType"]
+        # Bullets and text styles do not change indexes and are not tracked
+
+    def paragraphs(self) -> List[Tuple[str, str]]:
+        """(text, named style) of every paragraph."""
+        return [(line, self.styles[k]) for line, k in zip(self.text.split("\n"), (i for i, c in enumerate(self.text) if c == "\n"))]
+
+    def as_response(self, document_id: str) -> Dict[str, Any]:
+        content = [{"endIndex": 1, "sectionBreak": {}}]
+        start = 0
+        for line in self.text.splitlines(keepends=True):
+            end = start + len(line)
+            content.append({
+                "startIndex": start + 1, "endIndex": end + 1,
+                "paragraph": {"elements": [{"startIndex": start + 1, "endIndex": end + 1, "textRun": {"content": line}}],
+                              "paragraphStyle": {"namedStyleType": self.styles[end - 1]}},
+            })
+            start = end
+        return {"documentId": document_id, "revisionId": f"rev-{self.revision}", "body": {"content": content}}
+
+
+class FakeGoogleHttp:
+    """
+    httplib2-compatible transport that answers the Sheets, Docs and Drive calls made by my_agent/tools.py.
+    Hand it to the client registry: GoogleClientRegistry(credentials_factory=..., http_factory=lambda c: FakeGoogleHttp(counters)).
+    """
+
+    _ids = itertools.count(1)
+    # Shared by every transport, as the real documents are
+    documents: Dict[str, FakeDocument] = {}
+    _documents_lock = threading.Lock()
+    deleted_files: set = set()
+    shared_files: set = set()
+
+    def __init__(self, counters: Counters, latency: float = 0.03, faults: Optional[FaultInjector] = None):
+        self.counters = counters
+        self.latency = latency
+        self.faults = faults
+        self.credentials = None
+
+    def _route(self, method: str, path: str, body: Optional[dict]) -> Tuple[int, Any]:
+        if method == "POST" and path == "/v4/spreadsheets":
+            sheet_id = f"fake-sheet-{next(self._ids)}"
+            return 200, {"spreadsheetId": sheet_id, "spreadsheetUrl": f"https://docs.google.com/spreadsheets/d/{sheet_id}"}
+        if method == "GET" and path.startswith("/v4/spreadsheets/"):
+            return 200, {"sheets": [{"properties": {"sheetId": 0, "title": "Finance Planner"}}]}
+        if method == "POST" and path.startswith("/v1/documents/") and path.endswith(":batchUpdate"):
+            document = self._document(path[len("/v1/documents/"):-len(":batchUpdate")])
+            with self._documents_lock:
+                required = (body or {}).get("writeControl", {}).get("requiredRevisionId")
+                if required and required != f"rev-{document.revision}":
+                    return 400, {"error": {"code": 400, "message": "The document was modified after the required revision."}}
+                try:
+                    for request in (body or {}).get("requests", []):
+                        document.apply(request)
+                except (ValueError, IndexError) as e:
+                    return 400, {"error": {"code": 400, "message": f"Invalid requests: {e}"}}
+                document.revision += 1
+            return 200, {"replies": [{} for _ in (body or {}).get("requests", [])]}
+        if method == "POST" and path.endswith(":batchUpdate"):
+            return 200, {"replies": [{} for _ in (body or {}).get("requests", [])]}
+        if method == "POST" and path == "/v1/documents":
+            document_id = f"fake-doc-{next(self._ids)}"
+            self._document(document_id)
+            return 200, {"documentId": document_id, "title": (body or {}).get("title")}
+        if method == "GET" and path.startswith("/v1/documents/"):
+            document_id = path.rsplit("/", 1)[-1]
+            document = self._document(document_id)
+            with self._documents_lock:
+                return 200, document.as_response(document_id)
+        if method == "POST" and path.endswith("/permissions"):
+            with self._documents_lock:
+                self.shared_files.add(path[len("/drive/v3/files/"):-len("/permissions")])
+            return 200, {"id": "fake-permission"}
+        if method == "DELETE" and path.startswith("/drive/v3/files/"):
+            file_id = path[len("/drive/v3/files/"):]
+            with self._documents_lock:
+                if file_id in self.deleted_files:
+                    return 404, {"error": {"code": 404, "message": f"File not found: {file_id}."}}
+                self.deleted_files.add(file_id)
+            return 204, None
+        return 404, {"error": {"code": 404, "message": f"FakeGoogleHttp has no route for {method} {path}"}}
+
+    def _document(self, document_id: str) -> FakeDocument:
+        with self._documents_lock:
+            return self.documents.setdefault(document_id, FakeDocument())
+
+    def _batch(self, body: str, content_type: str) -> Tuple[httplib2.Response, bytes]:
+        # A multipart/mixed batch (e.g. POST /batch/drive/v3): every part is routed on its own and
+        # faults are injected per part, as Google rejects the requests of a batch individually
+        from email.parser import Parser
+
+        parts = []
+        for part in Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}").get_payload():
+            head, _, inner_body = part.get_payload().partition("\r\n\r\n")
+            request_line, *_ = head.splitlines()
+            method, target, _ = request_line.split(" ", 2)
+            path = re.sub(r"^https://[^/]+", "", target).split("?", 1)[0]
+            status = self.faults.next_status() if self.faults is not None else None
+            if status is not None:
+                extra = "".join(f"{name}: {value}\r\n" for name, value in self.faults.headers(status).items())
+                response = {"error": {"code": status, "message": "injected fault"}}
+            else:
+                extra = ""
+                status, response = self._route(method, path, json.loads(inner_body) if inner_body.strip() else None)
+            content = "" if response is None else json.dumps(response)
+            parts.append(f"--fake_batch\r\nContent-Type: application/http\r\nContent-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                         f"HTTP/1.1 {status} Fake\r\nContent-Type: application/json\r\n{extra}\r\n{content}\r\n")
+        content = ("".join(parts) + "--fake_batch--\r\n").encode("utf-8")
+        return httplib2.Response({"status": "200", "content-type": "multipart/mixed; boundary=fake_batch"}), content
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        payload = body.encode("utf-8") if isinstance(body, str) else (body or b"")
+        self.counters.record("google", len(payload))
+        time.sleep(self.latency)
+        path = re.sub(r"^https://[^/]+", "", uri).split("?", 1)[0]
+        if method == "POST" and path.startswith("/batch/"):
+            return self._batch(payload.decode("utf-8"), (headers or {}).get("content-type", ""))
+        status = self.faults.next_status() if self.faults is not None else None
+        if status is not None:
+            headers = dict(self.faults.headers(status), status=str(status))
+            headers["content-type"] = "application/json"
+            return httplib2.Response(headers), json.dumps({"error": {"code": status, "message": "injected fault"}}).encode("utf-8")
+        status, response = self._route(method, path, json.loads(payload) if payload else None)
+        content = b"" if response is None else json.dumps(response).encode("utf-8")
+        return httplib2.Response({"status": str(status), "content-type": "application/json"}), content
+
+    def close(self):
+        pass
+
+
+def fake_trip_sections(days: int = 7) -> Dict[str, str]:
+    """Markdown payloads shaped like the sub-agent outputs exported to Google Docs."""
+    return {
+        "flight_data": "\n".join(f"**Airline:** Air {i}\n* Route: _LAX_ to **CDG**\n* Price: **${300 + i}**" for i in range(4)),
+        "hotel_data": "\n".join(f"**Hotel Name:** Hotel {i}\n* Rating: _4 stars_\n* Price: **${120 + i}/night**" for i in range(5)),
+        "itinerary_data": "\n".join(
+            f"**Day {d}:**\n* _Morning:_ Visit the **Eiffel Tower**\n* _Afternoon:_ Explore the *Louvre Museum*" for d in range(1, days + 1)
+        ),
+        "food_recommendations_data": "\n".join(f"**Restaurant Name:** Bistro {i}\n* Cuisine: French" for i in range(days)),
+    }
+
+
+def fake_interests() -> List[str]:
+    return ["art", "food", "history"]
@@ -0,0 +1,202 @@
+# Offline benchmark suite: runs the main entry points against the fakes in benchmarks/fakes.py
+# and reports p50/p95 latency, HTTP round trips, request payload bytes and peak memory.
+#
+# Usage:
+#   python -m benchmarks.suite                          # run every scenario and print a table
+#   python -m benchmarks.suite --save-baseline main     # also write benchmarks/baselines/main.json
+#   python -m benchmarks.suite --compare main           # compare with a saved baseline (exit 1 on regression)
+#   python -m benchmarks.suite --scenario doc_export --iterations 50
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.fakes import Counters, FakeGenerativeModel, FakeGoogleHttp, FakeTavilyClient, fake_interests, fake_trip_sections
+
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+CITIES = ["Paris", "Rome", "Lisbon", "Kyoto", "Mexico City"]
+# Differences below these are treated as noise when comparing with a baseline
+MIN_LATENCY_DELTA_MS = 5.0
+MIN_MEMORY_DELTA_KB = 64.0
+
+
+def install_fakes(counters: Counters, args: argparse.Namespace, data_dir: str) -> None:
+    """Points every external client used by my_agent at the local fakes."""
+    import google.generativeai as genai
+    from my_agent import drive_files, google_clients, itinerary_cache, resilience, search, tracing
+
+    search._client = FakeTavilyClient(counters, latency=args.tavily_latency)
+    search._cache = search.SearchCache(os.path.join(data_dir, "search_cache.sqlite3"))
+
+    FakeGenerativeModel.counters = counters
+    FakeGenerativeModel.latency = args.gemini_latency
+    genai.GenerativeModel = FakeGenerativeModel
+
+    google_clients.registry = google_clients.GoogleClientRegistry(
+        credentials_factory=AnonymousCredentials,
+        http_factory=lambda credentials: FakeGoogleHttp(counters, latency=args.google_latency),
+    )
+    # Files the fakes "create" must not end up in the real registry, where the garbage collector would find them
+    drive_files._files = drive_files.CreatedFiles(os.path.join(data_dir, "drive_files.sqlite3"))
+    tracing.set_exporter(tracing.JsonLinesExporter(os.path.join(data_dir, "traces.jsonl")))
+    # The fakes have no quotas; rate limiting would only measure the configured limits
+    resilience.RATE_LIMITS = ""
+    resilience.RATE_LIMIT_DIR = data_dir
+
+    # The generation scenarios measure uncached generation; trip_itinerary_cached turns the cache on for itself
+    itinerary_cache.ITINERARY_CACHE_ENABLED = False
+    itinerary_cache._cache = itinerary_cache.ItineraryCache(os.path.join(data_dir, "itinerary_cache.sqlite3"))
+
+
+# Rephrasings of the same trips, as different users would type them
+_TRIP_VARIANTS = [
+    (["art", "food", "history"], 1500),
+    (["Food and Art", "historical"], 1600),
+    (["history", "arts", "cuisine"], 1450),
+    (["art", "food", "history"], 1650), # Different budget bucket: served as a near-miss
+]
+
+
+def _cached_itinerary(i: int) -> Any:
+    from my_agent import itinerary_cache, test
+
+    interests, budget = _TRIP_VARIANTS[(i // len(CITIES)) % len(_TRIP_VARIANTS)]
+    itinerary_cache.ITINERARY_CACHE_ENABLED = True
+    try:
+        return test.get_trip_itinerary(CITIES[i % len(CITIES)], interests, budget, 4)
+    finally:
+        itinerary_cache.ITINERARY_CACHE_ENABLED = False
+
+
+def _scenarios() -> Dict[str, Callable[[int], Any]]:
+    from my_agent import test, test2, tools
+
+    sections = fake_trip_sections()
+    return {
+        "trip_itinerary": lambda i: test.get_trip_itinerary(CITIES[i % len(CITIES)], fake_interests(), 1500, 4),
+        "trip_itinerary_cached": _cached_itinerary,
+        "smart_trip": lambda i: test2.plan_smart_trip(CITIES[i % len(CITIES)], fake_interests(), 1200, 3),
+        "doc_export": lambda i: tools.export_trip_plan_to_google_doc(document_title=f"Trip {i}", **sections),
+        "sheet_export_new": lambda i: tools.export_trip_plan_to_google_sheet(
+            {"Flights": 500, "Hotels": 300, "Itinerary": 100, "Food": 150, "Budget": 1200}, "London", "Paris", "Under budget."),
+        "sheet_export_existing": lambda i: tools.export_trip_plan_to_google_sheet(
+            {"Flights": 500, "Hotels": 300, "Itinerary": 100, "Food": 150, "Budget": 1200}, "London", "Paris", "Under budget.",
+            spreadsheet_id="fake-existing-sheet"),
+    }
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(fn: Callable[[int], Any], counters: Counters, iterations: int) -> Dict[str, Any]:
+    counters.reset()
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        result = fn(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if isinstance(result, dict) and result.get("status") == "error":
+            raise RuntimeError(f"scenario returned an error: {result.get('message')}")
+    calls, request_bytes = counters.snapshot()
+
+    # Peak memory is measured on one extra traced iteration so tracing does not skew the latencies
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(_percentile(ordered, 0.95), 3),
+        "round_trips_per_call": {upstream: round(count / iterations, 2) for upstream, count in sorted(calls.items())},
+        "request_bytes_per_call": {upstream: round(size / iterations) for upstream, size in sorted(request_bytes.items())},
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a description of every metric that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, noise in (("p50_ms", MIN_LATENCY_DELTA_MS), ("p95_ms", MIN_LATENCY_DELTA_MS), ("peak_memory_kb", MIN_MEMORY_DELTA_KB)):
+            if current[metric] > previous[metric] * (1 + tolerance) and current[metric] - previous[metric] > noise:
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]}")
+        for group in ("round_trips_per_call", "request_bytes_per_call"):
+            for upstream, value in current[group].items():
+                before = previous[group].get(upstream, 0)
+                if value > before * (1 + tolerance):
+                    regressions.append(f"{name}.{group}.{upstream}: {before} -> {value}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks for Vibe Travel.")
+    parser.add_argument("--scenario", action="append", help="scenario to run (repeatable); default: all")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--tavily-latency", type=float, default=0.05, help="seconds per fake Tavily search")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="seconds per fake Gemini generation")
+    parser.add_argument("--google-latency", type=float, default=0.03, help="seconds per fake Google API round trip")
+    parser.add_argument("--save-baseline", metavar="NAME", help="write results to benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare results with benchmarks/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression when comparing")
+    args = parser.parse_args(argv)
+
+    counters = Counters()
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        install_fakes(counters, args, data_dir)
+        scenarios = _scenarios()
+        for name in args.scenario or scenarios:
+            results[name] = run_scenario(scenarios[name], counters, args.iterations)
+            r = results[name]
+            print(f"{name:<24} p50={r['p50_ms']:>9.2f} ms  p95={r['p95_ms']:>9.2f} ms  "
+                  f"round trips={r['round_trips_per_call']}  bytes={r['request_bytes_per_call']}  "
+                  f"peak={r['peak_memory_kb']} KB")
+
+    if "trip_itinerary_cached" in results:
+        from my_agent import itinerary_cache
+
+        results["trip_itinerary_cached"]["itinerary_cache"] = itinerary_cache._cache.stats()
+        print(f"itinerary cache: {results['trip_itinerary_cached']['itinerary_cache']}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k.endswith("latency") or k == "iterations"},
+                       "results": results}, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved.get("settings", {}).get("iterations") != args.iterations:
+            # Cache hit rates and percentiles depend on the number of iterations
+            print(f"WARNING: baseline '{args.compare}' was recorded with {saved.get('settings', {}).get('iterations')} iterations, "
+                  f"this run used {args.iterations}; the comparison may not be meaningful.")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against baseline '{args.compare}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
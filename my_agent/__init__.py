@@ -1 +1,13 @@
-from . import agent
+# Submodules are imported on first attribute access (e.g. `my_agent.agent` from the ADK loader), so
+# importing the package, or one of its light modules such as my_agent.search, does not load google.adk.
+import importlib
+
+
+def __getattr__(name: str):
+    if not name.startswith("_"):
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,10 @@
-import os
-from google.adk.agents.llm_agent import Agent
-from tavily import TavilyClient
-
-tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+from .context import compact_results
+from .search import search
 
 def internet_search(query: str) -> str:
     """Search the internet for travel information, attractions, hotels, and activities."""
-    results = tavily_client.search(query, max_results=5)
-    return str(results)
+    results = search(query, max_results=5)
+    return compact_results(results, query).text
 
 def get_trip_itinerary(city: str, interests: list[str], budget: int, start_date: str, end_date: str) -> dict:
     """Generate a detailed trip itinerary based on user preferences."""
@@ -20,11 +17,14 @@ def get_trip_itinerary(city: str, interests: list[str], budget: int, start_date:
         "status": "Agent will generate itinerary"
     }
 
-root_agent = Agent(
-    model='gemini-2.5-flash',
-    name='trip_planner_agent',
-    description="An AI travel agent that creates personalized trip itineraries based on budget, destination, interests, and dates.",
-    instruction="""You are an expert travel planner. When a user asks about trip planning:
+def _build_root_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model='gemini-2.5-flash',
+        name='trip_planner_agent',
+        description="An AI travel agent that creates personalized trip itineraries based on budget, destination, interests, and dates.",
+        instruction="""You are an expert travel planner. When a user asks about trip planning:
     1. Use the internet_search tool to find current information about attractions, restaurants, hotels, and activities
     2. Create a detailed day-by-day itinerary
     3. Consider the user's budget and interests
@@ -32,5 +32,13 @@ root_agent = Agent(
     5. Provide practical travel tips
     
     Always search for up-to-date information about the destination before making recommendations.""",
-    tools=[internet_search, get_trip_itinerary],
-)
\ No newline at end of file
+        tools=[internet_search, get_trip_itinerary],
+    )
+
+
+def __getattr__(name: str):
+    # root_agent is built on first access, so importing this module does not load google.adk
+    if name == "root_agent":
+        globals()["root_agent"] = agent = _build_root_agent()
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,8 @@
-
 import os
-from google.adk.agents import LlmAgent
+import threading
+from typing import Any, Dict
 from dotenv import load_dotenv
-from google.adk import Agent
-from google.adk.tools import google_search
-from google.adk.tools.agent_tool import AgentTool
-from .tools import export_to_google_sheet_tool, export_to_google_doc_tool, delete_google_file_tool # Import the new tools
+from .tracing import after_model_span, before_model_span, model_error_span
 load_dotenv()
 
 
@@ -15,20 +12,7 @@ AGENT_NAME = os.getenv("AGENT_NAME")
 MODEL_ID = os.getenv("MODEL_ID")
 
 
-location_finder_based_on_interests = LlmAgent(
-    name = "location_finder_based_on_interests",
-    model = MODEL_ID,
-    description = "Find the closest 5 locations best fitted based on user interests",
-    instruction=f"""You are a specialized location finder assistant. You receive as input the starting location of a user and the interests they have for a trip. Your task is to find the closest 5 locations that best fit the user's interests.""",
-)   
-
-
-flight_recommender = LlmAgent(
-    name="flight_recommender",
-    tools=[google_search],
-    model=MODEL_ID,
-    description="Looks up flight information from one destionation to another",
-    instruction=f"""You are a specialized flight recommendation assistant.
+FLIGHT_RECOMMENDER_INSTRUCTION = """You are a specialized flight recommendation assistant.
 Your primary goal is to find and present flight options based on the user's request.
 When generating text output (e.g., for the `flight_data` parameter of an export tool), use markdown for formatting:
 - Wrap text in `**double asterisks**` for **bold**.
@@ -43,17 +27,9 @@ Here's your process:
 5.  If no flights are found matching the exact criteria, inform the user and perhaps suggest alternative dates or nearby airports if appropriate.
 6.  If the user's request is unclear (e.g., missing origin or destination), ask for clarification.
 Do not invent flight information. All flight details must come from the search results of your tools.
-""",
-  
-    )
-
+"""
 
-hotel_recommender = LlmAgent(
-    name="hotel_recommender",
-    tools=[google_search],
-    model=MODEL_ID,
-    description="Looks up hotels in a particular location",
-    instruction=f"""You are a specialized hotel recommendation assistant.
+HOTEL_RECOMMENDER_INSTRUCTION = """You are a specialized hotel recommendation assistant.
 Your primary goal is to find and present hotel options based on the user's request.
 When generating text output (e.g., for the `hotel_data` parameter of an export tool), use markdown for formatting:
 - Wrap text in `**double asterisks**` for **bold**.
@@ -68,16 +44,9 @@ Here's your process:
 5.  If no hotels are found matching the exact criteria, inform the user and perhaps suggest alternative dates, nearby locations, or broadening their search criteria.
 6.  If the user's request is unclear (e.g., missing location or dates), ask for clarification.
 Do not invent hotel information. All hotel details must come from the search results of your tools.
-""",
-  
-    )
+"""
 
-itinerary_recommender = LlmAgent(
-    name="itinerary_recommender",
-    tools=[google_search],
-    model=MODEL_ID,
-    description="Creates a travel itinerary based on user preferences like location, duration, interests, and budget.",
-    instruction=f"""You are a specialized travel itinerary creation service.
+ITINERARY_RECOMMENDER_INSTRUCTION = """You are a specialized travel itinerary creation service.
 Your SOLE task is to generate and output a detailed travel itinerary as a text string, using markdown for formatting, based on the user's request.
 When generating the itinerary text (e.g., for the `itinerary_data` parameter of an export tool), use markdown:
 - Wrap text in `**double asterisks**` for **bold** (e.g., for day numbers or key activity names).
@@ -95,16 +64,9 @@ Here's your process for generating the itinerary content:
 6.  If the user's request is unclear or lacks key information (e.g., destination, duration, interests) to generate a meaningful itinerary, you may ask for specific clarifications before attempting to generate the markdown output.
 7.  Your output MUST be the itinerary itself, presented as a clear, markdown-formatted text string.
 Do not invent attractions or details that cannot be reasonably verified. Base all suggestions on information found through your tools.
-""",
-  
-    )
+"""
 
-food_recommender = LlmAgent(
-    name="food_recommender",
-    tools=[google_search],
-    model=MODEL_ID,
-    description="Recommends restaurants, cafes, and food trucks based on user's cuisine preferences and travel itinerary.",
-    instruction="""You are a specialized food recommendation assistant for travelers.
+FOOD_RECOMMENDER_INSTRUCTION = """You are a specialized food recommendation assistant for travelers.
 Your primary goal is to suggest dining options (restaurants, cafes, food trucks) based on the user's cuisine preferences and their travel itinerary.
 When generating text output, use markdown for formatting:
 - Wrap text in `**double asterisks**` for **bold**.
@@ -114,7 +76,8 @@ When generating text output, use markdown for formatting:
 Here's your process:
 1.  Ask the user about their cuisine preferences (e.g., Italian, Mexican, vegetarian, specific dishes they enjoy).
 2.  You will be provided with information about the user's travel itinerary, specifically the locations they will be visiting and potentially the timing (e.g., "Day 1: Eiffel Tower area in the morning, Louvre Museum in the afternoon").
-3.  Based on the cuisine preferences and the locations from the itinerary, use your search tool to find nearby restaurants, cafes, or food trucks.
+3.  Based on the cuisine preferences and the locations from the itinerary, call the `food_search` tool ONCE with the whole itinerary (every day, place and time of day you know of), the `city` and the `cuisine_preferences`. Do not search slot by slot.
+    It groups slots near the same landmark or neighborhood, searches each area once and returns `areas` (with their search `results`) and `slots`, where each slot's `area_index` points at the area whose results apply to it. Use it to recommend places for every slot.
 4.  For each recommended place, try to provide:
     *   Name of the establishment.
     *   Type of cuisine.
@@ -128,14 +91,8 @@ Here's your process:
 Do not invent restaurant information. All recommendations must come from the search results of your tools.
 Focus solely on food recommendations. Do not handle flight, hotel, or full itinerary planning.
 """
-)
 
-financial_planner_agent = LlmAgent(
-    name="financial_planner_agent",
-    tools=[export_to_google_sheet_tool],
-    model=MODEL_ID,
-    description="Helps create a financial plan for a trip, estimating costs, comparing against a budget, providing a summary, and exporting the plan to Google Sheets.",
-    instruction="""You are a financial planning assistant for trips.
+FINANCIAL_PLANNER_AGENT_INSTRUCTION = """You are a financial planning assistant for trips.
 Your goal is to help the user estimate trip costs and see how they fit within a budget.
 
 Here's your process:
@@ -157,49 +114,37 @@ Here's your process:
     IMPORTANT: Convert any textual costs from the user (e.g., "around $500", "a thousand dollars") into actual numbers (e.g., 500, 1000). If the user does not provide a specific numeric estimate for a cost item after you've asked, you should use 0 for that item in calculations and clearly state this. These captured numeric values (`Flights_cost`, `Hotels_cost`, `Itinerary_cost`, `Food_cost`, `Budget_amount`) are what you will use in the next steps for calculations and export.
 
 
-5.  Generate a financial summary (`summary_text`):
-    a.  Calculate `total_estimated_cost` = `Flights_cost` + `Hotels_cost` + `Itinerary_cost` + `Food_cost`.
-    b.  Calculate `difference` = `Budget_amount` - `total_estimated_cost`.
-    c.  Construct the `summary_text` string:
-        Start with: "For your trip from [Source] to [Destination], you are planning to spend $[Flights_cost] on flights, $[Hotels_cost] on hotels, $[Itinerary_cost] on itinerary activities, and $[Food_cost] on food. Your total estimated cost is $[total_estimated_cost]."
-        Then, append based on `difference` and `Budget_amount`:
-        i.  If `Budget_amount` > 0 and `total_estimated_cost` > 0:
-            If `difference >= 0`: Calculate `savings_percentage = (difference / Budget_amount) * 100`. Append: " With a budget of $[Budget_amount], you are **under budget by $[difference], which is a {savings_percentage:.1f}% saving**."
-            Else (`difference < 0`): Calculate `overspending_percentage = (abs(difference) / Budget_amount) * 100`. Append: " With a budget of $[Budget_amount], you are **over budget by $[abs(difference)], which is {overspending_percentage:.1f}% over your budget**."
-        ii. If `Budget_amount` <= 0 and `total_estimated_cost` > 0: Append: " Your budget is $[Budget_amount], and your total estimated cost for this trip is $[total_estimated_cost]."
-        iii.If `Budget_amount` <= 0 and `total_estimated_cost` <= 0: Append: " No costs or budget specified for analysis."
+5.  Generate the financial summary with the `calculate_trip_budget` tool. Do NOT add up costs or compute differences or percentages yourself.
+    Call it with `source`=`Source`, `destination`=`Destination`, `flights`=`Flights_cost`, `hotels`=`Hotels_cost`, `itinerary`=`Itinerary_cost`, `food`=`Food_cost` and `budget`=`Budget_amount` (and `currency` if the user's amounts are not in US dollars).
+    It returns `total_estimated_cost`, `difference`, the savings or overspending percentage, the finished `summary_text` and a `financial_data` dictionary for the export.
+    If the user wants to compare options (e.g. budget vs. mid-range vs. luxury hotels, 5 vs. 7 days, or totals in other currencies), call `compare_budget_scenarios` once with all the hotel tiers, trip lengths and currencies instead of calculating each variant; report which variants fit the budget from its result.
 
-6.  Present the `summary_text` to the user.
+6.  Present the `summary_text` returned by `calculate_trip_budget` to the user, unchanged.
 
 7.  After presenting the summary, ask the user if they want to export the detailed financial breakdown to Google Sheets.
 8.  If they say yes to exporting:
-    a.  Use the `export_to_google_sheet_tool` directly.
+    a.  Use the `submit_google_sheet_export` tool. It starts the export in the background and returns a `job_id` right away.
     b.  To call this tool, you need to prepare the arguments as follows:
-        i.  `financial_data` (for the tool): This must be a dictionary containing only the keys "Flights", "Hotels", "Itinerary", "Food", and "Budget" with their respective numeric values.
-            Create this dictionary using the actual numeric values you stored in variables like `Flights_cost`, `Hotels_cost`, `Itinerary_cost`, `Food_cost`, and `Budget_amount` from step 4. For example: `{"Flights": Flights_cost, "Hotels": Hotels_cost, "Itinerary": Itinerary_cost, "Food": Food_cost, "Budget": Budget_amount}`. Ensure these variables hold the correct numbers before creating this dictionary.
+        i.  `financial_data` (for the tool): The `financial_data` dictionary returned by `calculate_trip_budget` in step 5. It contains only the keys "Flights", "Hotels", "Itinerary", "Food", and "Budget" with their numeric values.
         ii. `source`: The `Source` string you collected.
         iii.`destination`: The `Destination` string you collected.
-        iv. `financial_summary`: This must be the actual textual content of the 'summary_text' variable that you constructed in step 5. For example, if 'summary_text' contains "Your trip is over budget by $50.", then you pass that exact string for this parameter. Do not pass the literal words "summary_text" or "financial_summary".
+        iv. `financial_summary`: The exact `summary_text` string returned by `calculate_trip_budget` in step 5. Do not pass the literal words "summary_text" or "financial_summary".
     c.  You can ask if they want to use an existing Google Sheet (and get its ID to pass as `spreadsheet_id` to the tool) or create a new one.
     d.  If they choose to use an existing sheet (provide a `spreadsheet_id`), ask them if they want to append this new financial plan as a new row to the existing "Finance Planner" tab. If they say yes, you will pass `append_data=True` to the tool. Otherwise, the tool will overwrite the sheet (or create the tab if it doesn't exist).
     e. If creating a new spreadsheet, you can ask if they want a specific `spreadsheet_title` for the new file. If not provided, the tool uses a default ("New Travel Plan"). The tab inside the sheet will be named "Finance Planner" by the tool.
+    f.  `calculate_trip_budget` already saved `financial_data` and `summary_text` for this conversation, so you can leave out `financial_data` and `financial_summary` instead of repeating them; the tool uses the saved ones.
     Example call to the tool:
-   `export_to_google_sheet_tool(financial_data={"Flights": 500, "Hotels": 300, "Itinerary": 100, "Food": 150, "Budget": 1200}, source="London", destination="Paris", financial_summary=summary_text, spreadsheet_id="EXISTING_SHEET_ID", append_data=True)`
+   `submit_google_sheet_export(source="London", destination="Paris", spreadsheet_id="EXISTING_SHEET_ID", append_data=True)`
     or for a new sheet:
-    `export_to_google_sheet_tool(financial_data={"Flights": 500, "Hotels": 300, "Itinerary": 100, "Food": 150, "Budget": 1200}, source="London", destination="Paris", financial_summary=summary_text, spreadsheet_title="New Budget Sheet")` 
+    `submit_google_sheet_export(source="London", destination="Paris", spreadsheet_title="New Budget Sheet")`
 
-9.  If the user agreed to export, inform them of the outcome (success with URL, or failure).
+9.  If the user agreed to export, tell them the export is under way, then call `get_export_job_status` with the `job_id` (you may pass `wait_seconds` of up to 10) and inform them of the outcome (success with the spreadsheet URL, or failure). If the job is still queued or running, say so and check again later instead of waiting.
 10. If the user declines to export, simply acknowledge their choice and conclude the financial planning interaction. For example, say "Alright, I won't export the data. Is there anything else I can help you with regarding financial planning for this trip?"
 Do not ask for flight, hotel or itinerary *details* (like preferences, dates etc.) as those are handled by other specialized agents. Focus only on the *costs* and the overall *budget*.
 If the user provides costs as text (e.g., "around $500"), convert it to a number (e.g., 500).
 """
-)
 
-root_agent = LlmAgent(
-    name="travel_planner",
-    model=MODEL_ID,
-    description="You are a friendly travel agent that helps users plan their trips. You can help with flight recommendations, hotel bookings, creating personalized itineraries, and financial planning for the trip. Trip details can be exported to Google Docs, and financial plans to Google Sheets.",
-    instruction="""You are a friendly and helpful travel agent.
+ROOT_AGENT_INSTRUCTION = """You are a friendly and helpful travel agent.
 Your goal is to assist users in planning their perfect trip.
 Start by warmly greeting the user and asking about their travel plans or if they need inspiration.
 You can help with:
@@ -209,20 +154,22 @@ You can help with:
 - Recommending food options (restaurants, cafes, food trucks) based on preferences and itinerary.
 - Creating a financial plan for the trip (estimating costs, comparing against a budget, and getting a spending summary)
 Be prepared to guide them through the process. To fulfill their requests, use your available tools:
-- For flight recommendations, use the `flight_recommender` tool.
-- For hotel searches, use the `hotel_recommender` tool.
-- For creating personalized travel itineraries, use the `itinerary_recommender` tool.
+- To suggest the closest destinations that fit the user's interests (e.g. when they need inspiration), use the `find_nearby_destinations` tool with their starting location and interests.
+- To gather flights, hotels and an itinerary together once origin, destination and dates are known, use the `trip_research_planner` tool. It runs all three lookups at the same time.
+- For flight recommendations on their own (e.g. to refine flights later), use the `flight_recommender` tool.
+- For hotel searches on their own, use the `hotel_recommender` tool.
+- For creating or revising only the personalized travel itinerary, use the `itinerary_recommender` tool.
 - For financial planning (collecting source/destination, estimating costs, getting a spending summary, and comparing against a budget), use the `financial_planner_agent` tool. This agent will provide a summary and can then export the detailed financial plan (including source and destination) to Google Sheets.
 - For food recommendations, use the `food_recommender` tool. You should provide this agent with relevant parts of the itinerary (like locations for specific days/times) and ask it to find food options based on user preferences. Store the output as `food_data`.
-- To export the descriptive trip plan (textual flight details, hotel descriptions, itinerary) to a Google Doc, use the `export_to_google_doc_tool` tool. You can suggest a title for the document.
-- To delete a Google Sheet or Google Doc previously created by this agent (or any file the service account has permission to delete), use the `delete_google_file_tool` tool. You will need the File ID (which is the Spreadsheet ID for sheets, or Document ID for docs). This action is permanent.
+- To export the descriptive trip plan (textual flight details, hotel descriptions, itinerary) to a Google Doc, use the `submit_google_doc_export` tool. You can suggest a title for the document.
+- To delete a Google Sheet or Google Doc previously created by this agent (or any file the service account has permission to delete), use the `submit_google_file_deletion` tool. You will need the File ID (which is the Spreadsheet ID for sheets, or Document ID for docs). To delete several files, pass all their IDs at once as `file_ids` (up to 100) instead of calling the tool once per file. This action is permanent.
+- Exports and deletions run in the background: the submit tools return a `job_id` immediately, so you can reply to the user at once. Use `get_export_job_status` with the `job_id` to get the result (document or spreadsheet URL, or the error); without a `job_id` it lists this conversation's recent jobs.
 
 Workflow for Trip Planning and Exporting:
 1.  Gathering Trip Information:
-    a.  First, use the `flight_recommender` tool to get flight options. Store this as `flight_data`.
-    b.  Next, use the `hotel_recommender` tool to find hotel options. Store this as `hotel_data`.
-    c.  Then, use the `itinerary_recommender` tool to generate a detailed itinerary. Store this as `itinerary_data`.
-    d.  Initialize `food_data` as None or an empty string.
+    a.  Make sure you know the origin, destination, travel dates and the traveler's interests and budget.
+    b.  Call the `trip_research_planner` tool once with all of these details. It looks up flights, hotels and the itinerary concurrently and returns them as `flight_data`, `hotel_data` and `itinerary_data`. If one of the sections reports that its lookup could not complete, the other sections are still valid; retry only the failed part with `flight_recommender`, `hotel_recommender` or `itinerary_recommender`.
+    c.  Initialize `food_data` as None or an empty string.
 
 2.  Food Recommendations (Optional, can happen before or after financial planning):
     a.  Ask the user if they'd like food recommendations.
@@ -233,38 +180,159 @@ Workflow for Trip Planning and Exporting:
 
 3.  Financial Planning:
     a.  Ask the user if they would like assistance with financial planning for their trip.
-    b.  If yes, use the `financial_planner_agent` tool. This agent will guide the user through providing source/destination (if not already known), estimating costs, and budget. It will then provide an AI-generated summary and is responsible for exporting the detailed financial plan (including source and destination) to Google Sheets using its `export_to_google_sheet_tool`. The sheet will be titled "Finance Planner" by default (or a user-specified title) and will contain a "Finance Planner" tab with the financial breakdown.
+    b.  If yes, use the `financial_planner_agent` tool. This agent will guide the user through providing source/destination (if not already known), estimating costs, and budget. It will then provide an AI-generated summary and is responsible for exporting the detailed financial plan (including source and destination) to Google Sheets using its `submit_google_sheet_export` tool. The sheet will be titled "Finance Planner" by default (or a user-specified title) and will contain a "Finance Planner" tab with the financial breakdown.
 4.  Exporting Descriptive Trip Plan to Google Docs:
     a.  After gathering `flight_data`, `hotel_data`, `itinerary_data`, and optionally `food_data`, ask the user if they would like to export this trip plan to Google Docs.
     b.  If they confirm:
         i.  You can optionally ask the user for a desired title for the new document (e.g., "Paris Trip Details"). If no title is provided, the tool can use a default.
-        ii. Use the `export_to_google_doc_tool` tool, providing:
-            - `flight_data`
-            - `hotel_data`
-            - `itinerary_data`
-            - `food_recommendations_data` (this will be the `food_data` you stored)
-            - and optionally a `document_title`.
+        ii. Use the `submit_google_doc_export` tool. Do NOT repeat the flight, hotel, itinerary or food text in the call: the results of the sub-agents are saved as `flight_data`, `hotel_data`, `itinerary_data` and `food_data` and the tool reads them itself. Only pass `document_title`, e.g. `submit_google_doc_export(document_title="Paris Trip Details")`.
+            Pass a section's text only if you changed it after the sub-agent returned it, e.g. `itinerary_data="<the revised itinerary>"`.
+    c.  If the trip was already exported to a Google Doc in this conversation and the user changes part of it (e.g. picks other hotels), update that document instead of creating a new one: call `submit_google_doc_export` with its `document_id`. Only the sections that changed are rewritten.
+    d.  Tell the user the export has started, then use `get_export_job_status` with the returned `job_id` to report the document URL (and its `document_id`) once the job has succeeded.
  
 6.  Deleting Files:
     a.  If the user wants to delete a file:
         i.  Ask for the File ID (Spreadsheet ID or Document ID) of the file they want to delete.
-        ii. Use the `delete_google_file_tool` tool with the provided `file_id`.
+        ii. Use the `submit_google_file_deletion` tool with the provided `file_id` (or `file_ids` for several files), and confirm the deletion with `get_export_job_status`.
         iii.Remind the user that this action is permanent.
 Inform the user about the outcome of each step. If an export is successful, provide the URL to the user so they can access the file.
     
-""",
-
-  
-    tools=[
-        AgentTool(agent=location_finder_based_on_interests),
-        AgentTool(agent=hotel_recommender),
-        AgentTool(agent=flight_recommender),
-        AgentTool(agent=itinerary_recommender),
-        AgentTool(agent=financial_planner_agent), # Added financial planner
-        AgentTool(agent=food_recommender),
-        export_to_google_doc_tool,
-        delete_google_file_tool,
-        export_to_google_sheet_tool
-    ]
+"""
+
+
+def _build_agents() -> Dict[str, Any]:
+    """
+    Builds the root agent and its sub-agents. google.adk and the Google tool objects are only
+    imported here, so importing this module stays cheap until one of the agents is first used.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.tools import google_search
+    from .export_jobs import (get_export_job_status_tool, submit_google_doc_export_tool, submit_google_file_deletion_tool,
+                              submit_google_sheet_export_tool)
+    from .artifacts import save_agent_outputs
+    from .budget import calculate_trip_budget_tool, compare_budget_scenarios_tool
+    from .destinations import find_nearby_destinations_tool
+    from .food import food_search_tool
+    from .planning import build_trip_research_planner
+    from .tracing import TracedAgentTool
+
+    flight_recommender = LlmAgent(
+        name="flight_recommender",
+        tools=[google_search],
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        output_key="flight_data",
+        description="Looks up flight information from one destionation to another",
+        instruction=FLIGHT_RECOMMENDER_INSTRUCTION,
+
+        )
+
 
+    hotel_recommender = LlmAgent(
+        name="hotel_recommender",
+        tools=[google_search],
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        output_key="hotel_data",
+        description="Looks up hotels in a particular location",
+        instruction=HOTEL_RECOMMENDER_INSTRUCTION,
+
+        )
+
+    itinerary_recommender = LlmAgent(
+        name="itinerary_recommender",
+        tools=[google_search],
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        output_key="itinerary_data",
+        description="Creates a travel itinerary based on user preferences like location, duration, interests, and budget.",
+        instruction=ITINERARY_RECOMMENDER_INSTRUCTION,
+
+        )
+
+    # Flights, hotels and itinerary only depend on origin, destination and dates, so they run concurrently
+    trip_research_planner = build_trip_research_planner(flight_recommender, hotel_recommender, itinerary_recommender)
+
+    food_recommender = LlmAgent(
+        name="food_recommender",
+        tools=[food_search_tool], # One batched search per itinerary area instead of a google_search per slot
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        output_key="food_data",
+        description="Recommends restaurants, cafes, and food trucks based on user's cuisine preferences and travel itinerary.",
+        instruction=FOOD_RECOMMENDER_INSTRUCTION
+    )
+
+    financial_planner_agent = LlmAgent(
+        name="financial_planner_agent",
+        tools=[calculate_trip_budget_tool, compare_budget_scenarios_tool, submit_google_sheet_export_tool, get_export_job_status_tool],
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        description="Helps create a financial plan for a trip, estimating costs, comparing against a budget, providing a summary, and exporting the plan to Google Sheets.",
+        instruction=FINANCIAL_PLANNER_AGENT_INSTRUCTION
+    )
+
+    root_agent = LlmAgent(
+        name="travel_planner",
+        model=MODEL_ID,
+        before_model_callback=before_model_span,
+        after_model_callback=after_model_span,
+        on_model_error_callback=model_error_span,
+        description="You are a friendly travel agent that helps users plan their trips. You can help with flight recommendations, hotel bookings, creating personalized itineraries, and financial planning for the trip. Trip details can be exported to Google Docs, and financial plans to Google Sheets.",
+        instruction=ROOT_AGENT_INSTRUCTION,
+        after_tool_callback=save_agent_outputs, # Sub-agent outputs become artifacts the export tools take by key
+
+
+        tools=[
+            find_nearby_destinations_tool, # Offline index; answers without a model call
+            TracedAgentTool(agent=trip_research_planner),
+            TracedAgentTool(agent=hotel_recommender),
+            TracedAgentTool(agent=flight_recommender),
+            TracedAgentTool(agent=itinerary_recommender),
+            TracedAgentTool(agent=financial_planner_agent), # Added financial planner
+            TracedAgentTool(agent=food_recommender),
+            # Google Workspace calls run as background jobs, so the turn does not wait on them
+            submit_google_doc_export_tool,
+            submit_google_file_deletion_tool,
+            submit_google_sheet_export_tool,
+            get_export_job_status_tool
+        ]
+
+    )
+
+    return {
+        "flight_recommender": flight_recommender,
+        "hotel_recommender": hotel_recommender,
+        "itinerary_recommender": itinerary_recommender,
+        "trip_research_planner": trip_research_planner,
+        "food_recommender": food_recommender,
+        "financial_planner_agent": financial_planner_agent,
+        "root_agent": root_agent,
+    }
+
+
+_AGENT_NAMES = (
+    "flight_recommender", "hotel_recommender", "itinerary_recommender",
+    "trip_research_planner", "food_recommender", "financial_planner_agent", "root_agent",
 )
+_agents_lock = threading.Lock()
+
+
+def __getattr__(name: str):
+    # Agents share sub-agents (an agent can only have one parent), so they are built together on first access
+    if name in _AGENT_NAMES:
+        with _agents_lock:
+            if name not in globals():
+                globals().update(_build_agents())
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,221 @@
+# Session artifact store: sub-agent outputs saved under keys so export tools can take the key instead of
+# the model re-emitting the whole text as a tool argument
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .storage import connect, data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+ARTIFACT_STORE_BACKEND = os.getenv("ARTIFACT_STORE_BACKEND", "memory") # "memory" or "sqlite"
+ARTIFACT_STORE_PATH = os.getenv("ARTIFACT_STORE_PATH") # Defaults to artifacts.sqlite3 in the data dir
+ARTIFACT_TTL_SECONDS = int(os.getenv("ARTIFACT_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+ARTIFACT_MEMORY_MAX_BYTES = int(os.getenv("ARTIFACT_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Session state entry holding the artifact scope. Sub-agents run by an AgentTool get a copy of the caller's
+# state, so everything saved during one conversation shares the root session's scope.
+SCOPE_STATE_KEY = "artifact_scope"
+
+# Names the agents save outputs under. A tool argument equal to one of them is a reference, never content.
+KNOWN_ARTIFACTS = ("flight_data", "hotel_data", "itinerary_data", "food_data")
+KNOWN_ARTIFACT_PREFIX = "financial_"
+
+
+class MissingArtifact(LookupError):
+    """A tool argument names a known artifact that is not saved for this conversation."""
+
+    def __init__(self, name: str):
+        super().__init__(
+            f"No '{name}' saved for this conversation (not produced yet, or expired); "
+            f"run the step that produces it first, or pass the content itself.")
+        self.name = name
+
+
+class ArtifactStore:
+    """
+    Artifacts by (scope, name). Kept in memory, least recently used first out once they take more than
+    `memory_max_bytes`; with a SQLite `path` every artifact is also written through to disk, so it
+    outlives the process and other workers can read it. Artifacts expire `ttl_seconds` after being saved.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = ARTIFACT_TTL_SECONDS, memory_max_bytes: int = ARTIFACT_MEMORY_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.memory_max_bytes = memory_max_bytes
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, int, Any]]" = OrderedDict() # -> (saved_at, size, value)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = connect(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " scope TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " saved_at REAL NOT NULL, PRIMARY KEY (scope, name))"
+            )
+            self._conn.execute("DELETE FROM artifacts WHERE saved_at <= ?", (time.time() - ttl_seconds,))
+            self._conn.commit()
+        self.saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.resolved_bytes = 0
+
+    def put(self, scope: str, name: str, value: Any) -> Dict[str, Any]:
+        """Saves `value` (anything JSON-serializable) as `name` in `scope`; returns a small reference to it."""
+        now = time.time()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remember((scope, name), now, len(encoded), value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (scope, name, value, size, saved_at) VALUES (?, ?, ?, ?, ?)",
+                    (scope, name, encoded, len(encoded), now),
+                )
+                self._conn.commit()
+            self.saves += 1
+        return {"key": name, "bytes": len(encoded)}
+
+    def get(self, scope: str, name: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((scope, name))
+            if entry is not None and entry[0] + self.ttl_seconds > now:
+                self._memory.move_to_end((scope, name))
+                self.hits += 1
+                self.resolved_bytes += entry[1]
+                return entry[2]
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, size, saved_at FROM artifacts WHERE scope = ? AND name = ? AND saved_at > ?",
+                    (scope, name, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember((scope, name), row[2], row[1], value)
+                    self.hits += 1
+                    self.resolved_bytes += row[1]
+                    return value
+            self.misses += 1
+            return None
+
+    def names(self, scope: str) -> List[str]:
+        """Names of the unexpired artifacts saved in `scope`."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            found = {name for (s, name), (saved_at, _, _) in self._memory.items() if s == scope and saved_at > cutoff}
+            if self._conn is not None:
+                found.update(row[0] for row in self._conn.execute(
+                    "SELECT name FROM artifacts WHERE scope = ? AND saved_at > ?", (scope, cutoff)))
+        return sorted(found)
+
+    def _remember(self, key: Tuple[str, str], saved_at: float, size: int, value: Any) -> None:
+        # Caller holds self._lock
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[1]
+        self._memory[key] = (saved_at, size, value)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+            _, (_, dropped, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= dropped
+            if self._conn is None:
+                logger.warning("artifacts - memory store full, dropped an artifact of %s bytes", dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "saves": self.saves,
+                "hits": self.hits,
+                "misses": self.misses,
+                "resolved_bytes": self.resolved_bytes,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "backend": "sqlite" if self._conn is not None else "memory",
+            }
+
+
+_store: Optional[ArtifactStore] = None
+_init_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _store
+    if _store is None:
+        with _init_lock:
+            if _store is None:
+                path = None
+                if ARTIFACT_STORE_BACKEND == "sqlite":
+                    path = ARTIFACT_STORE_PATH or data_path("artifacts.sqlite3")
+                _store = ArtifactStore(path)
+    return _store
+
+
+def session_scope(context) -> str:
+    """Artifact scope of the conversation a tool or callback context belongs to."""
+    scope = context.state.get(SCOPE_STATE_KEY)
+    if not scope:
+        scope = context.state[SCOPE_STATE_KEY] = context.session.id
+    return scope
+
+
+def save_artifact(context, name: str, value: Any) -> Dict[str, Any]:
+    """Saves `value` as `name` for the conversation of `context` (a ToolContext or CallbackContext)."""
+    return get_artifact_store().put(session_scope(context), name, value)
+
+
+def resolve(context, value: Any, default_name: str) -> Any:
+    """
+    Content for a tool argument that may be passed by reference: a missing value resolves to the artifact
+    `default_name`, a string naming an artifact of this conversation resolves to that artifact, and
+    anything else is returned as given. Without a context (direct calls) values are returned unchanged.
+    Raises MissingArtifact for the name of a known artifact (KNOWN_ARTIFACTS, "financial_*") that is not
+    saved, rather than passing the name on as content.
+    """
+    if context is None:
+        return value
+    store = get_artifact_store()
+    if value is None or value == "":
+        stored = store.get(session_scope(context), default_name)
+        return value if stored is None else stored
+    if isinstance(value, str) and len(value) <= 128:
+        name = value.strip()
+        stored = store.get(session_scope(context), name)
+        if stored is not None:
+            return stored
+        if name in KNOWN_ARTIFACTS or name.startswith(KNOWN_ARTIFACT_PREFIX):
+            raise MissingArtifact(name)
+    return value
+
+
+def _output_keys(agent) -> List[str]:
+    keys = [agent.output_key] if getattr(agent, "output_key", None) else []
+    for sub_agent in getattr(agent, "sub_agents", None) or []:
+        keys += [key for key in _output_keys(sub_agent) if key not in keys]
+    return keys
+
+
+def save_agent_outputs(tool, args: Dict[str, Any], tool_context, tool_response: Any) -> None:
+    """
+    after_tool_callback that saves the `output_key` state of an agent tool's agent (and its sub-agents)
+    as artifacts of the conversation, so later tools can be given the key instead of the text.
+    """
+    agent = getattr(tool, "agent", None)
+    if agent is None:
+        return None
+    for key in _output_keys(agent):
+        value = tool_context.state.get(key)
+        if value:
+            reference = save_artifact(tool_context, key, value)
+            logger.debug("artifacts - saved %s (%s bytes) from %s", key, reference["bytes"], agent.name)
+    return None
+
+
+def artifact_stats() -> Dict[str, Any]:
+    """Saves, lookups and memory use of the artifact store."""
+    return get_artifact_store().stats()
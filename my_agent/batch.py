@@ -0,0 +1,208 @@
+# Non-interactive batch trip generation
+#
+# Reads one trip request per line (JSONL) and streams one result record per line as each trip finishes:
+#   {"id": "rome-1", "city": "Rome", "interests": ["art", "food"], "budget": 1500, "days": 4}
+#   {"id": "nyc-7", "home_city": "New York", "interests": "hiking, beaches", "budget": 900, "days": 3}
+# Requests with "city" go through get_trip_itinerary (test.py), requests with "home_city" through
+# plan_smart_trip (test2.py). Requests without an "id" are identified by their line number.
+#
+# Usage: python -m my_agent.batch trips.jsonl -o results.jsonl --workers 8
+#        cat trips.jsonl | python -m my_agent.batch - -o results.jsonl
+# Re-running with the same output file resumes: trips that already succeeded are skipped.
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from .context import context_stats
+from .itinerary_cache import itinerary_cache_stats
+from .resilience import resilience_stats
+from .singleflight import singleflight_stats
+
+
+def _itinerary(request: Dict[str, Any]) -> Dict[str, Any]:
+    from .test import get_trip_itinerary
+
+    return get_trip_itinerary(city=request["city"], interests=request["interests"], budget=request["budget"], days=request["days"])
+
+
+def _smart_trip(request: Dict[str, Any]) -> Dict[str, Any]:
+    from .test2 import plan_smart_trip
+
+    return plan_smart_trip(home_city=request["home_city"], interests=request["interests"], budget=request["budget"], days=request["days"])
+
+
+# mode -> (location field, generator)
+MODES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    "itinerary": ("city", _itinerary),
+    "smart_trip": ("home_city", _smart_trip),
+}
+
+
+def normalize_request(raw: Dict[str, Any], mode: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """Validates a raw request line and returns (mode, request) with interests as a list and numbers as ints."""
+    if mode is None:
+        mode = "itinerary" if raw.get("city") else "smart_trip" if raw.get("home_city") else None
+    if mode not in MODES:
+        raise ValueError("request needs a 'city' or 'home_city'")
+    location_field = MODES[mode][0]
+    if not raw.get(location_field):
+        raise ValueError(f"request needs '{location_field}' in {mode} mode")
+    interests = raw.get("interests", [])
+    if isinstance(interests, str):
+        interests = [i.strip() for i in interests.split(",") if i.strip()]
+    request = {
+        location_field: str(raw[location_field]).strip(),
+        "interests": list(interests),
+        "budget": int(raw["budget"]),
+        "days": int(raw["days"]),
+    }
+    return mode, request
+
+
+def read_requests(stream: TextIO) -> Iterator[Tuple[str, Any]]:
+    """Yields (id, raw request) per non-empty line; unparsable lines yield the parse error as the request."""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield f"line-{line_number}", e
+            continue
+        request_id = raw.get("id") if isinstance(raw, dict) else None
+        yield str(request_id) if request_id is not None else f"line-{line_number}", raw
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """IDs that already have a success record in `output_path` (the resume checkpoint)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # A partially written last line from an interrupted run
+            if record.get("status") == "success":
+                done.add(record.get("id"))
+    return done
+
+
+def _run_one(request_id: str, raw: Any, mode: Optional[str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"id": request_id}
+    try:
+        if isinstance(raw, Exception):
+            raise ValueError(f"invalid JSON: {raw}")
+        if not isinstance(raw, dict):
+            raise ValueError("request must be a JSON object")
+        request_mode, request = normalize_request(raw, mode)
+        record.update(mode=request_mode, request=request)
+        record["result"] = MODES[request_mode][1](request)
+        record["status"] = "success"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(
+    requests: Iterator[Tuple[str, Any]],
+    output: TextIO,
+    workers: int = 4,
+    mode: Optional[str] = None,
+    skip_ids: Optional[Set[str]] = None,
+    on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Runs trip requests on a pool of `workers` threads and writes each result record to `output`
+    as soon as it finishes. At most 2 * workers requests are in flight, so arbitrarily large
+    inputs are streamed rather than loaded up front. Returns a throughput summary.
+    """
+    skip_ids = skip_ids or set()
+    write_lock = threading.Lock()
+    latencies: List[float] = []
+    counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    def record_done(record: Dict[str, Any]) -> None:
+        with write_lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            latencies.append(record["elapsed_seconds"])
+            counts["succeeded" if record["status"] == "success" else "failed"] += 1
+        if on_record:
+            on_record(record)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        in_flight = set()
+        for request_id, raw in requests:
+            if request_id in skip_ids:
+                counts["skipped"] += 1
+                continue
+            if len(in_flight) >= 2 * workers:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record_done(future.result())
+            in_flight.add(pool.submit(_run_one, request_id, raw, mode))
+        for future in wait(in_flight).done:
+            record_done(future.result())
+
+    elapsed = time.perf_counter() - start
+    processed = counts["succeeded"] + counts["failed"]
+    ordered = sorted(latencies)
+    return {
+        **counts,
+        "processed": processed,
+        "elapsed_seconds": round(elapsed, 3),
+        "trips_per_minute": round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "latency_p50_seconds": round(statistics.median(ordered), 3) if ordered else None,
+        "latency_p95_seconds": round(ordered[int(0.95 * (len(ordered) - 1))], 3) if ordered else None,
+        "itinerary_cache": itinerary_cache_stats(),
+        "context": context_stats(),
+        "upstreams": resilience_stats(),
+        "singleflight": singleflight_stats(),
+    }
+
+
+def main(argv: Optional[List[str]] = None, default_mode: Optional[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate trip plans in bulk from a JSONL file of trip requests.")
+    parser.add_argument("input", help="JSONL file with one trip request per line, or '-' for stdin")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to (also the resume checkpoint)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="number of trips generated concurrently")
+    parser.add_argument("--mode", choices=sorted(MODES), default=default_mode,
+                        help="force a mode instead of picking it from 'city' / 'home_city'")
+    parser.add_argument("--no-resume", action="store_true", help="do not skip trips already recorded as successful")
+    args = parser.parse_args(argv)
+
+    skip_ids = set() if args.no_resume else completed_ids(args.output)
+    if skip_ids:
+        print(f"INFO: Resuming - {len(skip_ids)} trips already completed in {args.output}", file=sys.stderr)
+
+    def progress(record: Dict[str, Any]) -> None:
+        print(f"{record['status'].upper()}: {record['id']} ({record['elapsed_seconds']}s)", file=sys.stderr)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            summary = run_batch(read_requests(source), output, workers=args.workers, mode=args.mode,
+                                skip_ids=skip_ids, on_record=progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# Deterministic trip budget engine: totals, budget difference, percentages and the summary text,
+# plus many-scenario comparisons (hotel tier x trip length x currency) computed with NumPy in one call
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import resilience
+from .storage import data_path
+from .tracing import lazy_tools
+
+
+logger = logging.getLogger(__name__)
+
+
+CATEGORIES = ("Flights", "Hotels", "Itinerary", "Food")
+
+FX_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exchange_rates.json")
+# JSON endpoint returning {"rates": {"EUR": 0.97, ...}} against USD (e.g. https://open.er-api.com/v6/latest/USD).
+# Unset, only the bundled table is used; set, its response is cached in the data dir for FX_RATES_TTL_SECONDS.
+FX_RATES_URL = os.getenv("FX_RATES_URL")
+FX_RATES_TTL_SECONDS = int(os.getenv("FX_RATES_TTL_SECONDS", str(24 * 60 * 60)))
+# Largest scenario grid compare_budget_scenarios() will compute
+BUDGET_MAX_SCENARIOS = int(os.getenv("BUDGET_MAX_SCENARIOS", "2000"))
+
+_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "INR": "₹", "KRW": "₩"}
+
+
+def budget_table(costs: np.ndarray, budgets: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized budget arithmetic. `costs` has the categories on its last axis; `budgets` broadcasts against
+    the remaining axes. Returns total, difference (budget - total) and percentage of the budget saved
+    (positive) or overspent (negative); the percentage is NaN where the budget is not positive.
+    """
+    total = np.asarray(costs, dtype=np.float64).sum(axis=-1)
+    budgets = np.asarray(budgets, dtype=np.float64)
+    difference = budgets - total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentage = np.where(budgets > 0, difference / budgets * 100, np.nan)
+    return {"total": total, "difference": difference, "percentage": percentage}
+
+
+def _amount(value: float, currency: str = "USD") -> str:
+    # "$500", "$1250.50", "€80"; other currencies as "SEK 1200"
+    text = f"{value:.0f}" if float(value).is_integer() else f"{value:.2f}"
+    symbol = _SYMBOLS.get(currency)
+    return f"{symbol}{text}" if symbol else f"{currency} {text}"
+
+
+def summary_text(source: str, destination: str, costs: Dict[str, float], budget: float, currency: str = "USD") -> str:
+    """The financial planner's summary sentence for one trip, worded exactly as the agent was instructed to write it."""
+    figures = budget_table(np.array([costs.get(c, 0.0) for c in CATEGORIES]), np.array(budget))
+    total, difference = float(figures["total"]), float(figures["difference"])
+    money = lambda value: _amount(value, currency)
+    text = (
+        f"For your trip from {source} to {destination}, you are planning to spend {money(costs.get('Flights', 0.0))} on flights, "
+        f"{money(costs.get('Hotels', 0.0))} on hotels, {money(costs.get('Itinerary', 0.0))} on itinerary activities, "
+        f"and {money(costs.get('Food', 0.0))} on food. Your total estimated cost is {money(total)}."
+    )
+    if budget > 0 and total > 0:
+        if difference >= 0:
+            text += (f" With a budget of {money(budget)}, you are **under budget by {money(difference)}, "
+                     f"which is a {figures['percentage']:.1f}% saving**.")
+        else:
+            text += (f" With a budget of {money(budget)}, you are **over budget by {money(abs(difference))}, "
+                     f"which is {abs(figures['percentage']):.1f}% over your budget**.")
+    elif budget <= 0 and total > 0:
+        text += f" Your budget is {money(budget)}, and your total estimated cost for this trip is {money(total)}."
+    elif budget <= 0 and total <= 0:
+        text += " No costs or budget specified for analysis."
+    return text
+
+
+def plan_totals(financial_data: Dict[str, float]) -> Tuple[float, float]:
+    """(total estimated cost, budget - total) for a {"Flights", "Hotels", "Itinerary", "Food", "Budget"} dict."""
+    figures = budget_table(np.array([float(financial_data.get(c, 0.0) or 0.0) for c in CATEGORIES]),
+                           np.array(float(financial_data.get("Budget", 0.0) or 0.0)))
+    return float(figures["total"]), float(figures["difference"])
+
+
+class ExchangeRates:
+    """Units of each currency per US dollar, as one NumPy vector for converting whole scenario grids at once."""
+
+    def __init__(self, rates: Dict[str, float], as_of: str, source: str):
+        self.codes = sorted(rates)
+        self.per_usd = np.array([rates[code] for code in self.codes], dtype=np.float64)
+        self.as_of = as_of
+        self.source = source
+        self._positions = {code: i for i, code in enumerate(self.codes)}
+
+    def vector(self, currencies: Sequence[str]) -> np.ndarray:
+        """Rates for `currencies` (ISO codes); raises KeyError naming the first unknown one."""
+        missing = [c for c in currencies if c.upper() not in self._positions]
+        if missing:
+            raise KeyError(missing[0])
+        return self.per_usd[[self._positions[c.upper()] for c in currencies]]
+
+    def convert(self, amount: Any, from_currency: str, to_currency: str) -> Any:
+        source, target = self.vector([from_currency, to_currency])
+        return np.asarray(amount, dtype=np.float64) * (target / source)
+
+
+def _bundled_rates() -> Dict[str, Any]:
+    with open(FX_RATES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _fetch_rates(url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        payload = json.load(response)
+    return {"rates": payload["rates"], "as_of": payload.get("time_last_update_utc") or time.strftime("%Y-%m-%d"), "source": url}
+
+
+def _load_rates() -> ExchangeRates:
+    table = _bundled_rates()
+    if FX_RATES_URL:
+        cache_path = data_path("exchange_rates.json")
+        cached = None
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        if cached is not None and cached.get("fetched_at", 0) + FX_RATES_TTL_SECONDS > time.time():
+            table = cached
+        else:
+            try:
+                table = dict(resilience.call("fx", _fetch_rates, FX_RATES_URL), fetched_at=time.time())
+                with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(table, f)
+                os.replace(cache_path + ".tmp", cache_path)
+            except Exception as e:
+                # Stale rates beat none: keep the last fetched table, or the bundled one
+                logger.warning("budget - could not refresh exchange rates from %s: %s", FX_RATES_URL, e)
+                table = cached or table
+    return ExchangeRates(table["rates"], table.get("as_of", "unknown"), table.get("source", FX_RATES_PATH))
+
+
+_rates: Optional[ExchangeRates] = None
+_rates_loaded_at = 0.0
+_rates_lock = threading.Lock()
+
+
+def get_exchange_rates() -> ExchangeRates:
+    global _rates, _rates_loaded_at
+    if _rates is None or (FX_RATES_URL and _rates_loaded_at + FX_RATES_TTL_SECONDS <= time.time()):
+        with _rates_lock:
+            if _rates is None or (FX_RATES_URL and _rates_loaded_at + FX_RATES_TTL_SECONDS <= time.time()):
+                _rates = _load_rates()
+                _rates_loaded_at = time.time()
+    return _rates
+
+
+def calculate_trip_budget(
+    source: str,
+    destination: str,
+    flights: float,
+    hotels: float,
+    itinerary: float,
+    food: float,
+    budget: float,
+    currency: str = "USD",
+    tool_context: Any = None,
+) -> Dict[str, Any]:
+    """
+    Calculates the total estimated cost of a trip, the difference to the budget and the saving or
+    overspending percentage, and writes the financial summary text. Use this instead of doing the math.
+
+    Args:
+        source: Where the trip starts.
+        destination: Where the trip goes.
+        flights: Estimated flight cost (0 if unknown).
+        hotels: Estimated hotel cost (0 if unknown).
+        itinerary: Estimated cost of activities and local transport (0 if unknown).
+        food: Estimated food cost (0 if unknown).
+        budget: The total budget for the trip.
+        currency: ISO code of the currency all amounts are in (default "USD").
+
+    Returns:
+        {"status": "success", "total_estimated_cost", "difference", "savings_percentage" or
+        "overspending_percentage", "summary_text", "financial_data"} where financial_data is ready to pass
+        to the Google Sheets export tool together with summary_text as its financial_summary. Both are
+        also saved for the conversation, so the export tool can be called without them.
+    """
+    costs = {"Flights": float(flights or 0), "Hotels": float(hotels or 0), "Itinerary": float(itinerary or 0), "Food": float(food or 0)}
+    budget = float(budget or 0)
+    figures = budget_table(np.array([costs[c] for c in CATEGORIES]), np.array(budget))
+    total, difference, percentage = float(figures["total"]), float(figures["difference"]), float(figures["percentage"])
+    result = {
+        "status": "success",
+        "currency": currency.upper(),
+        "total_estimated_cost": round(total, 2),
+        "budget": budget,
+        "difference": round(difference, 2),
+        "within_budget": difference >= 0,
+        "summary_text": summary_text(source, destination, costs, budget, currency.upper()),
+        "financial_data": dict(costs, Budget=budget),
+    }
+    if not np.isnan(percentage):
+        key = "savings_percentage" if difference >= 0 else "overspending_percentage"
+        result[key] = round(abs(percentage), 1)
+    if tool_context is not None:
+        from .artifacts import save_artifact
+
+        save_artifact(tool_context, "financial_data", result["financial_data"])
+        save_artifact(tool_context, "financial_summary", result["summary_text"])
+    return result
+
+
+def compare_budget_scenarios(
+    budget: float,
+    flights: float,
+    hotel_nightly_rates: Dict[str, float],
+    trip_lengths_days: List[int],
+    daily_food: float = 0.0,
+    daily_activities: float = 0.0,
+    currencies: Optional[List[str]] = None,
+    budget_currency: str = "USD",
+) -> Dict[str, Any]:
+    """
+    Compares many trip variants against a budget in one call: every hotel tier x trip length, with the
+    totals shown in each requested currency. A trip of N days is priced with N hotel nights.
+
+    Args:
+        budget: The total budget, in budget_currency.
+        flights: Round-trip flight cost, in budget_currency.
+        hotel_nightly_rates: Nightly hotel price per tier, e.g. {"budget": 60, "mid-range": 120, "luxury": 300}.
+        trip_lengths_days: Trip lengths to compare, e.g. [3, 5, 7].
+        daily_food: Food cost per day.
+        daily_activities: Activities and local transport cost per day.
+        currencies: ISO codes to show totals in (default: just budget_currency), e.g. ["USD", "EUR", "JPY"].
+        budget_currency: ISO code of all the amounts above (default "USD").
+
+    Returns:
+        {"status": "success", "scenarios": [{hotel_tier, days, total, difference, within_budget, percentage,
+        totals_by_currency}], "longest_within_budget": {tier: days}, "cheapest": {...}, "rates_as_of": ...}
+    """
+    tiers = list(hotel_nightly_rates)
+    currencies = [c.upper() for c in (currencies or [budget_currency])]
+    if not tiers or not trip_lengths_days:
+        return {"status": "error", "message": "Provide at least one hotel tier and one trip length."}
+    if len(tiers) * len(trip_lengths_days) * len(currencies) > BUDGET_MAX_SCENARIOS:
+        return {"status": "error", "message": f"Too many scenarios; at most {BUDGET_MAX_SCENARIOS} tier x length x currency combinations."}
+    rates = get_exchange_rates()
+    try:
+        fx = rates.vector(currencies) / rates.vector([budget_currency])[0]
+    except KeyError as e:
+        return {"status": "error", "message": f"Unknown currency {e.args[0]}. Known: {', '.join(rates.codes)}"}
+
+    nightly = np.array([float(hotel_nightly_rates[t]) for t in tiers])[:, None] # (tiers, 1)
+    days = np.array(trip_lengths_days, dtype=np.float64)[None, :]                 # (1, lengths)
+    costs = np.stack(np.broadcast_arrays(
+        np.full((len(tiers), days.shape[1]), float(flights)), nightly * days,
+        float(daily_activities) * days, float(daily_food) * days), axis=-1)        # (tiers, lengths, categories)
+    figures = budget_table(costs, np.array(float(budget)))
+    in_currency = figures["total"][..., None] * fx                                # (tiers, lengths, currencies)
+
+    scenarios = []
+    for t, tier in enumerate(tiers):
+        for d, length in enumerate(trip_lengths_days):
+            scenarios.append({
+                "hotel_tier": tier,
+                "days": int(length),
+                "total": round(float(figures["total"][t, d]), 2),
+                "difference": round(float(figures["difference"][t, d]), 2),
+                "within_budget": bool(figures["difference"][t, d] >= 0),
+                "percentage": None if np.isnan(figures["percentage"][t, d]) else round(float(figures["percentage"][t, d]), 1),
+                "totals_by_currency": {c: round(float(in_currency[t, d, i]), 2) for i, c in enumerate(currencies)},
+            })
+    within = figures["difference"] >= 0
+    lengths = np.array(trip_lengths_days)
+    cheapest = np.unravel_index(np.argmin(figures["total"]), figures["total"].shape)
+    return {
+        "status": "success",
+        "budget_currency": budget_currency.upper(),
+        "scenarios": scenarios,
+        # Longest trip per tier that stays within the budget (None if no length fits)
+        "longest_within_budget": {
+            tier: int(lengths[within[t]].max()) if within[t].any() else None for t, tier in enumerate(tiers)
+        },
+        "cheapest": {"hotel_tier": tiers[cheapest[0]], "days": int(lengths[cheapest[1]]),
+                     "total": round(float(figures["total"][cheapest]), 2)},
+        "rates_as_of": rates.as_of,
+    }
+
+
+__getattr__ = lazy_tools(__name__, {
+    "calculate_trip_budget_tool": calculate_trip_budget,
+    "compare_budget_scenarios_tool": compare_budget_scenarios,
+})
@@ -0,0 +1,207 @@
+# Compacts search results into a token-budgeted context block for LLM prompts
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Set
+
+from .tracing import current_span
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Snippets whose word-trigram overlap with an already kept snippet reaches this are dropped
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.7"))
+# Share of the budget a single result may take, so the context keeps several sources
+CONTEXT_MAX_RESULT_SHARE = float(os.getenv("CONTEXT_MAX_RESULT_SHARE", "0.3"))
+
+# Sentences containing any of these as whole words are site chrome rather than travel information.
+# Cookie notices are matched by their wording, so sentences about cookie shops are kept.
+_BOILERPLATE_PHRASES = (
+    "cookie policy", "cookie settings", "cookie preferences", "use cookies", "accept cookies", "accept all cookies",
+    "subscribe", "sign up", "log in", "login", "newsletter", "all rights reserved", "privacy policy",
+    "terms of use", "terms of service", "click here", "advertisement", "skip to content", "skip to main content",
+    "javascript", "share this", "share on", "follow us", "read more", "related posts", "related articles",
+    "affiliate link", "affiliate links", "powered by", "copyright", "©",
+)
+# (?<!\w)/(?!\w) rather than \b, which never matches next to "©"
+_BOILERPLATE = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, _BOILERPLATE_PHRASES)) + r")(?!\w)", re.IGNORECASE)
+_MARKDOWN_NOISE = re.compile(r"!\[[^\]]*\]\([^)]*\)|\[([^\]]*)\]\([^)]*\)|https?://\S+|[#*_>|]{2,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9$€£]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "you your our we their best top things do".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Gemini token count (about four characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _words(text) if word not in _STOPWORDS]
+
+
+def _is_boilerplate(text: str) -> bool:
+    return _BOILERPLATE.search(text) is not None
+
+
+def _shingles(words: List[str]) -> Set[int]:
+    if len(words) < 3:
+        return {hash(" ".join(words))}
+    return {hash((words[i], words[i + 1], words[i + 2])) for i in range(len(words) - 2)}
+
+
+def clean_sentences(text: str) -> List[str]:
+    """Splits page text into sentences, dropping markdown/link noise, navigation fragments and boilerplate."""
+    text = _MARKDOWN_NOISE.sub(r"\1", text or "")
+    # Most snippets contain no boilerplate at all, so one scan of the whole text spares the per-sentence checks
+    check = _is_boilerplate(text)
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = " ".join(sentence.split())
+        # Very short fragments are usually menu items, bylines or captions
+        if len(sentence) < 25 or (check and _is_boilerplate(sentence)):
+            continue
+        sentences.append(sentence)
+    return sentences
+
+
+@dataclass
+class CompactContext:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    results_in: int
+    results_kept: int
+    duplicates_dropped: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_before - self.tokens_after, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "results_in": self.results_in,
+            "results_kept": self.results_kept,
+            "duplicates_dropped": self.duplicates_dropped,
+        }
+
+
+def _raw_tokens(results: Iterable[Dict[str, Any]]) -> int:
+    # What the prompt would have carried without compaction: every field of every result
+    return sum(
+        estimate_tokens(f"{r.get('title', '')} {r.get('url', '')} {r.get('content') or ''} {r.get('raw_content') or ''}")
+        for r in results
+    )
+
+
+def _score(words: List[str], query_terms: Counter, search_score: float) -> float:
+    # Term-frequency overlap with the trip parameters, damped by length, plus the search engine's own score
+    if not words:
+        return 0.0
+    counts = Counter(words)
+    overlap = sum(min(counts[term], 3) * weight for term, weight in query_terms.items())
+    return overlap / math.sqrt(len(words)) + search_score
+
+
+def compact_results(
+    results: Dict[str, Any],
+    query: str,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_result_share: float = CONTEXT_MAX_RESULT_SHARE,
+    duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY,
+) -> CompactContext:
+    """
+    Turns a Tavily-shaped {"results": [...]} dict into a markdown bullet list for a prompt:
+    boilerplate is stripped, near-identical snippets and repeated sentences are dropped, results are
+    ranked by relevance to `query` (e.g. city and interests) and packed into `token_budget` tokens.
+    """
+    items = results.get("results", [])
+    query_terms = Counter(_terms(query))
+    candidates = []
+    for result in items:
+        # The snippet comes first; full page text (include_raw_content) only adds sentences not already in it
+        sentences = clean_sentences(result.get("content") or "") + clean_sentences(result.get("raw_content") or "")
+        if sentences:
+            words = _words(" ".join(sentences))
+            candidates.append((_score(words, query_terms, float(result.get("score") or 0.0)), result, sentences, words))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    lines: List[str] = []
+    used = 0
+    duplicates = 0
+    kept_shingles: List[Set[int]] = []
+    seen_sentences: Set[str] = set()
+    per_result = max(int(token_budget * max_result_share), 40)
+    for _, result, sentences, words in candidates:
+        shingles = _shingles(words)
+        if any(len(shingles & other) / max(len(shingles | other), 1) >= duplicate_similarity for other in kept_shingles):
+            duplicates += 1
+            continue
+        prefix = f"- [{result.get('title', '').strip()}]({result.get('url', '')}): "
+        remaining = min(per_result, token_budget - used) - estimate_tokens(prefix)
+        picked = []
+        for sentence in sentences:
+            key = " ".join(_words(sentence))
+            if key in seen_sentences:
+                continue
+            cost = estimate_tokens(sentence) + 1
+            if cost > remaining:
+                break
+            picked.append(sentence)
+            seen_sentences.add(key)
+            remaining -= cost
+        if not picked:
+            continue
+        line = prefix + " ".join(picked)
+        lines.append(line)
+        kept_shingles.append(shingles)
+        used += estimate_tokens(line) + 1
+        if token_budget - used < 40:
+            break
+
+    context = CompactContext(
+        text="\n".join(lines),
+        tokens_before=_raw_tokens(items),
+        tokens_after=used,
+        results_in=len(items),
+        results_kept=len(lines),
+        duplicates_dropped=duplicates,
+    )
+    _record(context)
+    return context
+
+
+_totals = Counter()
+_totals_lock = threading.Lock()
+
+
+def _record(context: CompactContext) -> None:
+    with _totals_lock:
+        _totals.update(context.as_dict())
+        _totals["calls"] += 1
+    span = current_span()
+    if span is not None:
+        span.set(context_tokens=context.tokens_after, context_tokens_saved=context.tokens_saved)
+    logger.info("context - kept %s of %s results in %s tokens (saved %s, %s duplicates dropped)",
+                context.results_kept, context.results_in, context.tokens_after, context.tokens_saved, context.duplicates_dropped)
+
+
+def context_stats() -> Dict[str, int]:
+    """Token totals over every compaction in this process."""
+    with _totals_lock:
+        return {key: _totals[key] for key in ("calls", "tokens_before", "tokens_after", "tokens_saved", "duplicates_dropped")}
@@ -0,0 +1,371 @@
+# Offline destination index: the closest places matching a traveler's interests, answered without an LLM call
+#
+# Places are held in flat NumPy arrays (coordinates, a 64-bit interest tag mask, typical daily cost, names
+# packed into one UTF-8 buffer) sorted by a lat/lon grid cell, so a query only measures the distance to the
+# places in a window of cells around the origin and widens the window until the top k are certain.
+#
+# Usage: python -m my_agent.destinations build places.csv places.npz
+#        python -m my_agent.destinations query "Lisbon" art food [--limit 5] [--index places.npz]
+import argparse
+import csv
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .itinerary_cache import canonical_interests, normalize_city
+from .tracing import lazy_tools
+
+
+logger = logging.getLogger(__name__)
+
+
+# A .npz written by DestinationIndex.save or a CSV with name,country,lat,lon,daily_cost_usd,tags ("|"-separated)
+DESTINATIONS_PATH = os.getenv("DESTINATIONS_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "destinations.csv")
+DESTINATIONS_GRID_DEGREES = float(os.getenv("DESTINATIONS_GRID_DEGREES", "1.0"))
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_TAGS = 64 # One bit per tag in a uint64
+
+# Interest spellings canonical_interests() leaves alone but the tag vocabulary spells differently
+_TAG_ALIASES = {"skiing": "ski", "islands": "island", "wines": "wine", "theater": "theatre", "relax": "relaxation", "romantic": "romance"}
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"): # NumPy 2.0+
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points (all in degrees)."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats.astype(np.float64)), np.radians(lons.astype(np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _grid_shape(grid_degrees: float) -> Tuple[int, int]:
+    return int(math.ceil(180 / grid_degrees)), int(math.ceil(360 / grid_degrees))
+
+
+def _grid_cells(lat: Any, lon: Any, grid_degrees: float) -> Tuple[Any, Any]:
+    # (row, column) of the grid cell holding each point
+    rows, cols = _grid_shape(grid_degrees)
+    row = np.clip(((np.asarray(lat, dtype=np.float64) + 90) // grid_degrees).astype(np.int64), 0, rows - 1)
+    col = np.clip(((np.asarray(lon, dtype=np.float64) + 180) // grid_degrees).astype(np.int64), 0, cols - 1)
+    return row, col
+
+
+def _pack(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Strings as one UTF-8 byte array plus offsets, so the .npz holds no pickled objects
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class DestinationIndex:
+    """
+    Array-backed places index. Build it with from_records()/from_csv(), persist it with save()/load(),
+    and query it with nearest().
+    """
+
+    _ARRAYS = ("lat", "lon", "tags", "daily_cost", "names", "name_offsets", "countries", "country_offsets", "tag_names", "cell_starts")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], grid_degrees: float):
+        for name in self._ARRAYS:
+            setattr(self, name, arrays[name])
+        self.grid_degrees = grid_degrees
+        self.rows, self.cols = _grid_shape(grid_degrees)
+        self._tag_bits = {str(tag): np.uint64(1) << np.uint64(i) for i, tag in enumerate(self.tag_names)}
+        self._by_name: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, str, float, float, float, Sequence[str]]],
+                     grid_degrees: float = DESTINATIONS_GRID_DEGREES) -> "DestinationIndex":
+        """Builds an index from (name, country, lat, lon, daily cost in USD, tags) tuples."""
+        records = list(records)
+        tag_names = sorted({tag for record in records for tag in record[5]})
+        if len(tag_names) > MAX_TAGS:
+            raise ValueError(f"{len(tag_names)} distinct tags; the index supports at most {MAX_TAGS}")
+        bits = {tag: 1 << i for i, tag in enumerate(tag_names)}
+        lat = np.array([r[2] for r in records], dtype=np.float32)
+        lon = np.array([r[3] for r in records], dtype=np.float32)
+        rows, cols = _grid_shape(grid_degrees)
+        row, col = _grid_cells(lat, lon, grid_degrees)
+        cells = row * cols + col
+        order = np.argsort(cells, kind="stable")
+        records = [records[i] for i in order]
+        names, name_offsets = _pack([r[0] for r in records])
+        countries, country_offsets = _pack([r[1] for r in records])
+        arrays = {
+            "lat": lat[order],
+            "lon": lon[order],
+            "tags": np.array([sum(bits[t] for t in set(r[5])) for r in records], dtype=np.uint64),
+            "daily_cost": np.array([r[4] for r in records], dtype=np.float32),
+            "names": names,
+            "name_offsets": name_offsets,
+            "countries": countries,
+            "country_offsets": country_offsets,
+            "tag_names": np.array(tag_names, dtype=str),
+            # cell_starts[c]:cell_starts[c + 1] are the positions of the places in grid cell c
+            "cell_starts": np.searchsorted(cells[order], np.arange(rows * cols + 1)).astype(np.int64),
+        }
+        return cls(arrays, grid_degrees)
+
+    @classmethod
+    def from_csv(cls, path: str, grid_degrees: float = DESTINATIONS_GRID_DEGREES) -> "DestinationIndex":
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [
+                (row["name"], row.get("country", ""), float(row["lat"]), float(row["lon"]),
+                 float(row.get("daily_cost_usd") or "nan"), [t.strip() for t in row.get("tags", "").split("|") if t.strip()])
+                for row in csv.DictReader(f)
+            ]
+        return cls.from_records(rows, grid_degrees)
+
+    def save(self, path: str) -> None:
+        np.savez(path, grid_degrees=np.float64(self.grid_degrees), **{name: getattr(self, name) for name in self._ARRAYS})
+
+    @classmethod
+    def load(cls, path: str) -> "DestinationIndex":
+        """Loads a .npz written by save(), or builds the index from a CSV."""
+        if not path.endswith(".npz"):
+            return cls.from_csv(path)
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in cls._ARRAYS}, float(data["grid_degrees"]))
+
+    def name(self, i: int) -> str:
+        return bytes(self.names[self.name_offsets[i]:self.name_offsets[i + 1]]).decode("utf-8")
+
+    def country(self, i: int) -> str:
+        return bytes(self.countries[self.country_offsets[i]:self.country_offsets[i + 1]]).decode("utf-8")
+
+    def locate(self, name: str) -> Optional[int]:
+        """Position of the place called `name` (case- and accent-insensitive), or None."""
+        if self._by_name is None:
+            with self._lock:
+                if self._by_name is None:
+                    by_name = {}
+                    for i in range(len(self)):
+                        by_name.setdefault(normalize_city(self.name(i)), i)
+                    self._by_name = by_name
+        return self._by_name.get(normalize_city(name))
+
+    def tag_mask(self, interests: Sequence[str]) -> Tuple[np.uint64, List[str]]:
+        """Tag bits for `interests`, plus the interests that match no tag in the index."""
+        mask = np.uint64(0)
+        unmatched = []
+        for interest in canonical_interests(list(interests)):
+            bit = self._tag_bits.get(_TAG_ALIASES.get(interest, interest))
+            if bit is None:
+                unmatched.append(interest)
+            else:
+                mask |= bit
+        return mask, unmatched
+
+    def _window(self, row: int, col: int, radius: int) -> np.ndarray:
+        # Positions of the places in the (2 * radius + 1)^2 cells around (row, col); longitude wraps around
+        rows = range(max(row - radius, 0), min(row + radius, self.rows - 1) + 1)
+        if 2 * radius + 1 >= self.cols:
+            spans = [(0, self.cols - 1)]
+        else:
+            lo, hi = (col - radius) % self.cols, (col + radius) % self.cols
+            spans = [(lo, hi)] if lo <= hi else [(lo, self.cols - 1), (0, hi)]
+        slices = [(self.cell_starts[r * self.cols + lo], self.cell_starts[r * self.cols + hi + 1]) for r in rows for lo, hi in spans]
+        return np.concatenate([np.arange(start, end) for start, end in slices if end > start] or [np.zeros(0, dtype=np.int64)])
+
+    def _outside_bound_km(self, lat: float, lon: float, row: int, col: int, radius: int) -> float:
+        # Lower bound on the distance from (lat, lon) to any place outside the window searched at `radius`
+        south, north = (row - radius) * self.grid_degrees - 90, (row + radius + 1) * self.grid_degrees - 90
+        lat_gap = min(lat - south if south > -90 else math.inf, north - lat if north < 90 else math.inf)
+        if 2 * radius + 1 >= self.cols:
+            lon_bound = math.inf
+        else:
+            west, east = (col - radius) * self.grid_degrees - 180, (col + radius + 1) * self.grid_degrees - 180
+            gap = math.radians(min(min(lon - west, east - lon), 90))
+            # Distance to the meridian `gap` away in longitude
+            lon_bound = EARTH_RADIUS_KM * math.asin(min(math.cos(math.radians(lat)) * math.sin(gap), 1.0))
+        return min(EARTH_RADIUS_KM * math.radians(lat_gap), lon_bound)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        interests: Sequence[str] = (),
+        k: int = 5,
+        max_km: Optional[float] = None,
+        max_daily_cost: Optional[float] = None,
+        exclude: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        The k best places for a traveler at (lat, lon). With interests, only places matching at least one
+        of them qualify, and they are ranked by distance scaled by (2 - share of interests matched), so a
+        place matching every interest ranks as if it were half as far away as its actual distance.
+        """
+        mask, unmatched = self.tag_mask(interests)
+        wanted = int(_popcount(np.array([mask], dtype=np.uint64))[0])
+        row, col = (int(v) for v in _grid_cells(lat, lon, self.grid_degrees))
+        radius, searched = 1, 0
+        while True:
+            positions = self._window(row, col, radius)
+            if exclude is not None:
+                positions = positions[positions != exclude]
+            if max_daily_cost is not None:
+                positions = positions[~(self.daily_cost[positions] > max_daily_cost)]
+            coverage = np.ones(len(positions))
+            if wanted:
+                coverage = _popcount(self.tags[positions] & mask) / wanted
+                keep = coverage > 0
+                positions, coverage = positions[keep], coverage[keep]
+            distance = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+            if max_km is not None:
+                keep = distance <= max_km
+                positions, coverage, distance = positions[keep], coverage[keep], distance[keep]
+            rank = distance * (2 - coverage)
+            searched = len(positions)
+            bound = self._outside_bound_km(lat, lon, row, col, radius)
+            if (math.isinf(bound) or (max_km is not None and bound > max_km)
+                    or (len(rank) >= k and np.partition(rank, k - 1)[k - 1] <= bound)):
+                break
+            radius *= 2
+
+        top = np.argsort(rank)[:k] if len(rank) <= 4 * k else np.argpartition(rank, k)[:k]
+        top = top[np.argsort(rank[top])]
+        tag_names = self.tag_names
+        places = []
+        for i in top:
+            p = int(positions[i])
+            cost = float(self.daily_cost[p])
+            tags = int(self.tags[p])
+            places.append({
+                "name": self.name(p),
+                "country": self.country(p),
+                "latitude": round(float(self.lat[p]), 4),
+                "longitude": round(float(self.lon[p]), 4),
+                "distance_km": round(float(distance[i]), 1),
+                "matched_interests": [str(tag_names[b]) for b in range(len(tag_names)) if (int(mask) & tags) >> b & 1],
+                "tags": [str(tag_names[b]) for b in range(len(tag_names)) if tags >> b & 1],
+                "daily_cost_usd": None if math.isnan(cost) else round(cost),
+            })
+        return {"destinations": places, "unmatched_interests": unmatched, "candidates_scored": searched}
+
+
+_index: Optional[DestinationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_destination_index() -> DestinationIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                start = time.perf_counter()
+                _index = DestinationIndex.load(DESTINATIONS_PATH)
+                logger.info("destinations - loaded %s places from %s in %.1f ms",
+                            len(_index), DESTINATIONS_PATH, (time.perf_counter() - start) * 1000)
+    return _index
+
+
+def _parse_origin(index: DestinationIndex, origin: str) -> Tuple[Optional[float], Optional[float], Optional[int]]:
+    # "48.85, 2.35" or a place name from the index
+    parts = origin.split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1]), None
+        except ValueError:
+            pass
+    position = index.locate(origin)
+    if position is None:
+        return None, None, None
+    return float(index.lat[position]), float(index.lon[position]), position
+
+
+def find_nearby_destinations(
+    origin: str,
+    interests: List[str],
+    limit: int = 5,
+    max_daily_cost_usd: Optional[float] = None,
+    max_distance_km: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Finds the destinations closest to the traveler's starting location that best fit their interests,
+    from an offline index of places with coordinates, interest tags and typical daily costs.
+
+    Args:
+        origin: The starting city (e.g. "Lisbon") or coordinates as "latitude, longitude".
+        interests: The traveler's interests, e.g. ["art", "food", "beaches"].
+        limit: How many destinations to return (default 5).
+        max_daily_cost_usd: Optional cap on the typical daily cost per person in USD.
+        max_distance_km: Optional cap on the distance from the origin in km.
+
+    Returns:
+        {"status": "success", "origin": ..., "destinations": [{name, country, distance_km, matched_interests,
+        tags, daily_cost_usd, ...}], "unmatched_interests": [...]} or {"status": "error", "message": ...}.
+    """
+    index = get_destination_index()
+    lat, lon, position = _parse_origin(index, origin)
+    if lat is None:
+        return {"status": "error", "message": f"Unknown starting location '{origin}'. Pass it as 'latitude, longitude' instead."}
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return {"status": "error", "message": f"Coordinates out of range: {origin}"}
+    start = time.perf_counter()
+    result = index.nearest(lat, lon, interests, k=max(int(limit), 1), max_km=max_distance_km,
+                           max_daily_cost=max_daily_cost_usd, exclude=position)
+    logger.info("destinations - %s results for %s in %.2f ms (%s candidates scored)",
+                len(result["destinations"]), origin, (time.perf_counter() - start) * 1000, result["candidates_scored"])
+    return {
+        "status": "success",
+        "origin": {"name": index.name(position) if position is not None else origin, "latitude": lat, "longitude": lon},
+        "destinations": result["destinations"],
+        "unmatched_interests": result["unmatched_interests"],
+    }
+
+
+__getattr__ = lazy_tools(__name__, {"find_nearby_destinations_tool": find_nearby_destinations})
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the offline destination index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="convert a places CSV into a .npz index")
+    build.add_argument("csv")
+    build.add_argument("output")
+    build.add_argument("--grid-degrees", type=float, default=DESTINATIONS_GRID_DEGREES)
+    query = commands.add_parser("query", help="closest destinations for an origin and interests")
+    query.add_argument("origin")
+    query.add_argument("interests", nargs="*")
+    query.add_argument("--limit", type=int, default=5)
+    query.add_argument("--index", help="index or CSV to query (default: DESTINATIONS_PATH)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = DestinationIndex.from_csv(args.csv, args.grid_degrees)
+        index.save(args.output)
+        print(f"Wrote {len(index)} places ({len(index.tag_names)} tags) to {args.output}")
+        return 0
+
+    global _index
+    if args.index:
+        _index = DestinationIndex.load(args.index)
+    result = find_nearby_destinations(args.origin, args.interests, limit=args.limit)
+    if result["status"] != "success":
+        print(result["message"])
+        return 1
+    for place in result["destinations"]:
+        print(f"{place['distance_km']:8.1f} km  {place['name']}, {place['country']}  "
+              f"matches {', '.join(place['matched_interests']) or '-'}  ~${place['daily_cost_usd']}/day")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# Compiles markdown trip sections into compact Google Docs batchUpdate requests
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Limits for a single documents().batchUpdate call. Larger documents are split into several calls.
+DOCS_MAX_BATCH_BYTES = int(os.getenv("DOCS_MAX_BATCH_BYTES", str(1024 * 1024)))
+DOCS_MAX_REQUESTS_PER_BATCH = int(os.getenv("DOCS_MAX_REQUESTS_PER_BATCH", "500"))
+
+BULLET_PRESET = 'BULLET_DISC_CIRCLE_SQUARE'
+
+_SPECIAL_CHARS = re.compile(r"[*_]")
+_BULLET_LINE = re.compile(r"^\s*[*-]\s+")
+_HEADING_LINE = re.compile(r"^(#{1,6})\s+")
+# Markdown "#" levels inside a section sit below the section's own HEADING_1
+_MARKDOWN_HEADING_STYLES = {1: 'HEADING_2', 2: 'HEADING_3'}
+
+
+def _u16(text: str) -> int:
+    """Length of `text` in UTF-16 code units, which is how the Docs API counts indexes."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _merge(ranges: List[List[int]], start: int, end: int) -> None:
+    # Ranges are produced in document order, so only the last one can touch the new range
+    if ranges and ranges[-1][1] >= start:
+        ranges[-1][1] = max(ranges[-1][1], end)
+    else:
+        ranges.append([start, end])
+
+
+class DocumentBuilder:
+    """
+    Accumulates document text and style ranges in a single linear pass over the markdown.
+    Each section becomes one insertText; bold/italic spans, bullets and headings become
+    style requests over merged ranges, instead of one insertText + updateTextStyle per segment.
+    """
+
+    def __init__(self, start_index: int = 1):
+        self.start_index = start_index
+        self.end_index = start_index
+        self._sections: List[Tuple[int, List[str]]] = [] # (start index, text pieces)
+        self._bold: List[List[int]] = []
+        self._italic: List[List[int]] = []
+        self._bullets: List[List[int]] = []
+        self._paragraph_styles: List[Tuple[str, List[int]]] = []
+
+    def _append(self, text: str) -> Tuple[int, int]:
+        if not self._sections:
+            self._sections.append((self.end_index, []))
+        self._sections[-1][1].append(text)
+        start = self.end_index
+        self.end_index += _u16(text)
+        return start, self.end_index
+
+    def _paragraph_style(self, named_style: str, start: int, end: int) -> None:
+        if self._paragraph_styles and self._paragraph_styles[-1][0] == named_style and self._paragraph_styles[-1][1][1] >= start:
+            self._paragraph_styles[-1][1][1] = end
+        else:
+            self._paragraph_styles.append((named_style, [start, end]))
+
+    def add_heading(self, title: str, named_style: str = 'HEADING_1') -> None:
+        """Starts a new section with a bold heading paragraph."""
+        self._sections.append((self.end_index, []))
+        start, end = self._append(title)
+        self._append("\n")
+        self._paragraph_style(named_style, start, end)
+        _merge(self._bold, start, end)
+
+    def add_markdown(self, text: str) -> None:
+        """Appends markdown text (bold, italics, bullets, # headings) to the current section."""
+        for line in text.splitlines():
+            paragraph_start = self.end_index
+            bullet = _BULLET_LINE.match(line)
+            heading = None if bullet else _HEADING_LINE.match(line)
+            if bullet:
+                line = line[bullet.end():]
+            elif heading:
+                line = line[heading.end():]
+            self._add_inline(line)
+            self._append("\n")
+            if bullet:
+                _merge(self._bullets, paragraph_start, self.end_index)
+            elif heading and self.end_index - paragraph_start > 1:
+                style = _MARKDOWN_HEADING_STYLES.get(len(heading.group(1)), 'HEADING_4')
+                self._paragraph_style(style, paragraph_start, self.end_index - 1)
+
+    def _add_inline(self, line: str) -> None:
+        # Left-to-right scan for **bold**, *italic* and _italic_ spans. A marker whose closing
+        # counterpart was not found is remembered, so every line is scanned in linear time.
+        unclosed = set()
+        length = len(line)
+        i = 0
+        literal_start = 0
+        while i < length:
+            match = _SPECIAL_CHARS.search(line, i)
+            if match is None:
+                break
+            i = match.start()
+            span = None
+            if line.startswith('**', i) and '**' not in unclosed:
+                close = line.find('**', i + 2)
+                if close == -1:
+                    unclosed.add('**')
+                elif close > i + 2:
+                    span = (self._bold, i + 2, close, close + 2)
+            marker = line[i]
+            if span is None and marker not in unclosed:
+                close = line.find(marker, i + 1)
+                if close == -1:
+                    unclosed.add(marker)
+                elif close > i + 1:
+                    span = (self._italic, i + 1, close, close + 1)
+            if span is None:
+                i += 1
+                continue
+            ranges, content_start, content_end, after = span
+            if literal_start < i:
+                self._append(line[literal_start:i])
+            start, end = self._append(line[content_start:content_end])
+            _merge(ranges, start, end)
+            i = literal_start = after
+        if literal_start < length:
+            self._append(line[literal_start:])
+
+    @property
+    def text(self) -> str:
+        return "".join("".join(pieces) for _, pieces in self._sections)
+
+    def insert_requests(self, max_chars: int = 100_000) -> List[Dict[str, Any]]:
+        """One insertText per section (sections longer than `max_chars` are split)."""
+        requests = []
+        for start, pieces in self._sections:
+            section_text = "".join(pieces)
+            index = start
+            for offset in range(0, len(section_text), max_chars):
+                chunk = section_text[offset:offset + max_chars]
+                requests.append({'insertText': {'location': {'index': index}, 'text': chunk}})
+                index += _u16(chunk)
+        return requests
+
+    def style_requests(self) -> List[Dict[str, Any]]:
+        requests = []
+        for named_style, (start, end) in self._paragraph_styles:
+            requests.append({'updateParagraphStyle': {
+                'range': {'startIndex': start, 'endIndex': end},
+                'paragraphStyle': {'namedStyleType': named_style},
+                'fields': 'namedStyleType'
+            }})
+        for start, end in self._bullets:
+            requests.append({'createParagraphBullets': {
+                'range': {'startIndex': start, 'endIndex': end},
+                'bulletPreset': BULLET_PRESET
+            }})
+        for ranges, field in ((self._bold, 'bold'), (self._italic, 'italic')):
+            for start, end in ranges:
+                requests.append({'updateTextStyle': {
+                    'range': {'startIndex': start, 'endIndex': end},
+                    'textStyle': {field: True},
+                    'fields': field
+                }})
+        return requests
+
+    def requests(self) -> List[Dict[str, Any]]:
+        """All requests in application order: text first, then styles over the inserted text."""
+        return self.insert_requests() + self.style_requests()
+
+    def batches(self, max_bytes: int = DOCS_MAX_BATCH_BYTES, max_requests: int = DOCS_MAX_REQUESTS_PER_BATCH) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Splits the requests into payloads under `max_bytes` and `max_requests`.
+        Batches must be sent in order: style ranges refer to text inserted by earlier batches.
+        """
+        # Leave room for JSON escaping (non-ASCII text is escaped as \\uXXXX, up to 6 bytes per character)
+        requests = self.insert_requests(max_chars=max(1, max_bytes // 8)) + self.style_requests()
+        yield from pack_requests(requests, max_bytes, max_requests)
+
+
+def pack_requests(requests: List[Dict[str, Any]], max_bytes: int = DOCS_MAX_BATCH_BYTES,
+                  max_requests: int = DOCS_MAX_REQUESTS_PER_BATCH) -> Iterator[List[Dict[str, Any]]]:
+    """Greedily groups requests, in order, into lists whose JSON body stays under the limits."""
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    for request in requests:
+        size = len(json.dumps(request)) + 2 # separator
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_requests):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(request)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def compile_sections(sections: List[Tuple[str, Optional[str]]], start_index: int = 1) -> DocumentBuilder:
+    """Builds a document with a HEADING_1 per (title, markdown) section, skipping empty sections' bodies."""
+    builder = DocumentBuilder(start_index)
+    for title, markdown in sections:
+        builder.add_heading(title)
+        if markdown:
+            builder.add_markdown(markdown)
+    return builder
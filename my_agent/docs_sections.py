@@ -0,0 +1,180 @@
+# Section-level updates of exported trip documents: finds the section headings of an existing Google Doc
+# and rewrites only the sections whose content changed since the last export
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .docs_markdown import DocumentBuilder
+from .storage import connect, data_path
+
+
+DOC_MANIFEST_PATH = os.getenv("DOC_MANIFEST_PATH") # Defaults to doc_manifests.sqlite3 in the data dir
+
+SECTION_TITLES = ("Flights", "Hotels", "Itinerary", "Food")
+# Partial response for documents().get: only what locating the sections needs
+DOCUMENT_FIELDS = "revisionId,body(content(startIndex,endIndex,paragraph(elements(textRun(content)),paragraphStyle(namedStyleType))))"
+
+
+def content_hash(markdown: Optional[str]) -> str:
+    return hashlib.sha256((markdown or "").encode("utf-8")).hexdigest()[:16]
+
+
+class Section(NamedTuple):
+    title: str
+    start: int       # Index of the heading paragraph
+    body_start: int  # First index after the heading
+    body_end: int    # Index of the next section heading, or of the document's final newline
+    text: str        # Plain text of the body as it is in the document now
+
+
+def find_sections(document: Dict[str, Any]) -> Dict[str, Section]:
+    """Locates the HEADING_1 trip sections (Flights, Hotels, Itinerary, Food) in a documents().get response."""
+    content = document.get("body", {}).get("content", [])
+    pieces: List[str] = []
+    base = None
+    headings: List[Tuple[str, int, int]] = []
+    for element in content:
+        paragraph = element.get("paragraph")
+        if paragraph is None:
+            continue
+        text = "".join(run.get("textRun", {}).get("content", "") for run in paragraph.get("elements", []))
+        if base is None:
+            base = element.get("startIndex", 1)
+        pieces.append(text)
+        title = text.strip()
+        if (paragraph.get("paragraphStyle", {}).get("namedStyleType") == "HEADING_1" and title in SECTION_TITLES
+                and title not in (h[0] for h in headings)):
+            headings.append((title, element["startIndex"], element["endIndex"]))
+    if base is None:
+        return {}
+    body_text = "".join(pieces)
+    # The document's final newline cannot be deleted, so the last section ends just before it
+    document_end = content[-1]["endIndex"] - 1
+    sections = {}
+    for i, (title, start, body_start) in enumerate(headings):
+        body_end = headings[i + 1][1] if i + 1 < len(headings) else document_end
+        text = _slice_u16(body_text, body_start - base, body_end - base)
+        sections[title] = Section(title, start, body_start, body_end, text)
+    return sections
+
+
+def _slice_u16(text: str, start: int, end: int) -> str:
+    # Document indexes count UTF-16 code units
+    encoded = text.encode("utf-16-le")
+    return encoded[2 * max(start, 0):2 * max(end, 0)].decode("utf-16-le", errors="ignore")
+
+
+def _reset_style_requests(start: int, end: int) -> List[Dict[str, Any]]:
+    # Inserted text inherits the paragraph and text style around the insertion point (e.g. the next
+    # heading's HEADING_1 or a bullet), so it is reset to plain text before its own styles are applied
+    text_range = {'startIndex': start, 'endIndex': end}
+    return [
+        {'updateParagraphStyle': {'range': text_range, 'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT'}, 'fields': 'namedStyleType'}},
+        {'deleteParagraphBullets': {'range': text_range}},
+        {'updateTextStyle': {'range': text_range, 'textStyle': {}, 'fields': 'bold,italic'}},
+    ]
+
+
+def _write_requests(builder: DocumentBuilder) -> List[Dict[str, Any]]:
+    if builder.end_index == builder.start_index:
+        return []
+    return builder.insert_requests() + _reset_style_requests(builder.start_index, builder.end_index) + builder.style_requests()
+
+
+class SectionUpdate(NamedTuple):
+    requests: List[Dict[str, Any]]
+    manifest: Dict[str, str]
+    updated: List[str]
+    unchanged: List[str]
+
+
+def plan_section_updates(document: Dict[str, Any], sections: List[Tuple[str, Optional[str]]], manifest: Optional[Dict[str, str]]) -> SectionUpdate:
+    """
+    batchUpdate requests that bring `document` up to date with `sections` ((title, markdown) pairs).
+    A section is left alone when its markdown hash matches `manifest` (the hashes written by the last
+    export) and its text in the document is still what was written; sections given without markdown
+    are left alone too. Changed sections are deleted and re-inserted from the last one to the first,
+    so the indexes of the sections not yet processed stay valid; missing sections are appended at the end.
+    """
+    manifest = dict(manifest or {})
+    found = find_sections(document)
+    content = document.get("body", {}).get("content", [])
+    document_end = content[-1]["endIndex"] - 1 if content else 1
+
+    rewrites: List[Tuple[Section, str]] = []
+    missing: List[Tuple[str, str]] = []
+    updated, unchanged = [], []
+    for title, markdown in sections:
+        if not markdown:
+            continue
+        digest = content_hash(markdown)
+        existing = found.get(title)
+        if existing is not None:
+            preview = DocumentBuilder(existing.body_start)
+            preview.add_markdown(markdown)
+            # Without a manifest entry only the text can be compared; formatting is assumed to match
+            if manifest.get(title, digest) == digest and preview.text == existing.text:
+                unchanged.append(title)
+                manifest[title] = digest
+                continue
+            rewrites.append((existing, markdown))
+        else:
+            missing.append((title, markdown))
+        updated.append(title)
+        manifest[title] = digest
+
+    requests: List[Dict[str, Any]] = []
+    if missing:
+        appended = DocumentBuilder(document_end)
+        for title, markdown in missing:
+            appended.add_heading(title)
+            appended.add_markdown(markdown)
+        requests += _write_requests(appended)
+    for section, markdown in sorted(rewrites, key=lambda rewrite: rewrite[0].body_start, reverse=True):
+        if section.body_end > section.body_start:
+            requests.append({'deleteContentRange': {'range': {'startIndex': section.body_start, 'endIndex': section.body_end}}})
+        builder = DocumentBuilder(section.body_start)
+        builder.add_markdown(markdown)
+        requests += _write_requests(builder)
+    return SectionUpdate(requests, manifest, updated, unchanged)
+
+
+class DocManifests:
+    """Content hashes of the sections last exported to each document, in a small SQLite table."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS doc_manifests (document_id TEXT PRIMARY KEY, manifest TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, document_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            row = self._conn.execute("SELECT manifest FROM doc_manifests WHERE document_id = ?", (document_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, document_id: str, manifest: Dict[str, str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO doc_manifests (document_id, manifest, updated_at) VALUES (?, ?, ?)",
+                (document_id, json.dumps(manifest, separators=(",", ":")), time.time()),
+            )
+            self._conn.commit()
+
+
+_manifests: Optional[DocManifests] = None
+_init_lock = threading.Lock()
+
+
+def get_doc_manifests() -> DocManifests:
+    global _manifests
+    if _manifests is None:
+        with _init_lock:
+            if _manifests is None:
+                _manifests = DocManifests(DOC_MANIFEST_PATH or data_path("doc_manifests.sqlite3"))
+    return _manifests
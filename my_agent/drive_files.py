@@ -0,0 +1,338 @@
+# Registry of the spreadsheets and documents created by the export tools, bulk deletion through Drive batch
+# requests, and garbage collection of the registered files older than a TTL.
+#
+# Usage: python -m my_agent.drive_files gc [--ttl-days 30] [--owner USER] [--session ID] [--concurrency 4] [--dry-run]
+#        python -m my_agent.drive_files list [--owner USER] [--session ID] [--deleted]
+#        python -m my_agent.drive_files delete FILE_ID [FILE_ID ...]
+import argparse
+import contextlib
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import resilience
+from .artifacts import session_scope
+from .google_clients import get_service
+from .storage import connect, data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+DRIVE_FILES_PATH = os.getenv("DRIVE_FILES_PATH") # Defaults to drive_files.sqlite3 in the data dir
+# Deletions sent per batch HTTP request; Drive accepts at most MAX_BATCH_SIZE
+DRIVE_BATCH_SIZE = int(os.getenv("DRIVE_BATCH_SIZE", "100"))
+DRIVE_GC_TTL_SECONDS = int(os.getenv("DRIVE_GC_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+# Batches in flight at once; the drive entries of RATE_LIMITS and UPSTREAM_CONCURRENCY still apply
+DRIVE_GC_CONCURRENCY = int(os.getenv("DRIVE_GC_CONCURRENCY", "4"))
+
+MAX_BATCH_SIZE = 100
+
+# (owner, session scope) that files created outside a tool call (by an export job) are registered for
+_origin: contextvars.ContextVar[Optional[Tuple[Optional[str], Optional[str]]]] = contextvars.ContextVar(
+    "vibe_travel_file_origin", default=None)
+# Called with the ID of every file created inside created_for(on_created=...)
+_on_created: contextvars.ContextVar[Optional[Callable[[str], None]]] = contextvars.ContextVar(
+    "vibe_travel_file_created", default=None)
+
+
+class CreatedFiles:
+    """Every file the export tools created, with its creation time, owner and session, in a small SQLite table."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS created_files ("
+            " file_id TEXT PRIMARY KEY, kind TEXT NOT NULL, title TEXT, owner TEXT, scope TEXT,"
+            " created_at REAL NOT NULL, deleted_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS created_files_live ON created_files (deleted_at, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS created_files_scope ON created_files (scope, created_at)")
+        self._conn.commit()
+
+    def add(self, file_id: str, kind: str, title: Optional[str] = None, owner: Optional[str] = None,
+            scope: Optional[str] = None, created_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO created_files (file_id, kind, title, owner, scope, created_at, deleted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                (file_id, kind, title, owner, scope, time.time() if created_at is None else created_at))
+            self._conn.commit()
+
+    def mark_deleted(self, file_ids: List[str]) -> None:
+        if not file_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE created_files SET deleted_at = ? WHERE file_id = ? AND deleted_at IS NULL",
+                                   [(now, file_id) for file_id in file_ids])
+            self._conn.commit()
+
+    @staticmethod
+    def _filters(owner: Optional[str], scope: Optional[str], include_deleted: bool) -> Tuple[str, list]:
+        clauses, params = [], []
+        if not include_deleted:
+            clauses.append("deleted_at IS NULL")
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if scope is not None:
+            clauses.append("scope = ?")
+            params.append(scope)
+        return " AND ".join(clauses) or "1", params
+
+    def expired(self, created_before: float, owner: Optional[str] = None, scope: Optional[str] = None,
+                limit: Optional[int] = None) -> List[str]:
+        """IDs of the files not yet deleted that were created before `created_before`, oldest first."""
+        where, params = self._filters(owner, scope, False)
+        query = f"SELECT file_id FROM created_files WHERE {where} AND created_at < ? ORDER BY created_at"
+        params.append(created_before)
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def list(self, owner: Optional[str] = None, scope: Optional[str] = None, include_deleted: bool = False,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        """The most recently created files, newest first."""
+        where, params = self._filters(owner, scope, include_deleted)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_id, kind, title, owner, scope, created_at, deleted_at FROM created_files WHERE {where}"
+                " ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        columns = ("file_id", "kind", "title", "owner", "scope", "created_at", "deleted_at")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            live, deleted = self._conn.execute(
+                "SELECT COUNT(*) - COUNT(deleted_at), COUNT(deleted_at) FROM created_files").fetchone()
+        return {"live": live, "deleted": deleted}
+
+
+_files: Optional[CreatedFiles] = None
+_init_lock = threading.Lock()
+
+
+def get_created_files() -> CreatedFiles:
+    global _files
+    if _files is None:
+        with _init_lock:
+            if _files is None:
+                _files = CreatedFiles(DRIVE_FILES_PATH or data_path("drive_files.sqlite3"))
+    return _files
+
+
+@contextlib.contextmanager
+def created_for(owner: Optional[str], scope: Optional[str], on_created: Optional[Callable[[str], None]] = None) -> Iterator[None]:
+    """
+    Registers the files created inside the block for `owner` and session `scope` (used by export jobs),
+    and passes their IDs to `on_created` as soon as they exist.
+    """
+    token = _origin.set((owner, scope))
+    callback_token = _on_created.set(on_created)
+    try:
+        yield
+    finally:
+        _on_created.reset(callback_token)
+        _origin.reset(token)
+
+
+def origin(tool_context: Any = None) -> Tuple[Optional[str], Optional[str]]:
+    """(owner, session scope) of the conversation a file is created for: the tool context's, else the enclosing created_for."""
+    if tool_context is not None:
+        return getattr(tool_context, "user_id", None), session_scope(tool_context)
+    return _origin.get() or (None, None)
+
+
+def record_created(file_id: str, kind: str, title: Optional[str], tool_context: Any = None) -> None:
+    """Registers a file an export tool just created. A failure is logged: the export itself has succeeded."""
+    owner, scope = origin(tool_context)
+    try:
+        get_created_files().add(file_id, kind, title, owner, scope)
+    except Exception as e:
+        logger.warning("drive_files - could not register %s %s: %s", kind, file_id, e)
+    on_created = _on_created.get()
+    if on_created is not None:
+        try:
+            on_created(file_id)
+        except Exception as e:
+            logger.warning("drive_files - on_created failed for %s %s: %s", kind, file_id, e)
+
+
+def _delete_batch(drive_service, file_ids: List[str]) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """
+    Deletes `file_ids` with one batch HTTP request, through the drive rate limiter at one token per file.
+    Deletions the batch answered with a 429 or a transient error are sent again in a smaller batch after a backoff.
+    Returns the IDs deleted, the IDs that were not found, and file ID -> error for the rest.
+    """
+    deleted: List[str] = []
+    not_found: List[str] = []
+    failed: Dict[str, str] = {}
+    pending = list(file_ids)
+    files = drive_service.files() # Builds the whole resource from discovery, so only once and not per request
+    for attempt in range(resilience.RETRY_MAX_ATTEMPTS):
+        errors: Dict[str, BaseException] = {}
+
+        def on_response(request_id: str, response: Any, error: Optional[BaseException]) -> None:
+            if error is not None:
+                errors[request_id] = error
+
+        def send() -> None:
+            errors.clear() # The whole batch may be sent again by resilience.call
+            batch = drive_service.new_batch_http_request(callback=on_response)
+            for file_id in pending:
+                batch.add(files.delete(fileId=file_id), request_id=file_id)
+            batch.execute()
+
+        resilience.call("drive", send, cost=len(pending))
+        retry, retry_after = [], None
+        for file_id in pending:
+            error = errors.get(file_id)
+            if error is None:
+                deleted.append(file_id)
+            elif getattr(getattr(error, "resp", None), "status", None) == 404:
+                not_found.append(file_id)
+            else:
+                transient, after = resilience.classify(error)
+                if transient and attempt + 1 < resilience.RETRY_MAX_ATTEMPTS:
+                    retry.append(file_id)
+                    retry_after = max(retry_after or 0.0, after or 0.0) or None
+                else:
+                    failed[file_id] = str(error)
+        if not retry:
+            break
+        logger.warning("drive_files - %d of %d deletions were throttled or failed, retrying", len(retry), len(pending))
+        if retry_after:
+            # Holds back the other batches too, like a Retry-After on a whole call does
+            resilience.get_upstream("drive").bucket.block(min(retry_after, resilience.RETRY_MAX_SECONDS))
+        time.sleep(resilience.backoff(attempt, retry_after))
+        pending = retry
+    return deleted, not_found, failed
+
+
+def delete_files(file_ids: List[str], concurrency: int = DRIVE_GC_CONCURRENCY, batch_size: int = DRIVE_BATCH_SIZE,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Permanently deletes `file_ids` from Drive: `batch_size` (at most 100) deletions per batch HTTP request,
+    up to `concurrency` batches in flight. Files that no longer exist are reported as not found, and like the
+    deleted ones are marked deleted in the registry. `progress` is called after every batch with the running totals.
+    Raises RuntimeError if the Drive client cannot be built.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    totals: Dict[str, Any] = {"total": len(file_ids), "done": 0, "batches": 0, "deleted": [], "not_found": [], "failed": {}}
+    if not file_ids:
+        return totals
+    drive_service = get_service("drive")
+    if drive_service is None:
+        raise RuntimeError("Google Drive API service not available.")
+    size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    batches = [file_ids[i:i + size] for i in range(0, len(file_ids), size)]
+    registry = get_created_files()
+    lock = threading.Lock()
+
+    def run(batch: List[str]) -> None:
+        try:
+            deleted, not_found, failed = _delete_batch(drive_service, batch)
+        except Exception as e: # The batch request itself failed (e.g. the drive circuit is open)
+            logger.error("drive_files - batch of %d deletions failed: %s", len(batch), e)
+            deleted, not_found, failed = [], [], dict.fromkeys(batch, str(e))
+        registry.mark_deleted(deleted + not_found)
+        with lock:
+            totals["deleted"] += deleted
+            totals["not_found"] += not_found
+            totals["failed"].update(failed)
+            totals["done"] += len(batch)
+            totals["batches"] += 1
+            if progress is not None:
+                progress(totals)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches))), thread_name_prefix="drive-delete") as pool:
+        list(pool.map(run, batches))
+    logger.info("drive_files - deleted %d files in %d batches (%d not found, %d failed)",
+                len(totals["deleted"]), totals["batches"], len(totals["not_found"]), len(totals["failed"]))
+    return totals
+
+
+def collect_garbage(ttl_seconds: float = DRIVE_GC_TTL_SECONDS, owner: Optional[str] = None, scope: Optional[str] = None,
+                    concurrency: int = DRIVE_GC_CONCURRENCY, limit: Optional[int] = None, dry_run: bool = False,
+                    progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Deletes the registered files created more than `ttl_seconds` ago, optionally only those of one owner or
+    session, oldest first. With `dry_run` only reports which files would be deleted.
+    """
+    expired = get_created_files().expired(time.time() - ttl_seconds, owner, scope, limit)
+    if dry_run:
+        return {"total": len(expired), "expired": expired}
+    return delete_files(expired, concurrency, progress=progress)
+
+
+def _print_progress(start: float) -> Callable[[Dict[str, Any]], None]:
+    def report(totals: Dict[str, Any]) -> None:
+        elapsed = time.perf_counter() - start
+        print(f"{totals['done']}/{totals['total']} files  deleted={len(totals['deleted'])}  "
+              f"not found={len(totals['not_found'])}  failed={len(totals['failed'])}  "
+              f"{elapsed:.1f}s ({totals['done'] / max(elapsed, 1e-9):.0f} files/s)", flush=True)
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    from .tracing import configure_logging
+
+    parser = argparse.ArgumentParser(description="Delete the Google Sheets and Docs created by the export tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc = commands.add_parser("gc", help="delete the registered files older than a TTL")
+    gc.add_argument("--ttl-days", type=float, default=DRIVE_GC_TTL_SECONDS / 86400)
+    gc.add_argument("--owner", help="only files created for this user")
+    gc.add_argument("--session", help="only files created in this session")
+    gc.add_argument("--concurrency", type=int, default=DRIVE_GC_CONCURRENCY, help="batches in flight at once")
+    gc.add_argument("--limit", type=int, help="delete at most this many files, oldest first")
+    gc.add_argument("--dry-run", action="store_true", help="list the expired files without deleting them")
+    listing = commands.add_parser("list", help="list the registered files, newest first")
+    listing.add_argument("--owner")
+    listing.add_argument("--session")
+    listing.add_argument("--deleted", action="store_true", help="include deleted files")
+    listing.add_argument("--limit", type=int, default=100)
+    delete = commands.add_parser("delete", help="delete files by ID, registered or not")
+    delete.add_argument("file_ids", nargs="+")
+    delete.add_argument("--concurrency", type=int, default=DRIVE_GC_CONCURRENCY)
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.command == "list":
+        for file in get_created_files().list(args.owner, args.session, args.deleted, args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(file["created_at"]))
+            print(f"{file['file_id']}  {file['kind']:<11}  {created}  owner={file['owner']}  session={file['scope']}"
+                  f"{'  deleted' if file['deleted_at'] else ''}  {file['title'] or ''}")
+        print(f"registry: {get_created_files().stats()}")
+        return 0
+    try:
+        if args.command == "gc":
+            totals = collect_garbage(args.ttl_days * 86400, args.owner, args.session, args.concurrency, args.limit,
+                                     args.dry_run, _print_progress(time.perf_counter()))
+        else:
+            totals = delete_files(args.file_ids, args.concurrency, progress=_print_progress(time.perf_counter()))
+    except RuntimeError as e:
+        print(f"error: {e}")
+        return 1
+    if "expired" in totals:
+        for file_id in totals["expired"]:
+            print(file_id)
+        print(f"{totals['total']} files would be deleted")
+        return 0
+    for file_id, error in totals["failed"].items():
+        print(f"failed {file_id}: {error}")
+    print(f"deleted {len(totals['deleted'])}, not found {len(totals['not_found'])}, failed {len(totals['failed'])} "
+          f"of {totals['total']} files in {totals['batches']} batches")
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
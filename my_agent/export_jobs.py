@@ -0,0 +1,431 @@
+# Background Google Workspace exports: submit returns a job ID at once, a worker pool runs the export
+# with the functions in tools.py and the agent polls the job's status. Jobs live in a small SQLite
+# table, so queued and interrupted jobs are picked up again after a restart.
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .artifacts import MissingArtifact, resolve, session_scope
+from .drive_files import created_for, origin
+from .storage import connect, data_path
+from .tracing import lazy_tools
+
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_JOBS_PATH = os.getenv("EXPORT_JOBS_PATH") # Defaults to export_jobs.sqlite3 in the data dir
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "4"))
+# A job interrupted this many times (its process died while running it) is failed instead of run again
+EXPORT_JOB_MAX_ATTEMPTS = int(os.getenv("EXPORT_JOB_MAX_ATTEMPTS", "3"))
+EXPORT_JOB_RETENTION_SECONDS = int(os.getenv("EXPORT_JOB_RETENTION_SECONDS", str(7 * 24 * 60 * 60)))
+# Longest a status call may wait for a job to finish
+EXPORT_STATUS_MAX_WAIT_SECONDS = float(os.getenv("EXPORT_STATUS_MAX_WAIT_SECONDS", "10"))
+# How often idle workers look for jobs queued by other processes sharing the store
+_POLL_SECONDS = 1.0
+
+# Marks the jobs this process is running. A restarted process often gets the same PID (PID 1 in a
+# container), so the PID alone cannot tell its own interrupted jobs from ones it is running.
+_instance = uuid.uuid4().hex
+
+
+def _new_instance() -> None:
+    global _instance
+    _instance = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_new_instance)
+
+
+def _export_doc(args: Dict[str, Any]) -> Dict[str, Any]:
+    from .tools import export_trip_plan_to_google_doc
+
+    return export_trip_plan_to_google_doc(**args)
+
+
+def _export_sheet(args: Dict[str, Any]) -> Dict[str, Any]:
+    from .tools import export_trip_plan_to_google_sheet
+
+    return export_trip_plan_to_google_sheet(**args)
+
+
+def _delete_file(args: Dict[str, Any]) -> Dict[str, Any]:
+    from .tools import delete_google_file_by_id
+
+    return delete_google_file_by_id(**args)
+
+
+def _delete_files(args: Dict[str, Any]) -> Dict[str, Any]:
+    from .tools import delete_google_files_by_id
+
+    return delete_google_files_by_id(**args)
+
+
+def _share_again(file_id: str) -> Optional[str]:
+    from .tools import share_created_file
+
+    return share_created_file(file_id)
+
+
+# kind -> function taking the job's arguments and returning the tool's result dict
+JOB_KINDS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "google_doc": _export_doc,
+    "google_sheet": _export_sheet,
+    "delete_file": _delete_file,
+    "delete_files": _delete_files,
+}
+
+# kind -> the job's arguments for a rerun that continues with the file an interrupted run already created
+# instead of creating another one: the doc export then updates that document, the sheet export rewrites its
+# rows. Neither path shares the file, so a resumed job shares it again once it has succeeded.
+RESUME_ARGS: Dict[str, Callable[[Dict[str, Any], str], Dict[str, Any]]] = {
+    "google_doc": lambda args, file_id: dict(args, document_id=file_id),
+    "google_sheet": lambda args, file_id: dict(args, spreadsheet_id=file_id, append_data=False),
+}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned(owner: Optional[int], instance: Optional[str]) -> bool:
+    # A running job belongs to a live worker if this process runs it, or another live process does
+    if instance == _instance:
+        return False
+    return not owner or owner == os.getpid() or not _pid_alive(owner)
+
+
+class ExportJobs:
+    """
+    Job table plus the worker threads that run it. Workers claim the oldest queued job in a write
+    transaction, so several processes can share one store without running a job twice. Workers are
+    daemon threads: a job cut off by the process exiting stays "running" and is queued again by the
+    next process that opens the store, up to `max_attempts` runs. The ID of a file a job creates is
+    saved with the job as soon as it exists, and a rerun continues with that file (RESUME_ARGS).
+    """
+
+    def __init__(self, path: str, workers: int = EXPORT_JOB_WORKERS, max_attempts: int = EXPORT_JOB_MAX_ATTEMPTS,
+                 kinds: Optional[Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = None):
+        self.max_attempts = max_attempts
+        self.kinds = kinds or JOB_KINDS
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._conn = connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS export_jobs ("
+            " job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, args TEXT NOT NULL, scope TEXT,"
+            " state TEXT NOT NULL, result TEXT, attempts INTEGER NOT NULL DEFAULT 0, owner INTEGER,"
+            " instance TEXT, file_id TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(export_jobs)")}
+        for column in ("instance", "file_id"):
+            if column not in columns: # Stores created before the column existed
+                self._conn.execute(f"ALTER TABLE export_jobs ADD COLUMN {column} TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS export_jobs_state ON export_jobs (state, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS export_jobs_scope ON export_jobs (scope, created_at)")
+        self._conn.commit()
+        self.requeued = self._recover()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"export-job-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _recover(self) -> int:
+        # Requeues jobs whose process died (or was restarted) while running them, and drops long-finished jobs
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM export_jobs WHERE finished_at IS NOT NULL AND finished_at <= ?",
+                               (now - EXPORT_JOB_RETENTION_SECONDS,))
+            orphans = [job_id for job_id, owner, instance in self._conn.execute(
+                "SELECT job_id, owner, instance FROM export_jobs WHERE state = 'running'") if _orphaned(owner, instance)]
+            requeued = 0
+            for job_id in orphans:
+                attempts = self._conn.execute("SELECT attempts FROM export_jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+                if attempts >= self.max_attempts:
+                    result = {"status": "error", "message": f"The export was interrupted {attempts} times and was not retried."}
+                    self._conn.execute(
+                        "UPDATE export_jobs SET state = 'failed', result = ?, finished_at = ? WHERE job_id = ?",
+                        (json.dumps(result), now, job_id))
+                else:
+                    self._conn.execute("UPDATE export_jobs SET state = 'queued', owner = NULL, instance = NULL WHERE job_id = ?", (job_id,))
+                    requeued += 1
+            self._conn.commit()
+        if requeued:
+            logger.info("export_jobs - requeued %d interrupted jobs", requeued)
+        return requeued
+
+    def submit(self, kind: str, args: Dict[str, Any], scope: Optional[str] = None) -> str:
+        if kind not in self.kinds:
+            raise ValueError(f"unknown export job kind {kind!r}")
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO export_jobs (job_id, kind, args, scope, state, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(args), scope, time.time()))
+            self._conn.commit()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _claim(self) -> Optional[tuple]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, kind, args, file_id FROM export_jobs WHERE state = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE export_jobs SET state = 'running', owner = ?, instance = ?, attempts = attempts + 1, started_at = ?"
+                        " WHERE job_id = ?", (os.getpid(), _instance, time.time(), row[0]))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _created(self, job_id: str, file_id: str) -> None:
+        # Committed at once: it has to outlive a crash later in the same job
+        with self._lock:
+            self._conn.execute("UPDATE export_jobs SET file_id = ? WHERE job_id = ?", (file_id, job_id))
+            self._conn.commit()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stops the workers once their current jobs are done; queued jobs stay queued in the store."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self) -> None:
+        while not self._stopping:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(_POLL_SECONDS)
+                continue
+            job_id, kind, args, file_id = job
+            try:
+                args = json.loads(args)
+                resumed = bool(file_id) and kind in RESUME_ARGS
+                if resumed:
+                    logger.info("export_jobs - job %s (%s) continues with file %s from an interrupted run", job_id, kind, file_id)
+                    args = RESUME_ARGS[kind](args, file_id)
+                # Files the job creates are registered for the conversation that submitted it
+                owner, scope = args.pop("origin", None) or (None, None)
+                with created_for(owner, scope, on_created=lambda created_id, job_id=job_id: self._created(job_id, created_id)):
+                    result = self.kinds[kind](args)
+                if resumed and result.get("status") == "success":
+                    share_error = _share_again(file_id)
+                    if share_error:
+                        result["share_error"] = share_error
+            except Exception as e:
+                logger.error("export_jobs - job %s (%s) raised: %s", job_id, kind, e)
+                result = {"status": "error", "message": str(e)}
+            state = "failed" if result.get("status") == "error" else "succeeded"
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE export_jobs SET state = ?, result = ?, finished_at = ? WHERE job_id = ?",
+                    (state, json.dumps(result), time.time(), job_id))
+                self._conn.commit()
+            logger.info("export_jobs - job %s (%s) %s", job_id, kind, state)
+            with self._finished:
+                self._finished.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, state, result, attempts, created_at, started_at, finished_at FROM export_jobs WHERE job_id = ?",
+                (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def list(self, scope: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """The most recent jobs submitted in `scope`, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, kind, state, result, attempts, created_at, started_at, finished_at FROM export_jobs"
+                " WHERE scope = ? ORDER BY created_at DESC LIMIT ?", (scope, limit)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Returns the job once it has finished, or as it is after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["state"] in ("succeeded", "failed") or remaining <= 0:
+                return job
+            with self._finished:
+                # Woken by this process's workers; jobs run by other processes are seen on the next poll
+                self._finished.wait(min(remaining, _POLL_SECONDS))
+
+    @staticmethod
+    def _as_dict(row: tuple) -> Dict[str, Any]:
+        job_id, kind, state, result, attempts, created_at, started_at, finished_at = row
+        job = {"job_id": job_id, "kind": kind, "state": state, "attempts": attempts}
+        if result is not None:
+            job["result"] = json.loads(result)
+        if finished_at is not None and started_at is not None:
+            job["seconds"] = round(finished_at - started_at, 3)
+        elif started_at is not None:
+            job["running_for_seconds"] = round(time.time() - started_at, 3)
+        else:
+            job["queued_for_seconds"] = round(time.time() - created_at, 3)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM export_jobs GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in ("queued", "running", "succeeded", "failed")}
+
+
+_jobs: Optional[ExportJobs] = None
+_init_lock = threading.Lock()
+
+
+def get_export_jobs() -> ExportJobs:
+    """Process-wide job store; its workers start, and interrupted jobs are requeued, on first use."""
+    global _jobs
+    if _jobs is None:
+        with _init_lock:
+            if _jobs is None:
+                _jobs = ExportJobs(EXPORT_JOBS_PATH or data_path("export_jobs.sqlite3"))
+    return _jobs
+
+
+def _submitted(kind: str, args: Dict[str, Any], tool_context) -> Dict[str, Any]:
+    scope = session_scope(tool_context) if tool_context is not None else None
+    if tool_context is not None:
+        args = dict(args, origin=origin(tool_context))
+    job_id = get_export_jobs().submit(kind, args, scope)
+    return {
+        "status": "success",
+        "job_id": job_id,
+        "state": "queued",
+        "message": f"Export job {job_id} started in the background. Check on it with get_export_job_status.",
+    }
+
+
+def submit_google_doc_export(
+    flight_data: Optional[str] = None,
+    hotel_data: Optional[str] = None,
+    itinerary_data: Optional[str] = None,
+    food_recommendations_data: Optional[str] = None,
+    document_title: Optional[str] = "Travel Plan Document",
+    document_id: Optional[str] = None,
+    tool_context: Any = None,
+) -> Dict[str, Any]:
+    """
+    Starts exporting the trip plan to a Google Doc in the background and returns a job ID right away.
+    Takes the same arguments as export_to_google_doc_tool: leave a section out to use the text saved for
+    this conversation, and pass document_id to update an existing document instead of creating one.
+    Use get_export_job_status with the job ID to get the document URL once the job has finished.
+    """
+    # Saved sections are resolved now, so the job does not depend on this conversation any more
+    try:
+        args = {
+            "flight_data": resolve(tool_context, flight_data, "flight_data"),
+            "hotel_data": resolve(tool_context, hotel_data, "hotel_data"),
+            "itinerary_data": resolve(tool_context, itinerary_data, "itinerary_data"),
+            "food_recommendations_data": resolve(tool_context, food_recommendations_data, "food_data"),
+            "document_title": document_title,
+            "document_id": document_id,
+        }
+    except MissingArtifact as e:
+        return {"status": "error", "message": str(e)}
+    return _submitted("google_doc", args, tool_context)
+
+
+def submit_google_sheet_export(
+    financial_data: Optional[Dict[str, float]] = None,
+    source: str = "",
+    destination: str = "",
+    financial_summary: Optional[str] = None,
+    spreadsheet_id: Optional[str] = None,
+    spreadsheet_title: Optional[str] = "New Travel Plan",
+    append_data: bool = False,
+    tool_context: Any = None,
+) -> Dict[str, Any]:
+    """
+    Starts exporting the financial plan to a Google Sheet in the background and returns a job ID right away.
+    Takes the same arguments as export_to_google_sheet_tool; financial_data and financial_summary can be
+    left out to use the ones calculate_trip_budget saved. Use get_export_job_status with the job ID to get
+    the spreadsheet URL once the job has finished.
+    """
+    try:
+        financial_data = resolve(tool_context, financial_data, "financial_data")
+        financial_summary = resolve(tool_context, financial_summary, "financial_summary")
+    except MissingArtifact as e:
+        return {"status": "error", "message": str(e)}
+    if not isinstance(financial_data, dict):
+        return {"status": "error", "message": "No financial_data given and none saved for this conversation; call calculate_trip_budget first."}
+    args = {
+        "financial_data": financial_data,
+        "source": source,
+        "destination": destination,
+        "financial_summary": financial_summary,
+        "spreadsheet_id": spreadsheet_id,
+        "spreadsheet_title": spreadsheet_title,
+        "append_data": append_data,
+    }
+    return _submitted("google_sheet", args, tool_context)
+
+
+def submit_google_file_deletion(file_id: Optional[str] = None, file_ids: Optional[List[str]] = None,
+                                tool_context: Any = None) -> Dict[str, Any]:
+    """
+    Starts permanently deleting Google Sheets or Docs in the background and returns a job ID right away.
+    Pass one file ID as file_id, or up to 100 as file_ids to delete them together in one batch request.
+    Use get_export_job_status with the job ID to confirm the deletion.
+    """
+    if file_ids:
+        return _submitted("delete_files", {"file_ids": list(file_ids) + ([file_id] if file_id else [])}, tool_context)
+    if not file_id:
+        return {"status": "error", "message": "Pass the file_id (or file_ids) of the files to delete."}
+    return _submitted("delete_file", {"file_id": file_id}, tool_context)
+
+
+def get_export_job_status(job_id: Optional[str] = None, wait_seconds: float = 0, tool_context: Any = None) -> Dict[str, Any]:
+    """
+    Reports the state of a background export job: "queued", "running", "succeeded" or "failed". Finished
+    jobs include the export's result (e.g. the document or spreadsheet URL, or the error).
+
+    Args:
+        job_id: The job ID returned when the export was submitted. Leave out to list this conversation's recent jobs.
+        wait_seconds: Wait up to this many seconds (at most 10) for the job to finish before answering.
+    """
+    jobs = get_export_jobs()
+    if not job_id:
+        if tool_context is None:
+            return {"status": "error", "message": "Pass the job_id returned when the export was submitted."}
+        return {"status": "success", "jobs": jobs.list(session_scope(tool_context))}
+    job = jobs.wait(job_id, min(max(float(wait_seconds or 0), 0.0), EXPORT_STATUS_MAX_WAIT_SECONDS))
+    if job is None:
+        return {"status": "error", "message": f"No export job with ID '{job_id}'."}
+    return dict(job, status="success")
+
+
+def export_job_stats() -> Dict[str, int]:
+    """Jobs in the store by state."""
+    return get_export_jobs().stats()
+
+
+__getattr__ = lazy_tools(__name__, {
+    "submit_google_doc_export_tool": submit_google_doc_export,
+    "submit_google_sheet_export_tool": submit_google_sheet_export,
+    "submit_google_file_deletion_tool": submit_google_file_deletion,
+    "get_export_job_status_tool": get_export_job_status,
+})
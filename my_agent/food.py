@@ -0,0 +1,203 @@
+# Batched food search: one search per itinerary area instead of one per meal slot
+import logging
+import os
+import re
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from .research import run_blocking, search_all_async
+from .tracing import lazy_tools
+
+
+logger = logging.getLogger(__name__)
+
+
+# Areas searched separately; slots in further areas share one city-wide search
+FOOD_SEARCH_MAX_AREAS = int(os.getenv("FOOD_SEARCH_MAX_AREAS", "12"))
+FOOD_SNIPPET_CHARS = int(os.getenv("FOOD_SNIPPET_CHARS", "300"))
+
+_DAY = re.compile(r"\bday\s*(\d+)\b\s*[:.,-]?", re.IGNORECASE)
+# Sentence ends (but not "St." or "Mt." in names), semicolons, commas and sequencing words end a segment
+_SEGMENT_SPLIT = re.compile(r"[;\n]+|,|(?<!\bSt)(?<!\bMt)(?<!\bDr)[.!?](?:\s+|$)|\bthen\b|\bafterwards\b", re.IGNORECASE)
+_AND = re.compile(r"\band\b", re.IGNORECASE)
+_MEALS = (
+    ("breakfast", re.compile(r"\b(breakfast|brunch|morning)\b", re.IGNORECASE)),
+    ("lunch", re.compile(r"\b(lunch(?:time)?|noon|midday|afternoon)\b", re.IGNORECASE)),
+    ("dinner", re.compile(r"\b(dinner(?:time)?|supper|evening|night)\b", re.IGNORECASE)),
+)
+_TIME_PHRASE = re.compile(
+    r"\b(?:(?:in|around|at|for|during|by)\s+)?(?:the\s+)?(?:early\s+|late\s+)?"
+    r"(?:morning|afternoon|evening|night|lunch(?:time)?|dinner(?:time)?|breakfast|brunch|supper|noon|midday)\b",
+    re.IGNORECASE,
+)
+_FILLER = re.compile(
+    r"^(?:\W|\b(?:on|and|they|we|you|i|will|'ll|be|are|is|go(?:ing)?|to|near|around|at|by|in|visit(?:ing)?|explor(?:e|ing)|the)\b)+",
+    re.IGNORECASE,
+)
+_AREA_SUFFIX = re.compile(r"\s+(?:area|district|neighbou?rhood|quarter)\W*$", re.IGNORECASE)
+_KEY_STOPWORDS = frozenset({"the", "of", "a", "an", "and", "de", "la", "le", "area", "district", "neighborhood", "neighbourhood", "quarter"})
+# Segments like "free afternoon" or "rest at the hotel" name no place to search around
+_NOT_PLACES = frozenset({"free", "time", "day", "rest", "leisure", "relax", "relaxing", "break", "hotel", "own", "your", "their", "at", "the"})
+# Kinds of place: "Museum" alone is not the same place as "Louvre Museum"
+_GENERIC_PLACES = frozenset({
+    "museum", "gallery", "park", "garden", "gardens", "tower", "square", "plaza", "market", "church", "cathedral",
+    "palace", "castle", "bridge", "beach", "station", "street", "old", "town", "city", "center", "centre", "downtown",
+    "harbor", "harbour", "port", "river", "lake", "hill", "island", "temple", "university", "zoo", "stadium",
+})
+
+
+def _place(segment: str) -> str:
+    # "they will be near the Eiffel Tower around lunchtime" -> "Eiffel Tower"
+    text = _TIME_PHRASE.sub(" ", segment)
+    text = _FILLER.sub("", text.strip())
+    text = re.sub(r"\s+", " ", _AREA_SUFFIX.sub("", text)).strip(" .:-!?\"'")
+    return "" if set(re.findall(r"\w+", text.lower())) <= _NOT_PLACES else text
+
+
+def _meal(segment: str) -> Optional[str]:
+    # The time of day closest to the start of the segment's place, i.e. the phrase attached to it
+    place_at = len(_FILLER.match(segment).group(0)) if _FILLER.match(segment) else 0
+    matches = [(abs(m.start() - place_at), name) for name, pattern in _MEALS for m in pattern.finditer(segment)]
+    return min(matches)[1] if matches else None
+
+
+def _split_places(segment: str) -> List[str]:
+    """
+    Splits a segment at "and" between two place phrases, as in "Le Marais for dinner and the Louvre in the
+    afternoon". "and" inside a name ("Arts and Crafts Museum") is kept: the parts are only split when
+    the place before "and" has its own time of day, or the part after it starts in lower case ("and the").
+    """
+    parts = _AND.split(segment)
+    pieces = [parts[0]]
+    for part in parts[1:]:
+        previous = pieces[-1]
+        own_time = any(pattern.search(previous) for _, pattern in _MEALS)
+        lowercase_start = part.strip()[:1].islower()
+        if _place(previous) and _place(part) and (own_time or lowercase_start):
+            pieces.append(part)
+        else:
+            pieces[-1] = f"{previous}and{part}"
+    return pieces
+
+
+def _key(place: str) -> FrozenSet[str]:
+    return frozenset(word for word in re.findall(r"\w+", place.lower()) if word not in _KEY_STOPWORDS)
+
+
+def _same_area(key: FrozenSet[str], other: FrozenSet[str]) -> bool:
+    # One name contains the other, and the shared words name more than a kind of place
+    return key == other or ((key <= other or other <= key) and bool((key & other) - _GENERIC_PLACES))
+
+
+def parse_slots(itinerary: str) -> List[Dict[str, Any]]:
+    """
+    Meal slots in a free-text itinerary: {"day", "meal", "place"} for every segment naming a place,
+    e.g. "Day 1: Eiffel Tower area in the morning, Louvre Museum in the afternoon" gives
+    (1, "breakfast", "Eiffel Tower") and (1, "lunch", "Louvre Museum"). Segments end at sentences, commas
+    and "then", and at "and" between two places. "meal" is None when no time of day is given and
+    "place" is "" for a meal without a location.
+    """
+    marks = list(_DAY.finditer(itinerary))
+    blocks = [(None, itinerary[:marks[0].start()] if marks else itinerary)]
+    blocks += [(int(m.group(1)), itinerary[m.end():nxt.start() if nxt else len(itinerary)])
+               for m, nxt in zip(marks, marks[1:] + [None])]
+    slots = []
+    for day, block in blocks:
+        for sentence in _SEGMENT_SPLIT.split(block):
+            for segment in _split_places(sentence):
+                if not segment.strip():
+                    continue
+                meal = _meal(segment)
+                place = _place(segment)
+                if place or meal:
+                    slots.append({"day": day, "meal": meal, "place": place})
+    return slots
+
+
+def group_slots(slots: List[Dict[str, Any]], max_areas: int = FOOD_SEARCH_MAX_AREAS) -> List[Dict[str, Any]]:
+    """
+    Groups slots that name the same landmark or neighborhood ("Louvre" and "the Louvre Museum area" share
+    one group, while a bare "Museum" or "Park" does not join "Louvre Museum" or "Central Park"). Slots without a place, and those beyond `max_areas` groups, go to one city-wide group
+    whose "area" is "".
+    """
+    areas: List[Dict[str, Any]] = []
+    citywide: List[int] = []
+    for i, slot in enumerate(slots):
+        key = _key(slot["place"])
+        if not key:
+            citywide.append(i)
+            continue
+        area = next((a for a in areas if _same_area(key, a["key"])), None)
+        if area is None:
+            if len(areas) >= max_areas:
+                citywide.append(i)
+                continue
+            area = {"area": slot["place"], "key": key, "slots": []}
+            areas.append(area)
+        elif len(key) > len(area["key"]):
+            # Search for the most specific name seen for the landmark
+            area["area"], area["key"] = slot["place"], key
+        area["slots"].append(i)
+    if citywide:
+        areas.append({"area": "", "key": frozenset(), "slots": citywide})
+    return areas
+
+
+def _query(area: str, city: str, cuisines: List[str], meals: List[str]) -> str:
+    cuisine_text = " or ".join(cuisines) + " " if cuisines else ""
+    meal_text = " for " + " and ".join(meals) if meals else ""
+    where = f"near {area}, {city}" if area else f"in {city}"
+    return f"best {cuisine_text}restaurants{meal_text} {where}".replace("  ", " ")
+
+
+def food_search(
+    itinerary: str,
+    city: str,
+    cuisine_preferences: Optional[List[str]] = None,
+    results_per_area: int = 3,
+) -> Dict[str, Any]:
+    """
+    Finds restaurants, cafes and food trucks for a whole itinerary at once. Slots near the same landmark
+    or neighborhood share one search and all searches run concurrently.
+
+    Args:
+        itinerary: The itinerary text with the places and times of day, e.g.
+            "Day 1: Eiffel Tower in the morning, Louvre at lunch. Day 2: Montmartre in the evening".
+        city: The city of the trip, e.g. "Paris".
+        cuisine_preferences: Cuisines or dishes the user likes, e.g. ["French", "vegetarian"].
+        results_per_area: Search results to return for each area.
+
+    Returns:
+        {"status": "success", "areas": [{"area", "query", "results": [{"title", "url", "snippet"}]}],
+        "slots": [{"day", "meal", "place", "area_index"}], "searches"} where each slot points at the area
+        in "areas" whose results apply to it.
+    """
+    slots = parse_slots(itinerary or "")
+    if not slots:
+        return {"status": "error", "message": "No places found in the itinerary. Pass it as text such as 'Day 1: Eiffel Tower at lunch, Louvre in the evening'."}
+    cuisines = [c.strip() for c in cuisine_preferences or [] if c and c.strip()]
+    areas = group_slots(slots)
+    meal_order = [name for name, _ in _MEALS]
+    for area in areas:
+        meals = {slots[i]["meal"] for i in area["slots"]}
+        area["query"] = _query(area["area"], city, cuisines, [m for m in meal_order if m in meals])
+
+    logger.info("food - %d itinerary slots grouped into %d searches", len(slots), len(areas))
+    responses = run_blocking(search_all_async([area["query"] for area in areas], max_results=results_per_area))
+
+    result_areas = []
+    for index, (area, response) in enumerate(zip(areas, responses)):
+        result_areas.append({
+            "area": area["area"] or city,
+            "query": area["query"],
+            "results": [
+                {"title": r.get("title", ""), "url": r.get("url", ""), "snippet": (r.get("content") or "")[:FOOD_SNIPPET_CHARS]}
+                for r in (response or {}).get("results", [])
+            ],
+            "failed": response is None,
+        })
+        for i in area["slots"]:
+            slots[i]["area_index"] = index
+    return {"status": "success", "city": city, "searches": len(areas), "areas": result_areas, "slots": slots}
+
+
+__getattr__ = lazy_tools(__name__, {"food_search_tool": food_search})
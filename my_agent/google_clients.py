@@ -0,0 +1,158 @@
+# Process-wide Google API clients for the export tools
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+SHEETS_SERVICE_ACCOUNT_KEY_PATH = os.getenv("SHEETS_SERVICE_ACCOUNT_KEY_PATH") # Path to your service account JSON
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive.file', # Scope for Drive API to manage permissions
+    'https://www.googleapis.com/auth/documents' # Scope for Google Docs API
+]
+
+# API name -> version for every service the tools talk to
+SERVICE_VERSIONS = {
+    'sheets': 'v4',
+    'drive': 'v3',
+    'docs': 'v1',
+}
+
+
+def _resolve_key_path(key_path: str) -> str:
+    """Relative key paths are resolved against this package directory, like the original tools.py helper."""
+    if os.path.isabs(key_path):
+        return key_path
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, key_path)
+
+
+def _service_account_credentials(key_path: Optional[str]):
+    from google.oauth2.service_account import Credentials
+
+    if not key_path:
+        raise ValueError("SHEETS_SERVICE_ACCOUNT_KEY_PATH environment variable is not set or is empty. Please check your .env file.")
+    service_account_file_path = _resolve_key_path(key_path)
+    if not os.path.exists(service_account_file_path):
+        raise FileNotFoundError(f"Service account file not found at: {service_account_file_path}")
+    logger.info("Loading service account credentials from: %s", service_account_file_path)
+    return Credentials.from_service_account_file(service_account_file_path, scopes=SCOPES)
+
+
+def _authorized_http(credentials):
+    import google_auth_httplib2
+    import httplib2
+
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+
+
+class _ThreadLocalHttp:
+    """
+    Transport handed to googleapiclient in place of a single httplib2.Http.
+    httplib2 is not thread-safe, so every thread lazily gets its own AuthorizedHttp.
+    All of them wrap the same credentials object, which refreshes its token in place.
+    """
+
+    def __init__(self, credentials, http_factory: Callable[[Any], Any]):
+        self.credentials = credentials # Read by googleapiclient batch requests
+        self._http_factory = http_factory
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = self._http_factory(self.credentials)
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def close(self):
+        http = getattr(self._local, 'http', None)
+        if http is not None:
+            http.close()
+            self._local.http = None
+
+
+class GoogleClientRegistry:
+    """
+    Builds each Google API service lazily and at most once per process.
+    Services are built from the static discovery documents bundled with
+    googleapiclient, so no discovery fetch happens at runtime.
+    """
+
+    def __init__(
+        self,
+        key_path: Optional[str] = None,
+        credentials_factory: Optional[Callable[[], Any]] = None,
+        http_factory: Callable[[Any], Any] = _authorized_http,
+    ):
+        self._key_path = key_path
+        self._credentials_factory = credentials_factory
+        self._http_factory = http_factory
+        self._lock = threading.Lock()
+        self._http: Optional[_ThreadLocalHttp] = None
+        self._services: Dict[str, Any] = {}
+
+    def _transport(self) -> _ThreadLocalHttp:
+        # Caller holds self._lock
+        if self._http is None:
+            if self._credentials_factory is not None:
+                credentials = self._credentials_factory()
+            else:
+                credentials = _service_account_credentials(self._key_path or SHEETS_SERVICE_ACCOUNT_KEY_PATH)
+            self._http = _ThreadLocalHttp(credentials, self._http_factory)
+        return self._http
+
+    def get(self, name: str):
+        """Returns the shared service client for `name` ('sheets', 'drive' or 'docs'), building it on first use."""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                from googleapiclient.discovery import build
+
+                service = build(
+                    name,
+                    SERVICE_VERSIONS[name],
+                    http=self._transport(),
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+                self._services[name] = service
+                logger.info("Built Google %s API client.", name)
+        return service
+
+    def wrap_http(self, wrapper: Callable[[Any], Any]) -> None:
+        """Wraps the transport of every client built from now on (e.g. to record requests); drops the clients built so far."""
+        with self._lock:
+            factory = self._http_factory
+            self._http_factory = lambda credentials: wrapper(factory(credentials))
+        self.reset()
+
+    def reset(self) -> None:
+        """Drops cached clients and credentials, e.g. after the service account key changed."""
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+            self._http = None
+            self._services.clear()
+
+
+registry = GoogleClientRegistry()
+
+
+def get_service(name: str):
+    """Returns the shared client for `name`, or None if it cannot be built (errors are printed)."""
+    try:
+        return registry.get(name)
+    except Exception as e:
+        logger.error("get_service - Failed to create Google %s service: %s", name, e)
+        return None
@@ -0,0 +1,327 @@
+# Semantic cache for generated itineraries: exact keys on normalized trip parameters plus
+# near-miss matches through cosine similarity over lightweight hashed text embeddings
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .singleflight import SingleFlight
+from .storage import connect, data_path
+from .streaming import StreamStats
+
+
+ITINERARY_CACHE_ENABLED = os.getenv("ITINERARY_CACHE_ENABLED", "1") not in ("0", "false", "False")
+ITINERARY_CACHE_PATH = os.getenv("ITINERARY_CACHE_PATH") # Defaults to itinerary_cache.sqlite3 in the data dir
+ITINERARY_CACHE_TTL_SECONDS = int(os.getenv("ITINERARY_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+ITINERARY_CACHE_MAX_ENTRIES = int(os.getenv("ITINERARY_CACHE_MAX_ENTRIES", "2000"))
+# Minimum cosine similarity between interest embeddings for a near-miss hit
+ITINERARY_CACHE_SIMILARITY = float(os.getenv("ITINERARY_CACHE_SIMILARITY", "0.85"))
+# Budgets are bucketed for exact keys; near-miss hits accept budgets within this relative distance
+ITINERARY_CACHE_BUDGET_BUCKET = int(os.getenv("ITINERARY_CACHE_BUDGET_BUCKET", "250"))
+ITINERARY_CACHE_BUDGET_TOLERANCE = float(os.getenv("ITINERARY_CACHE_BUDGET_TOLERANCE", "0.15"))
+
+EMBEDDING_DIMS = 256
+
+# Common spellings folded onto one canonical interest
+_INTEREST_ALIASES = {
+    "arts": "art", "artwork": "art", "galleries": "art", "gallery": "art",
+    "foodie": "food", "cuisine": "food", "eating": "food", "restaurants": "food", "dining": "food",
+    "museums": "museum", "historical": "history", "historic": "history",
+    "bars": "nightlife", "clubs": "nightlife",
+    "beaches": "beach", "hiking": "hike", "outdoors": "nature", "outdoor": "nature",
+    "shopping": "shop", "shops": "shop",
+}
+_INTEREST_SPLIT = re.compile(r"\s*(?:,|;|\+|&|/|\band\b)\s*")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    """Lower case without accents or punctuation, single spaces ("Zürich!" -> "zurich")."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_WORD.findall(text))
+
+
+def normalize_city(city: str) -> str:
+    """"Paris, France" and " paris " both become "paris"."""
+    return _fold(city.split(",")[0])
+
+
+def canonical_interests(interests: List[str]) -> List[str]:
+    """Sorted, de-duplicated interests with aliases folded: ["Food and Art", "arts"] -> ["art", "food"]."""
+    canonical = set()
+    for raw in interests:
+        for part in _INTEREST_SPLIT.split(raw.casefold()):
+            interest = _fold(part)
+            if not interest:
+                continue
+            interest = _INTEREST_ALIASES.get(interest, interest)
+            canonical.add(interest)
+    return sorted(canonical)
+
+
+def budget_bucket(budget: float, bucket: int = ITINERARY_CACHE_BUDGET_BUCKET) -> int:
+    return int(round(float(budget) / bucket))
+
+
+def trip_key(mode: str, city: str, interests: List[str], budget: float, days: int) -> str:
+    raw = json.dumps([mode, normalize_city(city), canonical_interests(interests), budget_bucket(budget), int(days)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def embed(text: str, dims: int = EMBEDDING_DIMS) -> np.ndarray:
+    """
+    Unit-length signed feature-hashing embedding of the words and character trigrams of `text`.
+    Cheap and deterministic; close spellings and reordered words land near each other.
+    """
+    vector = np.zeros(dims, dtype=np.float32)
+    folded = _fold(text)
+    features = folded.split()
+    padded = f" {folded} "
+    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dims] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _group(mode: str, city: str, days: int) -> int:
+    # Near-miss candidates must share mode, city and trip length
+    return zlib.crc32(json.dumps([mode, normalize_city(city), int(days)]).encode("utf-8"))
+
+
+@dataclass
+class CacheHit:
+    text: str
+    match: str # "exact" or "similar"
+    similarity: float
+    generation_seconds: float
+
+
+class ItineraryCache:
+    """
+    Generated itineraries stored in SQLite and mirrored in memory as a NumPy matrix of interest
+    embeddings. lookup() tries the exact key first, then the most similar entry for the same
+    mode/city/days whose budget is within `budget_tolerance` and whose similarity reaches `threshold`.
+    Entries expire after `ttl_seconds`; past `max_entries` the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int = ITINERARY_CACHE_TTL_SECONDS,
+        max_entries: int = ITINERARY_CACHE_MAX_ENTRIES,
+        threshold: float = ITINERARY_CACHE_SIMILARITY,
+        budget_tolerance: float = ITINERARY_CACHE_BUDGET_TOLERANCE,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.budget_tolerance = budget_tolerance
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS itineraries ("
+            " key TEXT PRIMARY KEY, grp INTEGER NOT NULL, budget REAL NOT NULL, embedding BLOB NOT NULL,"
+            " text TEXT NOT NULL, generation_seconds REAL NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # In-memory index: row i of _vectors belongs to _keys[i]
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.zeros((0, EMBEDDING_DIMS), dtype=np.float32)
+        self._groups = np.zeros(0, dtype=np.int64)
+        self._budgets = np.zeros(0, dtype=np.float64)
+        self._created = np.zeros(0, dtype=np.float64)
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM itineraries WHERE created_at <= ?", (now - self.ttl_seconds,))
+        self._conn.commit()
+        rows = self._conn.execute("SELECT key, grp, budget, embedding, created_at FROM itineraries").fetchall()
+        self._keys = [row[0] for row in rows]
+        self._rows = {key: i for i, key in enumerate(self._keys)}
+        self._groups = np.array([row[1] for row in rows], dtype=np.int64)
+        self._budgets = np.array([row[2] for row in rows], dtype=np.float64)
+        self._vectors = (np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+                         if rows else np.zeros((0, EMBEDDING_DIMS), dtype=np.float32))
+        self._created = np.array([row[4] for row in rows], dtype=np.float64)
+
+    def _find(self, key: str, group: int, budget: float, vector: np.ndarray, now: float) -> Tuple[Optional[str], str, float]:
+        # Caller holds self._lock
+        row = self._rows.get(key)
+        if row is not None and self._created[row] + self.ttl_seconds > now:
+            return key, "exact", 1.0
+        if not self._keys:
+            return None, "", 0.0
+        candidates = (
+            (self._groups == group)
+            & (np.abs(self._budgets - budget) <= self.budget_tolerance * max(budget, 1.0))
+            & (self._created + self.ttl_seconds > now)
+        )
+        if not candidates.any():
+            return None, "", 0.0
+        similarities = np.where(candidates, self._vectors @ vector, -1.0)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None, "", float(similarities[best])
+        return self._keys[best], "similar", float(similarities[best])
+
+    def lookup(self, mode: str, city: str, interests: List[str], budget: float, days: int) -> Optional[CacheHit]:
+        now = time.time()
+        key = trip_key(mode, city, interests, budget, days)
+        vector = embed(" ".join(canonical_interests(interests)))
+        with self._lock:
+            found, match, similarity = self._find(key, _group(mode, city, days), float(budget), vector, now)
+            row = None
+            if found is not None:
+                row = self._conn.execute("SELECT text, generation_seconds FROM itineraries WHERE key = ?", (found,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE itineraries SET accessed_at = ? WHERE key = ?", (now, found))
+            self._conn.commit()
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.similar_hits += 1
+            self.saved_seconds += row[1]
+        return CacheHit(text=row[0], match=match, similarity=round(similarity, 4), generation_seconds=row[1])
+
+    def store(self, mode: str, city: str, interests: List[str], budget: float, days: int,
+              text: str, generation_seconds: float) -> None:
+        now = time.time()
+        key = trip_key(mode, city, interests, budget, days)
+        group = _group(mode, city, days)
+        vector = embed(" ".join(canonical_interests(interests)))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO itineraries (key, grp, budget, embedding, text, generation_seconds, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, group, float(budget), vector.tobytes(), text, generation_seconds, now, now),
+            )
+            row = self._rows.get(key)
+            if row is None:
+                self._rows[key] = len(self._keys)
+                self._keys.append(key)
+                self._vectors = np.vstack([self._vectors, vector[None, :]])
+                self._groups = np.append(self._groups, group)
+                self._budgets = np.append(self._budgets, float(budget))
+                self._created = np.append(self._created, now)
+            else:
+                self._vectors[row] = vector
+                self._budgets[row] = float(budget)
+                self._created[row] = now
+            if len(self._keys) > self.max_entries:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        # Caller holds self._lock. Drops expired rows, then least recently used ones down to 90% of max_entries.
+        self.evictions += self._conn.execute("DELETE FROM itineraries WHERE created_at <= ?", (now - self.ttl_seconds,)).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM itineraries").fetchone()[0]
+        excess = count - int(self.max_entries * 0.9)
+        if excess > 0:
+            self.evictions += self._conn.execute(
+                "DELETE FROM itineraries WHERE key IN (SELECT key FROM itineraries ORDER BY accessed_at LIMIT ?)", (excess,)
+            ).rowcount
+        self._load()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": len(self._keys),
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[ItineraryCache] = None
+generation_flight = SingleFlight("generation")
+_init_lock = threading.Lock()
+
+
+def get_itinerary_cache() -> Optional[ItineraryCache]:
+    """The shared cache, or None when ITINERARY_CACHE_ENABLED is off."""
+    global _cache
+    if not ITINERARY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = ItineraryCache(ITINERARY_CACHE_PATH or data_path("itinerary_cache.sqlite3"))
+    return _cache
+
+
+def cached_stream(
+    mode: str,
+    city: str,
+    interests: List[str],
+    budget: float,
+    days: int,
+    generate: Callable[[StreamStats], Iterator[str]],
+    stats: Optional[StreamStats] = None,
+) -> Iterator[str]:
+    """
+    Yields a cached plan for the trip if there is one; otherwise streams `generate(stats)` and caches
+    the complete text (including the time spent on research and generation) once the stream finishes.
+    Concurrent calls for the same trip share one generation (generation_flight) and its chunks.
+    """
+    stats = stats if stats is not None else StreamStats()
+    # The one clock for every timing in `stats`: cache hits, shared streams and generations all count from entry
+    stats._start = start = time.perf_counter()
+    cache = get_itinerary_cache()
+    hit = cache.lookup(mode, city, interests, budget, days) if cache is not None else None
+    if hit is not None:
+        stats.cache = hit.match
+        stats.first_chunk_seconds = stats.total_seconds = time.perf_counter() - start
+        stats.chunks, stats.chars = 1, len(hit.text)
+        yield hit.text
+        return
+
+    def produce() -> Iterator[str]:
+        stats.coalesced = False # This call generates; the stats of calls sharing its stream are filled below
+        chunks = []
+        for chunk in generate(stats):
+            chunks.append(chunk)
+            yield chunk
+        # Only complete generations get here; a stream abandoned by every reader leaves the cache untouched
+        if cache is not None and chunks:
+            cache.store(mode, city, interests, budget, days, "".join(chunks).strip(), time.perf_counter() - start)
+
+    stats.coalesced = True
+    for chunk in generation_flight.stream(trip_key(mode, city, interests, budget, days), produce):
+        if stats.coalesced:
+            if stats.first_chunk_seconds is None:
+                stats.first_chunk_seconds = time.perf_counter() - start
+            stats.chunks += 1
+            stats.chars += len(chunk)
+        yield chunk
+    if stats.coalesced:
+        stats.total_seconds = time.perf_counter() - start
+
+
+def itinerary_cache_stats() -> Dict[str, Any]:
+    """Hit rate and saved generation time of the shared itinerary cache."""
+    cache = get_itinerary_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
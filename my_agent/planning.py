@@ -0,0 +1,91 @@
+# Concurrent planning stage: flights, hotels and itinerary are looked up at the same time
+import logging
+from typing import AsyncGenerator, List, Tuple
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+
+logger = logging.getLogger(__name__)
+
+
+# (state key, section heading) for every lookup merged by the planning stage, in output order
+TRIP_RESEARCH_SECTIONS: List[Tuple[str, str]] = [
+    ("flight_data", "Flights"),
+    ("hotel_data", "Hotels"),
+    ("itinerary_data", "Itinerary"),
+]
+
+
+def _text_event(ctx: InvocationContext, author: str, text: str, state_delta: dict = None) -> Event:
+    return Event(
+        invocation_id=ctx.invocation_id,
+        author=author,
+        branch=ctx.branch,
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta or {}),
+    )
+
+
+class IsolatedAgent(BaseAgent):
+    """
+    Runs a single sub-agent and keeps its failure from reaching sibling branches.
+    If the sub-agent raises, or finishes without saving anything under `output_key`,
+    an error note is written to `output_key` instead so the merge step still has a value.
+    """
+
+    output_key: str
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        agent = self.sub_agents[0]
+        error = None
+        try:
+            async for event in agent.run_async(ctx):
+                if event.error_message:
+                    error = event.error_message
+                yield event
+        except Exception as e:
+            error = str(e)
+            logger.error("%s failed during parallel planning: %s", agent.name, error)
+
+        if error is not None or not ctx.session.state.get(self.output_key):
+            note = f"_{agent.name} could not complete this lookup: {error or 'no result was returned'}._"
+            yield _text_event(ctx, self.name, note, {self.output_key: note})
+
+
+class TripResearchMerger(BaseAgent):
+    """Combines the state written by the parallel lookups into a single markdown reply."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        sections = []
+        for state_key, heading in TRIP_RESEARCH_SECTIONS:
+            sections.append(f"**{heading}** (saved as `{state_key}`)\n{ctx.session.state.get(state_key, '')}")
+        yield _text_event(ctx, self.name, "\n\n".join(sections))
+
+
+def build_trip_research_planner(flight_agent: BaseAgent, hotel_agent: BaseAgent, itinerary_agent: BaseAgent) -> BaseAgent:
+    """
+    Fans the flight, hotel and itinerary agents out concurrently and merges their results.
+    Each agent must set `output_key` to its entry in TRIP_RESEARCH_SECTIONS
+    ("flight_data", "hotel_data", "itinerary_data"); the wall-clock time of the stage is
+    roughly that of the slowest lookup instead of the sum of all three.
+    """
+    agents = [flight_agent, hotel_agent, itinerary_agent]
+    parallel_stage = ParallelAgent(
+        name="parallel_trip_lookups",
+        description="Runs flight, hotel and itinerary lookups concurrently.",
+        sub_agents=[
+            IsolatedAgent(name=f"isolated_{agent.name}", output_key=agent.output_key, sub_agents=[agent])
+            for agent in agents
+        ],
+    )
+    return SequentialAgent(
+        name="trip_research_planner",
+        description=(
+            "Looks up flights, hotels and a day-by-day itinerary at the same time for a trip whose origin, "
+            "destination and dates are known, and stores them as flight_data, hotel_data and itinerary_data."
+        ),
+        sub_agents=[parallel_stage, TripResearchMerger(name="trip_research_merger")],
+    )
@@ -0,0 +1,842 @@
+# Trace capture and replay: record mode writes every outbound Tavily, Gemini, Google Workspace and agent
+# model call (request, response, timing and size) plus the entry calls that caused them to a gzip JSON
+# lines trace; replay mode serves those responses locally and re-issues the entry calls at their original
+# inter-arrival times, or N times faster, so a day's traffic can be run against a new build offline.
+#
+# Usage:
+#   python -m my_agent.replay record trace.jsonl.gz -- my_agent.server --port 8080
+#   python -m my_agent.replay run trace.jsonl.gz [--speed 1] [--report new.json]
+#   python -m my_agent.replay compare old.json new.json
+#   python -m my_agent.replay info trace.jsonl.gz
+import argparse
+import asyncio
+import contextlib
+import copy
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+# Set to 0 to keep only the request keys and sizes, e.g. when prompts must not be written to disk
+REPLAY_RECORD_REQUESTS = os.getenv("REPLAY_RECORD_REQUESTS", "1") != "0"
+REPLAY_FLUSH_SECONDS = float(os.getenv("REPLAY_FLUSH_SECONDS", "5"))
+# Threads running the synchronous entry calls during a replay
+REPLAY_MAX_THREADS = int(os.getenv("REPLAY_MAX_THREADS", "64"))
+
+TRACE_VERSION = 1
+
+
+class ReplayMiss(LookupError):
+    """Raised in strict replays for an outbound call the trace has no response for."""
+
+
+class ReplayedError(RuntimeError):
+    """
+    Stands in for an error recorded from a client library. It carries the recorded HTTP status as `code`
+    and Retry-After in `response.headers`, which is what resilience.classify reads.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.code = status
+        self.response = _ReplayedResponse(status, {"retry-after": retry_after} if retry_after else {})
+
+
+class ReplayedConnectionError(ConnectionError):
+    """A recorded transient transport error (connection reset, timeout)."""
+
+
+class _ReplayedResponse:
+    def __init__(self, status: Optional[int], headers: Dict[str, str]):
+        self.status_code = status
+        self.headers = headers
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+def _error_record(error: BaseException) -> Dict[str, Any]:
+    from .resilience import classify
+
+    status, retry_after = None, None
+    transient, retry_after_seconds = classify(error)
+    for source in (getattr(error, "resp", None), getattr(error, "response", None)):
+        if source is not None:
+            status = getattr(source, "status", None) or getattr(source, "status_code", None)
+            break
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code
+    if retry_after_seconds is not None:
+        retry_after = f"{retry_after_seconds:g}"
+    return {"type": type(error).__name__, "message": str(error)[:500], "status": status,
+            "retry_after": retry_after, "transient": transient}
+
+
+def _raise_recorded(error: Dict[str, Any]) -> None:
+    if error.get("status") is None and error.get("transient"):
+        raise ReplayedConnectionError(error["message"])
+    raise ReplayedError(error["message"], error.get("status"), error.get("retry_after"))
+
+
+class TraceRecorder:
+    """Appends call and entry records to a gzip JSON lines trace; safe to use from many threads."""
+
+    def __init__(self, path: str, record_requests: bool = REPLAY_RECORD_REQUESTS):
+        self.path = path
+        self.record_requests = record_requests
+        self.started = time.monotonic()
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._flushed = self.started
+        self._write({"kind": "header", "version": TRACE_VERSION, "started_at": time.time(), "pid": os.getpid()})
+
+    def now(self) -> float:
+        return time.monotonic() - self.started
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.records += 1
+            if time.monotonic() - self._flushed > REPLAY_FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = time.monotonic()
+
+    def call(self, upstream: str, op: str, request: Any, key_source: Any, started: float, response: Any = None,
+             error: Optional[BaseException] = None, chunks: Optional[List[Tuple[float, Any]]] = None,
+             response_bytes: Optional[int] = None) -> None:
+        record = {
+            "kind": "call", "upstream": upstream, "op": op, "key": _digest(key_source),
+            "t": round(started, 4), "duration": round(self.now() - started, 4),
+            "request_bytes": _size(request),
+        }
+        if self.record_requests:
+            record["request"] = request
+        if error is not None:
+            record["error"] = _error_record(error)
+        else:
+            if response is not None: # Streamed responses are kept in `chunks`
+                record["response"] = response
+            record["response_bytes"] = response_bytes if response_bytes is not None else _size(response)
+        if chunks is not None:
+            record["chunks"] = [[round(offset, 4), chunk] for offset, chunk in chunks]
+        self._write(record)
+
+    def entry(self, kind: str, args: Dict[str, Any], started: float, error: Optional[BaseException] = None) -> None:
+        record = {"kind": "entry", "entry": kind, "args": args, "t": round(started, 4), "duration": round(self.now() - started, 4)}
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"[:500]
+        self._write(record)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_trace(path: str) -> List[Dict[str, Any]]:
+    """The call and entry records of a trace, in start order."""
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("kind") == "header":
+                    if record.get("version") != TRACE_VERSION:
+                        raise ValueError(f"{path} is a version {record.get('version')} trace, expected {TRACE_VERSION}")
+                    continue
+                records.append(record)
+        except (EOFError, json.JSONDecodeError): # A trace cut off by a killed process ends mid-line
+            logger.warning("replay - %s is truncated, using the %s complete records", path, len(records))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+class TracePlayer:
+    """
+    Serves recorded responses. A call gets the recorded responses for the same request in order (the last
+    one again once they run out). A request the trace does not have, e.g. because the new build asks
+    differently, gets the responses recorded for the same operation in turn, unless `strict`, where it
+    raises ReplayMiss. Latencies are the recorded ones divided by `speed`; 0 serves at once.
+    """
+
+    def __init__(self, calls: List[Dict[str, Any]], speed: float = 1.0, strict: bool = False):
+        self.speed = speed
+        self.strict = strict
+        self._by_key: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        self._by_op: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for call in calls:
+            self._by_key.setdefault((call["upstream"], call["op"], call["key"]), []).append(call)
+            self._by_op.setdefault((call["upstream"], call["op"]), []).append(call)
+        self._served: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, upstream: str, counter: str) -> None:
+        counters = self.counters.setdefault(upstream, {"served": 0, "misses": 0})
+        counters[counter] += 1
+
+    def lookup(self, upstream: str, op: str, key_source: Any) -> Dict[str, Any]:
+        key = (upstream, op, _digest(key_source))
+        with self._lock:
+            candidates = self._by_key.get(key)
+            if candidates is None:
+                self._count(upstream, "misses")
+                candidates = self._by_op.get((upstream, op))
+                if self.strict or not candidates:
+                    raise ReplayMiss(f"no recorded {upstream} {op} call matches this request")
+                key = (upstream, op)
+                record = candidates[self._served.get(key, 0) % len(candidates)]
+            else:
+                record = candidates[min(self._served.get(key, 0), len(candidates) - 1)]
+            self._served[key] = self._served.get(key, 0) + 1
+            self._count(upstream, "served")
+        return record
+
+    def scaled(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    def wait(self, seconds: float) -> None:
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return copy.deepcopy(self.counters)
+
+
+_recorder: Optional[TraceRecorder] = None
+_player: Optional[TracePlayer] = None
+# What start_replay replaced (clients, rate limits, the private bucket dir), for stop_replay to put back
+_live: Optional[Dict[str, Any]] = None
+
+
+# --- Tavily (search._client)
+
+class _RecordingTavily:
+    def __init__(self, inner, recorder: TraceRecorder):
+        self._inner = inner # None until the first search, so recording does not need TAVILY_API_KEY up front
+        self._recorder = recorder
+        self._lock = threading.Lock()
+
+    def _client(self):
+        from .search import _new_client
+
+        if self._inner is None:
+            with self._lock:
+                if self._inner is None:
+                    self._inner = _new_client()
+        return self._inner
+
+    def search(self, query: str, **kwargs) -> Dict[str, Any]:
+        request = dict(kwargs, query=query)
+        started = self._recorder.now()
+        try:
+            response = self._client().search(query, **kwargs)
+        except Exception as e:
+            self._recorder.call("tavily", "search", request, request, started, error=e)
+            raise
+        self._recorder.call("tavily", "search", request, request, started, response)
+        return response
+
+
+class _ReplayTavily:
+    def __init__(self, player: TracePlayer):
+        self._player = player
+
+    def search(self, query: str, **kwargs) -> Dict[str, Any]:
+        record = self._player.lookup("tavily", "search", dict(kwargs, query=query))
+        self._player.wait(record["duration"])
+        if "error" in record:
+            _raise_recorded(record["error"])
+        return copy.deepcopy(record["response"])
+
+
+# --- Gemini text generation (streaming.model_factory)
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _RecordingModel:
+    def __init__(self, inner, model_name: str, recorder: TraceRecorder):
+        self._inner = inner
+        self._model_name = model_name
+        self._recorder = recorder
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        from .streaming import _chunk_text
+
+        request = {"model": self._model_name, "prompt": str(prompt), "stream": stream}
+        started = self._recorder.now()
+        try:
+            response = self._inner.generate_content(prompt, stream=stream, **kwargs)
+        except Exception as e:
+            self._recorder.call("gemini", self._model_name, request, request, started, error=e)
+            raise
+        if not stream:
+            text = _chunk_text(response)
+            self._recorder.call("gemini", self._model_name, request, request, started, text)
+            return response
+        return self._record_stream(response, request, started)
+
+    def _record_stream(self, response, request: Dict[str, Any], started: float) -> Iterator:
+        from .streaming import _chunk_text
+
+        chunks, error = [], None
+        try:
+            for chunk in response:
+                chunks.append((self._recorder.now() - started, _chunk_text(chunk)))
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._recorder.call("gemini", self._model_name, request, request, started, error=error, chunks=chunks,
+                                response_bytes=sum(len(chunk) for _, chunk in chunks))
+
+
+class _ReplayModel:
+    def __init__(self, model_name: str, player: TracePlayer):
+        self._model_name = model_name
+        self._player = player
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        record = self._player.lookup("gemini", self._model_name, {"model": self._model_name, "prompt": str(prompt), "stream": stream})
+        chunks = record.get("chunks") or [[record["duration"], record.get("response") or ""]]
+        if not stream:
+            self._player.wait(record["duration"])
+            if "error" in record:
+                _raise_recorded(record["error"])
+            return _Chunk("".join(text for _, text in chunks))
+        return self._stream(record, chunks)
+
+    def _stream(self, record: Dict[str, Any], chunks: List[List[Any]]) -> Iterator[_Chunk]:
+        previous = 0.0
+        for offset, text in chunks:
+            self._player.wait(offset - previous)
+            previous = offset
+            yield _Chunk(text)
+        if "error" in record:
+            self._player.wait(record["duration"] - previous)
+            _raise_recorded(record["error"])
+
+
+# --- Google Workspace APIs (google_clients.registry transport)
+
+def _google_op(method: str, uri: str) -> str:
+    return f"{method.upper()} {urlsplit(uri).path}"
+
+
+def _body_text(body: Any) -> Any:
+    if isinstance(body, bytes):
+        return body.decode("utf-8", errors="replace")
+    return body
+
+
+class _RecordingHttp:
+    def __init__(self, inner, recorder: TraceRecorder):
+        self._inner = inner
+        self._recorder = recorder
+        self.credentials = getattr(inner, "credentials", None)
+
+    def request(self, uri: str, method: str = "GET", body: Any = None, headers: Optional[Dict[str, str]] = None, **kwargs):
+        request = {"method": method, "uri": uri, "body": _body_text(body)}
+        op = _google_op(method, uri)
+        started = self._recorder.now()
+        try:
+            resp, content = self._inner.request(uri, method=method, body=body, headers=headers, **kwargs)
+        except Exception as e:
+            self._recorder.call("google", op, request, request, started, error=e)
+            raise
+        response = {"status": resp.status, "headers": {k: v for k, v in dict(resp).items() if k != "status"},
+                    "content": _body_text(content)}
+        self._recorder.call("google", op, request, request, started, response, response_bytes=len(content or b""))
+        return resp, content
+
+    def close(self) -> None:
+        if hasattr(self._inner, "close"):
+            self._inner.close()
+
+
+class _ReplayHttp:
+    def __init__(self, player: TracePlayer):
+        self._player = player
+
+    def request(self, uri: str, method: str = "GET", body: Any = None, headers: Optional[Dict[str, str]] = None, **kwargs):
+        import httplib2
+
+        record = self._player.lookup("google", _google_op(method, uri), {"method": method, "uri": uri, "body": _body_text(body)})
+        self._player.wait(record["duration"])
+        if "error" in record:
+            _raise_recorded(record["error"])
+        response = record["response"]
+        resp = httplib2.Response(dict(response["headers"], status=str(response["status"])))
+        content = response["content"]
+        return resp, content.encode("utf-8") if isinstance(content, str) else content
+
+    def close(self) -> None:
+        pass
+
+
+# --- Agent model calls (google.adk LlmAgent.model)
+
+def _llm_request_key(agent_name: str, llm_request) -> Dict[str, Any]:
+    # Function call and response IDs are random, so only texts, tool names and call arguments are compared
+    turns = []
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                turns.append([content.role, "text", part.text])
+            elif part.function_call:
+                turns.append([content.role, "call", part.function_call.name, part.function_call.args])
+            elif part.function_response:
+                turns.append([content.role, "response", part.function_response.name])
+    return {"agent": agent_name, "contents": turns}
+
+
+@functools.lru_cache(maxsize=None)
+def _llm_classes():
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+
+    class RecordingLlm(BaseLlm):
+        """Passes calls through to the agent's model and records each response with its arrival time."""
+
+        inner: BaseLlm
+        agent_name: str
+
+        @property
+        def capabilities(self):
+            return self.inner.capabilities
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            recorder = _recorder
+            if recorder is None:
+                async for response in self.inner.generate_content_async(llm_request, stream):
+                    yield response
+                return
+            key = _llm_request_key(self.agent_name, llm_request)
+            started, chunks, error = recorder.now(), [], None
+            try:
+                async for response in self.inner.generate_content_async(llm_request, stream):
+                    chunks.append((recorder.now() - started, response.model_dump(mode="json", exclude_none=True)))
+                    yield response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                recorder.call("model", self.agent_name, key, key, started, error=error, chunks=chunks,
+                              response_bytes=sum(_size(chunk) for _, chunk in chunks))
+
+        def connect(self, llm_request):
+            return self.inner.connect(llm_request)
+
+    class ReplayLlm(BaseLlm):
+        """Answers an agent's model calls with the responses recorded for that agent."""
+
+        agent_name: str
+
+        @property
+        def capabilities(self):
+            from google.adk.models.base_llm import LlmCapabilities
+
+            return LlmCapabilities(output_schema_and_tools=True)
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            player = _player
+            if player is None:
+                raise RuntimeError(f"{self.agent_name} was set up for a replay, but no trace is being replayed")
+            record = player.lookup("model", self.agent_name, _llm_request_key(self.agent_name, llm_request))
+            previous = 0.0
+            for offset, response in record.get("chunks") or []:
+                await asyncio.sleep(player.scaled(offset - previous))
+                previous = offset
+                yield LlmResponse.model_validate(response)
+            if "error" in record:
+                await asyncio.sleep(player.scaled(record["duration"] - previous))
+                _raise_recorded(record["error"])
+
+    return RecordingLlm, ReplayLlm
+
+
+def attach_agent(root_agent) -> None:
+    """
+    Records, or replays, the model calls of every agent in `root_agent`'s tree while a trace is being
+    recorded or replayed; does nothing otherwise. The agents are changed in place.
+    """
+    if _recorder is None and _player is None:
+        return
+    from .server import llm_agents
+
+    RecordingLlm, ReplayLlm = _llm_classes()
+    for agent in llm_agents(root_agent):
+        if _player is not None:
+            if not isinstance(agent.model, ReplayLlm):
+                agent.model = ReplayLlm(model=agent.model if isinstance(agent.model, str) and agent.model else "replay",
+                                        agent_name=agent.name)
+        elif not isinstance(agent.model, RecordingLlm):
+            agent.model = RecordingLlm(model=agent.canonical_model.model, inner=agent.canonical_model, agent_name=agent.name)
+
+
+# --- Entry calls
+
+@contextlib.contextmanager
+def entry(kind: str, **args) -> Iterator[None]:
+    """Records one entry call (a trip request, an agent turn) around its body while a trace is being recorded."""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    started = recorder.now()
+    try:
+        yield
+    except GeneratorExit: # A streaming caller that stopped reading
+        recorder.entry(kind, args, started)
+        raise
+    except BaseException as e:
+        recorder.entry(kind, args, started, e)
+        raise
+    recorder.entry(kind, args, started)
+
+
+# --- Installing
+
+def start_recording(path: str, record_requests: bool = REPLAY_RECORD_REQUESTS) -> TraceRecorder:
+    """Starts writing every outbound call made from this process, and the entry calls, to the trace at `path`."""
+    global _recorder
+    from . import google_clients, search, streaming
+
+    if _recorder is not None or _player is not None:
+        raise RuntimeError("a trace is already being recorded or replayed in this process")
+    recorder = TraceRecorder(path, record_requests)
+    search._client = _RecordingTavily(search._client, recorder)
+    default_model = streaming.model_factory
+    streaming.model_factory = lambda model_name: _RecordingModel(default_model(model_name), model_name, recorder)
+    google_clients.registry.wrap_http(lambda http: _RecordingHttp(http, recorder))
+    _recorder = recorder
+    logger.info("replay - recording to %s", path)
+    return recorder
+
+
+def stop_recording() -> None:
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        logger.info("replay - wrote %s records to %s", _recorder.records, _recorder.path)
+        _recorder = None
+
+
+def start_replay(calls: List[Dict[str, Any]], speed: float = 1.0, strict: bool = False) -> TracePlayer:
+    """
+    Serves every outbound call of this process from `calls` (see TracePlayer) instead of the live APIs,
+    until stop_replay.
+    """
+    global _player, _live
+    from google.auth.credentials import AnonymousCredentials
+    from . import google_clients, resilience, search, streaming
+
+    if _recorder is not None or _player is not None:
+        raise RuntimeError("a trace is already being recorded or replayed in this process")
+    player = TracePlayer(calls, speed, strict)
+    _live = {
+        "search_client": search._client, "model_factory": streaming.model_factory, "registry": google_clients.registry,
+        "rate_limits": resilience.RATE_LIMITS, "rate_limit_dir": resilience.RATE_LIMIT_DIR,
+        "bucket_dir": tempfile.mkdtemp(prefix="replay-buckets-"),
+    }
+    search._client = _ReplayTavily(player)
+    streaming.model_factory = lambda model_name: _ReplayModel(model_name, player)
+    google_clients.registry = google_clients.GoogleClientRegistry(
+        credentials_factory=AnonymousCredentials, http_factory=lambda credentials: _ReplayHttp(player))
+    # Replayed calls never reach the APIs: the production quotas would time the limiter instead of the
+    # build, and the shared bucket files would spend the budget of live workers on this machine. Replayed
+    # 429s still block, but only a private bucket, and circuit breakers start closed.
+    resilience.RATE_LIMITS = ""
+    resilience.RATE_LIMIT_DIR = _live["bucket_dir"]
+    resilience.reset_upstreams()
+    _player = player
+    return player
+
+
+def stop_replay() -> None:
+    """Puts back the clients and rate limits start_replay replaced; outbound calls go to the live APIs again."""
+    global _player, _live
+    from . import google_clients, resilience, search, streaming
+
+    _player = None
+    if _live is None:
+        return
+    live, _live = _live, None
+    search._client = live["search_client"]
+    streaming.model_factory = live["model_factory"]
+    google_clients.registry = live["registry"]
+    resilience.RATE_LIMITS = live["rate_limits"]
+    resilience.RATE_LIMIT_DIR = live["rate_limit_dir"]
+    resilience.reset_upstreams()
+    shutil.rmtree(live["bucket_dir"], ignore_errors=True)
+
+
+# --- Replay driver
+
+def _percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 1)
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(latencies)
+    return {"p50_ms": _percentile(ordered, 0.5), "p95_ms": _percentile(ordered, 0.95),
+            "p99_ms": _percentile(ordered, 0.99), "max_ms": round(ordered[-1], 1) if ordered else None}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_itinerary(args: Dict[str, Any]) -> Any:
+    from .test import get_trip_itinerary
+
+    return get_trip_itinerary(**args)
+
+
+def _run_smart_trip(args: Dict[str, Any]) -> Any:
+    from .test2 import plan_smart_trip
+
+    return plan_smart_trip(**args)
+
+
+# Entry kind -> function re-issuing it; "turn" entries go through server.AgentServer.run_turn
+ENTRY_RUNNERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "itinerary": _run_itinerary,
+    "smart_trip": _run_smart_trip,
+}
+
+
+async def replay(path: str, speed: float = 1.0, concurrency: int = 8, strict: bool = False,
+                 fresh_caches: bool = True, kinds: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Re-issues the entry calls recorded in the trace at `path` against this build, with the outbound calls
+    served from the trace. With `speed` > 0 entries start at their recorded offsets divided by `speed`;
+    with 0 they run back to back, `concurrency` at a time. Returns latency per entry kind next to the
+    recorded latencies, the peak memory of the process, the replayer's served/miss counters and the
+    retry and throttling counters of the replayed calls. Everything the replay replaced is put back after it.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from . import drive_files, export_jobs, itinerary_cache, search
+    from .resilience import resilience_stats
+
+    records = read_trace(path)
+    entries = [r for r in records if r["kind"] == "entry" and (not kinds or r["entry"] in kinds)]
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    # The stores replaced below live in a directory removed at the end, so the process's own come back then
+    saved = (search._cache, itinerary_cache._cache, export_jobs._jobs, drive_files._files)
+    player = start_replay([r for r in records if r["kind"] == "call"], speed, strict)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            if fresh_caches: # Both runs start cold, so cache state left by earlier runs does not skew the comparison
+                search._cache = search.SearchCache(os.path.join(cache_dir, "search_cache.sqlite3"))
+                itinerary_cache._cache = itinerary_cache.ItineraryCache(os.path.join(cache_dir, "itinerary_cache.sqlite3"))
+            # Exports submitted by replayed turns must not land in the real job store, nor their files in the registry
+            export_jobs._jobs = export_jobs.ExportJobs(os.path.join(cache_dir, "export_jobs.sqlite3"))
+            drive_files._files = drive_files.CreatedFiles(os.path.join(cache_dir, "drive_files.sqlite3"))
+            server = None
+            if any(e["entry"] == "turn" for e in entries):
+                from .agent2 import root_agent
+                from .server import AgentServer
+
+                server = AgentServer(root_agent)
+            loop = asyncio.get_running_loop()
+            executor = ThreadPoolExecutor(max_workers=REPLAY_MAX_THREADS, thread_name_prefix="replay")
+            slots = asyncio.Semaphore(concurrency if speed <= 0 else len(entries) or 1)
+            begin = time.monotonic()
+
+            async def run(record: Dict[str, Any]) -> None:
+                kind = record["entry"]
+                if speed > 0:
+                    await asyncio.sleep(max(record["t"] / speed - (time.monotonic() - begin), 0))
+                async with slots:
+                    start = time.monotonic()
+                    try:
+                        if kind == "turn":
+                            args = record["args"]
+                            await server.run_turn(args["user_id"], args["session_id"], args["message"])
+                        elif kind in ENTRY_RUNNERS:
+                            await loop.run_in_executor(executor, ENTRY_RUNNERS[kind], record["args"])
+                        else:
+                            raise ValueError(f"unknown entry kind {kind!r}")
+                    except Exception as e:
+                        errors[kind] = errors.get(kind, 0) + 1
+                        logger.warning("replay - %s entry failed: %s", kind, e)
+                    latencies.setdefault(kind, []).append((time.monotonic() - start) * 1000)
+
+            await asyncio.gather(*(run(record) for record in entries))
+            wall = time.monotonic() - begin
+            executor.shutdown(wait=True)
+            if server is not None:
+                await server.drain(0)
+
+        recorded: Dict[str, List[float]] = {}
+        for record in entries:
+            recorded.setdefault(record["entry"], []).append(record["duration"] * 1000)
+        return {
+            "trace": path,
+            "speed": speed,
+            "wall_seconds": round(wall, 3),
+            "recorded_seconds": round(max((e["t"] + e["duration"] for e in entries), default=0.0), 3),
+            "peak_rss_mb": _peak_rss_mb(),
+            "entries": {
+                kind: dict(_latency_summary(values), count=len(values), errors=errors.get(kind, 0),
+                           recorded=_latency_summary(recorded.get(kind, [])))
+                for kind, values in sorted(latencies.items())
+            },
+            "upstreams": player.stats(),
+            "resilience": resilience_stats(),
+        }
+    finally:
+        if export_jobs._jobs is not saved[2]:
+            export_jobs._jobs.close()
+        search._cache, itinerary_cache._cache, export_jobs._jobs, drive_files._files = saved
+        stop_replay()
+
+
+def trace_info(path: str) -> Dict[str, Any]:
+    """Call and byte counts per upstream and entry counts per kind in a trace."""
+    upstreams: Dict[str, Dict[str, float]] = {}
+    entries: Dict[str, int] = {}
+    for record in read_trace(path):
+        if record["kind"] == "entry":
+            entries[record["entry"]] = entries.get(record["entry"], 0) + 1
+            continue
+        counters = upstreams.setdefault(record["upstream"], dict.fromkeys(("calls", "errors", "request_bytes", "response_bytes", "seconds"), 0))
+        counters["calls"] += 1
+        counters["errors"] += "error" in record
+        counters["request_bytes"] += record.get("request_bytes", 0)
+        counters["response_bytes"] += record.get("response_bytes", 0)
+        counters["seconds"] = round(counters["seconds"] + record["duration"], 3)
+    return {"file_bytes": os.path.getsize(path), "entries": entries, "upstreams": upstreams}
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"Replayed {report['trace']} at speed {report['speed']:g}: {report['wall_seconds']:.2f}s "
+          f"(recorded {report['recorded_seconds']:.2f}s), peak RSS {report['peak_rss_mb']} MB")
+    for kind, summary in report["entries"].items():
+        recorded = summary["recorded"]
+        print(f"  {kind:<11} n={summary['count']:<5} errors={summary['errors']:<4} p50={summary['p50_ms']} ms "
+              f"p95={summary['p95_ms']} ms p99={summary['p99_ms']} ms  (recorded p50={recorded['p50_ms']} p95={recorded['p95_ms']})")
+    for upstream, counters in sorted(report["upstreams"].items()):
+        print(f"  {upstream:<11} served={counters['served']} misses={counters['misses']}")
+
+
+def compare_reports(base: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Lines comparing latency per entry kind and peak memory of two replay reports."""
+
+    def delta(old: Optional[float], value: Optional[float], unit: str) -> str:
+        if old is None or value is None:
+            return f"{old} -> {value}"
+        change = f" ({(value - old) / old * 100:+.1f}%)" if old else ""
+        return f"{old:g} -> {value:g} {unit}{change}"
+
+    lines = []
+    for kind in sorted(set(base["entries"]) | set(new["entries"])):
+        old, value = base["entries"].get(kind, {}), new["entries"].get(kind, {})
+        lines.append(f"{kind:<11} p50 {delta(old.get('p50_ms'), value.get('p50_ms'), 'ms')}  "
+                     f"p95 {delta(old.get('p95_ms'), value.get('p95_ms'), 'ms')}  "
+                     f"errors {old.get('errors')} -> {value.get('errors')}")
+    lines.append(f"peak RSS   {delta(base.get('peak_rss_mb'), new.get('peak_rss_mb'), 'MB')}")
+    return lines
+
+
+def main(argv: List[str] = None) -> int:
+    from .tracing import configure_logging
+
+    parser = argparse.ArgumentParser(description="Record outbound calls to a trace, or replay a trace against this build.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run a module (e.g. my_agent.server) while recording its calls")
+    record.add_argument("trace")
+    record.add_argument("module")
+    record.add_argument("module_args", nargs=argparse.REMAINDER)
+    record.add_argument("--no-requests", action="store_true", help="keep only request keys and sizes, not the payloads")
+    run = commands.add_parser("run", help="replay the entry calls of a trace with its recorded responses")
+    run.add_argument("trace")
+    run.add_argument("--speed", type=float, default=1.0, help="1 keeps the recorded timing, N runs N times faster, 0 back to back")
+    run.add_argument("--concurrency", type=int, default=8, help="entries in flight at once when --speed is 0")
+    run.add_argument("--strict", action="store_true", help="fail calls the trace has no recorded response for")
+    run.add_argument("--keep-caches", action="store_true", help="use the configured search and itinerary caches")
+    run.add_argument("--kind", action="append", help="only replay entries of this kind (repeatable)")
+    run.add_argument("--report", help="write the report as JSON, for compare")
+    compare = commands.add_parser("compare", help="compare two replay reports")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    info = commands.add_parser("info", help="summarize a trace")
+    info.add_argument("trace")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.command == "record":
+        import runpy
+
+        module_args = args.module_args[1:] if args.module_args[:1] == ["--"] else args.module_args
+        start_recording(args.trace, record_requests=not args.no_requests)
+        sys.argv = [args.module] + module_args
+        try:
+            runpy.run_module(args.module, run_name="__main__", alter_sys=True)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 0
+        finally:
+            stop_recording()
+        return 0
+    if args.command == "run":
+        report = asyncio.run(replay(args.trace, args.speed, args.concurrency, args.strict, not args.keep_caches, args.kind))
+        _print_report(report)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return 1 if any(summary["errors"] for summary in report["entries"].values()) else 0
+    if args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print("\n".join(compare_reports(base, new)))
+        return 0
+    print(json.dumps(trace_info(args.trace), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
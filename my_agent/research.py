@@ -0,0 +1,184 @@
+# Multi-query research stage that grounds itinerary prompts in several focused searches
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from .search import cache_key, get_search_cache, search_async
+
+
+logger = logging.getLogger(__name__)
+
+
+RESEARCH_MAX_CONCURRENCY = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "5"))
+RESEARCH_QUERY_TIMEOUT_SECONDS = float(os.getenv("RESEARCH_QUERY_TIMEOUT_SECONDS", "10"))
+
+# Threads for blocking searches; a timed-out search keeps its thread until Tavily answers
+RESEARCH_MAX_THREADS = int(os.getenv("RESEARCH_MAX_THREADS", "16"))
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """A thread pool that counts the calls submitted to it and not finished yet, timed-out ones included."""
+
+    def __init__(self, max_workers: int, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._count_lock:
+            self.in_flight += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future) -> None:
+        with self._count_lock:
+            self.in_flight -= 1
+
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_workers
+
+
+# Blocking searches run here rather than in the loop's default executor, which asyncio.run()
+# would wait on at exit, so a timed-out query cannot hold up the caller.
+_executor = _CountingExecutor(RESEARCH_MAX_THREADS, thread_name_prefix="research")
+
+
+def itinerary_queries(city: str, interests: List[str], budget: int, days: int) -> List[str]:
+    """Focused queries for planning a trip to a known city."""
+    interests_text = ", ".join(interests)
+    return [
+        f"top attractions and things to do in {city} for {interests_text}",
+        f"best local food and restaurants in {city}",
+        f"getting around {city} public transport and transfer tips",
+        f"{city} travel costs per day for a {days}-day trip on a {budget} USD budget",
+        f"{city} weather and best time to visit",
+    ]
+
+
+def destination_queries(home_city: str, interests: List[str], budget: int, days: int) -> List[str]:
+    """Focused queries for choosing a destination reachable from the traveler's home city."""
+    interests_text = ", ".join(interests)
+    return [
+        f"best destinations near {home_city} for {interests_text}",
+        f"destinations near {home_city} known for great local food",
+        f"transport options and travel costs from {home_city} to nearby destinations",
+        f"{days}-day trip from {home_city} on a {budget} USD budget costs",
+        f"weather and best season for trips near {home_city}",
+    ]
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+def merge_results(responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flattens several search responses, keeping the first result seen for each URL."""
+    merged = []
+    seen = set()
+    for response in responses:
+        for result in response.get("results", []):
+            url = _normalize_url(result.get("url", ""))
+            if url in seen:
+                continue
+            seen.add(url)
+            merged.append(result)
+    return merged
+
+
+async def search_all_async(
+    queries: List[str],
+    max_results: int = 5,
+    max_concurrency: int = RESEARCH_MAX_CONCURRENCY,
+    timeout: float = RESEARCH_QUERY_TIMEOUT_SECONDS,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Runs `queries` concurrently (at most `max_concurrency` at a time, each bounded by `timeout` seconds)
+    and returns one response per query, in order, with None for queries that failed or timed out.
+    A slow or failing query only costs its own results; it never blocks the others past its timeout.
+    Timed-out searches keep their threads until Tavily answers, so while all RESEARCH_MAX_THREADS threads
+    are taken an uncached query is skipped (returns None) rather than queued behind them.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(query: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            if _executor.saturated():
+                # Cached answers need no thread
+                cached = get_search_cache().get(cache_key(query, max_results, "general", False))
+                if cached is not None:
+                    return cached
+                logger.warning("research - Skipped, all %s search threads are busy: %s", _executor.max_workers, query)
+                return None
+            try:
+                # A timed-out call keeps running in its thread and still warms the cache
+                return await asyncio.wait_for(search_async(query, max_results=max_results, executor=_executor), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("research - Search timed out after %ss: %s", timeout, query)
+            except Exception as e:
+                logger.warning("research - Search failed for '%s': %s", query, e)
+            return None
+
+    return list(await asyncio.gather(*(run_one(query) for query in queries)))
+
+
+async def research_async(
+    queries: List[str],
+    max_results: int = 5,
+    max_concurrency: int = RESEARCH_MAX_CONCURRENCY,
+    timeout: float = RESEARCH_QUERY_TIMEOUT_SECONDS,
+) -> Dict[str, Any]:
+    """
+    Runs `queries` concurrently (see search_all_async()) and returns a Tavily-shaped {"results": [...]}
+    dict deduplicated by URL, plus the queries that failed.
+    """
+    responses = await search_all_async(queries, max_results=max_results, max_concurrency=max_concurrency, timeout=timeout)
+    return {
+        "results": merge_results([response for response in responses if response]),
+        "queries": queries,
+        "failed_queries": [query for query, response in zip(queries, responses) if response is None],
+    }
+
+
+def run_blocking(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Runs `coro` to completion; safe to call from code that already runs an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Called from inside a running loop (e.g. an ADK tool): run it on its own loop in a helper thread
+    outcome: Dict[str, Any] = {}
+
+    def runner():
+        try:
+            outcome["value"] = asyncio.run(coro)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=runner, name="research")
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+def research(
+    queries: List[str],
+    max_results: int = 5,
+    max_concurrency: int = RESEARCH_MAX_CONCURRENCY,
+    timeout: float = RESEARCH_QUERY_TIMEOUT_SECONDS,
+) -> Dict[str, Any]:
+    """Blocking entry point for research_async(); safe to call from code that already runs an event loop."""
+    return run_blocking(research_async(queries, max_results=max_results, max_concurrency=max_concurrency, timeout=timeout))
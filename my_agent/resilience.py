@@ -0,0 +1,427 @@
+# Rate limiting, retries with backoff and circuit breaking for the upstream APIs (Tavily, Gemini, Google Workspace)
+import email.utils
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .storage import data_path
+from .tracing import current_span
+
+try:
+    import fcntl
+except ImportError: # Windows: buckets are still enforced, but only within one process
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# upstream=tokens per second:burst. A rate of 0 disables limiting for that upstream.
+# Defaults sit just under the public per-user quotas (Tavily 100/min, Sheets and Docs writes 60/min).
+RATE_LIMITS = os.getenv("RATE_LIMITS", "tavily=1.6:10,gemini=5:10,sheets=1:10,docs=1:10,drive=10:20")
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR") # Bucket state files; defaults to the data dir
+# Longest a call waits for a token before failing with UpstreamUnavailable
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "60"))
+# upstream=most calls in flight at once in this process; unlisted upstreams are not limited.
+# A call waits for a free slot up to RATE_LIMIT_MAX_WAIT_SECONDS before failing with UpstreamUnavailable.
+UPSTREAM_CONCURRENCY = os.getenv("UPSTREAM_CONCURRENCY", "tavily=8,gemini=16,sheets=4,docs=4,drive=8")
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "0.5"))
+# Longest single backoff; a Retry-After beyond this is not waited out, the call fails and the circuit opens
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+# Statuses meaning the request was not processed, so even non-idempotent calls (creates, inserts) can be retried
+REJECTED_STATUSES = frozenset({429, 503})
+
+# Google API methodId prefix -> upstream name
+_GOOGLE_UPSTREAMS = {"sheets": "sheets", "docs": "docs", "drive": "drive"}
+
+_sleep = time.sleep
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open, or whose rate limit cannot be met in time."""
+
+    def __init__(self, upstream: str, message: str, retry_in: float = 0.0):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst or rate or 1))
+    return limits
+
+
+def parse_concurrency_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+def concurrency_limit(name: str) -> int:
+    """Most calls to `name` allowed in flight at once, or 0 when it is not limited."""
+    return max(parse_concurrency_limits(UPSTREAM_CONCURRENCY).get(name, 0), 0)
+
+
+class TokenBucket:
+    """
+    Token bucket whose state (tokens, last refill, blocked-until) lives in a small file guarded by flock,
+    so every worker process on the machine draws from the same budget. Threads of one process additionally
+    serialize on a lock, because flock does not exclude holders of the same file descriptor.
+    """
+
+    _FORMAT = struct.Struct("<ddd")
+
+    def __init__(self, name: str, rate: float, burst: float, path: Optional[str] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._fd = None
+        self._state = (burst, time.time(), 0.0)
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _locked(self, update: Callable[[float, float, float, float], Tuple[Tuple[float, float, float], Any]]) -> Any:
+        # Runs update(tokens, updated_at, blocked_until, now) under both locks and persists the new state
+        with self._lock:
+            if self._fd is not None and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                state = self._state
+                if self._fd is not None:
+                    raw = os.pread(self._fd, self._FORMAT.size, 0)
+                    if len(raw) == self._FORMAT.size:
+                        state = self._FORMAT.unpack(raw)
+                now = time.time()
+                tokens, updated_at, blocked_until = state
+                tokens = min(self.burst, tokens + max(now - updated_at, 0) * self.rate)
+                state, result = update(tokens, now, blocked_until, now)
+                self._state = state
+                if self._fd is not None:
+                    os.pwrite(self._fd, self._FORMAT.pack(*state), 0)
+                return result
+            finally:
+                if self._fd is not None and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _take(self, tokens: float, updated_at: float, blocked_until: float, now: float, cost: float = 1.0):
+        if blocked_until > now:
+            return (tokens, updated_at, blocked_until), blocked_until - now
+        # A cost above the burst is let through once the bucket is full and leaves it in debt,
+        # so the calls after it wait until the whole cost has been refilled
+        needed = min(cost, self.burst)
+        if tokens >= needed:
+            return (tokens - cost, updated_at, blocked_until), 0.0
+        return (tokens, updated_at, blocked_until), (needed - tokens) / self.rate
+
+    def acquire(self, max_wait: Optional[float] = None, cost: float = 1.0) -> float:
+        """
+        Blocks until `cost` tokens are available (e.g. one per request of a batch) and returns the seconds
+        waited; raises UpstreamUnavailable past `max_wait`.
+        """
+        if self.rate <= 0:
+            return 0.0
+        max_wait = RATE_LIMIT_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        waited = 0.0
+        while True:
+            wait = self._locked(lambda *state: self._take(*state, cost=cost))
+            if wait <= 0:
+                return waited
+            if waited + wait > max_wait:
+                raise UpstreamUnavailable(self.name, f"{self.name} rate limit: no request slot within {max_wait:.0f}s", wait)
+            _sleep(wait)
+            waited += wait
+
+    def block(self, seconds: float) -> None:
+        """Holds back every process using this bucket for `seconds` (after a 429 with Retry-After)."""
+        def update(tokens, updated_at, blocked_until, now):
+            return (0.0, updated_at, max(blocked_until, now + seconds)), None
+
+        self._locked(update)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive transient failures; open calls fail fast until
+    `reset_seconds` have passed, then one half-open trial call decides whether the circuit closes again.
+    State is per process; the shared token bucket already spreads a Retry-After to the other workers.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> Tuple[bool, float]:
+        """Returns (call allowed, seconds until the next trial when not)."""
+        with self._lock:
+            if self.state == "closed":
+                return True, 0.0
+            now = time.time()
+            if self.state == "open" and now >= self.opened_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True, 0.0
+            return False, max(self.opened_until - now, 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("resilience - %s circuit closed", self.name)
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self, open_for: Optional[float] = None) -> None:
+        """Counts a transient failure; `open_for` (a long Retry-After) opens the circuit immediately for that long."""
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or open_for is not None or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("resilience - %s circuit opened after %s failures", self.name, self.failures)
+                self.state = "open"
+                self.opened_until = time.time() + max(self.reset_seconds, open_for or 0.0)
+
+    def release(self) -> None:
+        """Ends a half-open trial that failed for a non-transient reason, so the next call can try again."""
+        with self._lock:
+            self._trial_running = False
+
+
+@dataclass
+class Upstream:
+    name: str
+    bucket: TokenBucket
+    breaker: CircuitBreaker
+    slots: Optional[threading.BoundedSemaphore] = None # In-flight limit; None when unlimited
+    counters: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(
+        ("calls", "retries", "failures", "short_circuits", "fallbacks", "throttled_seconds", "queued_seconds"), 0))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, counter: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def enter(self) -> float:
+        """Takes an in-flight slot, waiting up to RATE_LIMIT_MAX_WAIT_SECONDS; returns the seconds waited."""
+        if self.slots is None:
+            return 0.0
+        start = time.monotonic()
+        if not self.slots.acquire(timeout=RATE_LIMIT_MAX_WAIT_SECONDS):
+            raise UpstreamUnavailable(self.name, f"{self.name} has too many calls in flight", RATE_LIMIT_MAX_WAIT_SECONDS)
+        return time.monotonic() - start
+
+    def leave(self) -> None:
+        if self.slots is not None:
+            self.slots.release()
+
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str) -> Upstream:
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                rate, burst = _parse_rate_limits(RATE_LIMITS).get(name, (0.0, 1.0))
+                path = os.path.join(RATE_LIMIT_DIR, f"{name}.bucket") if RATE_LIMIT_DIR else data_path(f"ratelimit-{name}.bucket")
+                limit = concurrency_limit(name)
+                upstream = _upstreams[name] = Upstream(name, TokenBucket(name, rate, burst, path), CircuitBreaker(name),
+                                                       threading.BoundedSemaphore(limit) if limit else None)
+    return upstream
+
+
+def configure_upstream(name: str, rate: Optional[float] = None, burst: Optional[float] = None,
+                       failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None) -> Upstream:
+    """Overrides the limits of one upstream in this process (e.g. for benchmarks against local fakes)."""
+    upstream = get_upstream(name)
+    if rate is not None:
+        upstream.bucket.rate = rate
+    if burst is not None:
+        upstream.bucket.burst = burst
+    if failure_threshold is not None:
+        upstream.breaker.failure_threshold = failure_threshold
+    if reset_seconds is not None:
+        upstream.breaker.reset_seconds = reset_seconds
+    return upstream
+
+
+def reset_upstreams() -> None:
+    """Drops every upstream of this process; the next calls get fresh buckets and closed circuit breakers."""
+    with _upstreams_lock:
+        _upstreams.clear()
+
+
+def google_upstream(method_id: Optional[str]) -> str:
+    """Upstream name for a googleapiclient request, from its methodId (e.g. "sheets.spreadsheets.batchUpdate")."""
+    return _GOOGLE_UPSTREAMS.get((method_id or "").split(".", 1)[0], "google")
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as delta-seconds or as an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(str(value)).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(error: BaseException, idempotent: bool = True) -> Tuple[bool, Optional[float]]:
+    """
+    Returns (retryable, Retry-After seconds) for an exception raised by one of the client libraries:
+    googleapiclient HttpError (.resp), requests HTTPError (.response), google.api_core errors (.code)
+    and Tavily's UsageLimitExceededError (its 429). Unless `idempotent`, only errors guaranteeing the
+    request was not processed are retryable, so a create or insert is never applied twice.
+    """
+    status, headers = None, None
+    resp = getattr(error, "resp", None) # googleapiclient.errors.HttpError
+    if resp is not None and hasattr(resp, "status"):
+        status, headers = resp.status, resp
+    response = getattr(error, "response", None) # requests.HTTPError, google.api_core exceptions
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+        headers = getattr(response, "headers", None)
+    if status is None:
+        code = getattr(error, "code", None)
+        status = code if isinstance(code, int) else getattr(error, "status_code", None)
+    if status is None and type(error).__name__ == "UsageLimitExceededError":
+        status = 429
+    retry_after = None
+    if headers is not None:
+        retry_after = parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+    if status is not None:
+        status = int(status)
+        # Drive and Sheets report per-user quota exhaustion as 403 with a rateLimitExceeded reason
+        if status == 403 and b"ratelimitexceeded" in (getattr(error, "content", None) or b"").lower():
+            status = 429
+        return status in (RETRYABLE_STATUSES if idempotent else REJECTED_STATUSES), retry_after
+    if not idempotent:
+        return False, retry_after
+    # Connection resets and timeouts from any of the transports
+    transient = isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in ("Timeout", "ConnectTimeout", "ReadTimeout")
+    return transient, retry_after
+
+
+def backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff for retry `attempt` (0-based), never shorter than Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+
+def call(upstream_name: str, func: Callable[..., Any], *args, fallback: Optional[Callable[[], Any]] = None,
+         max_attempts: Optional[int] = None, idempotent: bool = True, cost: float = 1, **kwargs) -> Any:
+    """
+    Calls func(*args, **kwargs) through the upstream's rate limiter and in-flight limit, retrying transient errors (429, 5xx,
+    timeouts; see classify for non-idempotent calls) with jittered exponential backoff that honors
+    Retry-After. While the upstream's circuit is
+    open, or once retries are exhausted, `fallback()` is served instead if given and not None (e.g. a stale
+    cache entry); otherwise UpstreamUnavailable or the last error is raised. Other errors propagate at once.
+    Each attempt takes `cost` rate-limit tokens, e.g. one per request of a batch.
+    """
+    upstream = get_upstream(upstream_name)
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    upstream.count("calls")
+
+    def serve_fallback(reason: BaseException):
+        value = fallback() if fallback is not None else None
+        if value is None:
+            raise reason
+        upstream.count("fallbacks")
+        logger.warning("resilience - %s unavailable (%s), serving fallback", upstream_name, reason)
+        _annotate(fallback=True)
+        return value
+
+    allowed, retry_in = upstream.breaker.allow()
+    if not allowed:
+        upstream.count("short_circuits")
+        return serve_fallback(UpstreamUnavailable(upstream_name, f"{upstream_name} circuit is open, retry in {retry_in:.1f}s", retry_in))
+
+    for attempt in range(max_attempts):
+        try:
+            upstream.count("throttled_seconds", upstream.bucket.acquire(cost=cost))
+            upstream.count("queued_seconds", upstream.enter())
+        except UpstreamUnavailable as e:
+            upstream.breaker.release()
+            return serve_fallback(e)
+        try:
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                upstream.leave() # The slot is only held while the call runs, not during the backoff below
+        except Exception as e:
+            transient, retry_after = classify(e, idempotent)
+            if not transient:
+                upstream.breaker.release()
+                raise
+            if retry_after:
+                upstream.bucket.block(min(retry_after, RETRY_MAX_SECONDS))
+            too_long = retry_after is not None and retry_after > RETRY_MAX_SECONDS
+            if attempt + 1 >= max_attempts or too_long or upstream.breaker.state == "half_open":
+                upstream.count("failures")
+                upstream.breaker.record_failure(retry_after if too_long else None)
+                _annotate(retries=attempt, failed=True)
+                return serve_fallback(e)
+            delay = backoff(attempt, retry_after)
+            upstream.count("retries")
+            logger.warning("resilience - %s attempt %s failed (%s), retrying in %.2fs", upstream_name, attempt + 1, e, delay)
+            _sleep(delay)
+            continue
+        upstream.breaker.record_success()
+        if attempt:
+            _annotate(retries=attempt)
+        return result
+
+
+def _annotate(**attrs) -> None:
+    span = current_span()
+    if span is not None:
+        span.set(**attrs)
+
+
+def resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-upstream retry, failure and throttling counters plus circuit state for this process."""
+    with _upstreams_lock:
+        upstreams = list(_upstreams.values())
+    stats = {}
+    for upstream in upstreams:
+        with upstream._lock:
+            counters = dict(upstream.counters)
+        stats[upstream.name] = dict(counters, throttled_seconds=round(counters["throttled_seconds"], 3),
+                                    queued_seconds=round(counters["queued_seconds"], 3), circuit=upstream.breaker.state)
+    return stats
@@ -0,0 +1,260 @@
+# Shared Tavily search with a two-tier (memory + SQLite) result cache
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Dict, Literal, Optional, Tuple
+
+from . import resilience
+from .singleflight import SingleFlight
+from .storage import connect, data_path
+from .tracing import span
+
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH") # Defaults to search_cache.sqlite3 in the data dir
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "256"))
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, so "Paris  Museums" and "paris museums" share an entry."""
+    return " ".join(query.casefold().split())
+
+
+def cache_key(query: str, max_results: int, topic: str, include_raw_content: bool) -> str:
+    raw = json.dumps([normalize_query(query), max_results, topic, include_raw_content])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """
+    In-memory LRU in front of an on-disk SQLite store.
+    Disk entries expire after `ttl_seconds`; once the store grows past `max_bytes`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int = SEARCH_CACHE_TTL_SECONDS,
+        max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+        memory_entries: int = SEARCH_CACHE_MEMORY_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict() # key -> (expires_at, results)
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS search_results_accessed ON search_results (accessed_at)")
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_results").fetchone()[0]
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM search_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl_seconds <= now:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE search_results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            results = json.loads(row[0])
+            self._remember(key, row[1] + self.ttl_seconds, results)
+            self.disk_hits += 1
+            return results
+
+    def get_stale(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns an entry even past its TTL, as long as it has not been evicted yet; None otherwise."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM search_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.stale_hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, results: Dict[str, Any]) -> None:
+        now = time.time()
+        value = json.dumps(results)
+        with self._lock:
+            self._remember(key, now + self.ttl_seconds, results)
+            # A refresh replaces the row, so only the difference in size is added
+            replaced = self._conn.execute("SELECT size FROM search_results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._conn.commit()
+            self._disk_bytes += len(value) - (replaced[0] if replaced else 0)
+            if self._disk_bytes > self.max_bytes:
+                self._evict(now)
+
+    def _remember(self, key: str, expires_at: float, results: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._memory[key] = (expires_at, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        # Caller holds self._lock. Drops expired rows, then least recently used ones until 90% of max_bytes.
+        self.evictions += self._conn.execute(
+            "DELETE FROM search_results WHERE created_at <= ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_results").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        if self._disk_bytes > target:
+            freed = 0
+            doomed = []
+            for key, size in self._conn.execute("SELECT key, size FROM search_results ORDER BY accessed_at"):
+                if self._disk_bytes - freed <= target:
+                    break
+                doomed.append((key,))
+                freed += size
+            self._conn.executemany("DELETE FROM search_results WHERE key = ?", doomed)
+            self._disk_bytes -= freed
+            self.evictions += len(doomed)
+        self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_client = None
+_cache: Optional[SearchCache] = None
+search_flight = SingleFlight("search")
+_init_lock = threading.Lock()
+
+
+def _new_client():
+    from tavily import TavilyClient
+
+    return TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                _client = _new_client()
+    return _client
+
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = SearchCache(SEARCH_CACHE_PATH or data_path("search_cache.sqlite3"))
+    return _cache
+
+
+def _fetch(cache: SearchCache, key: str, query: str, max_results: int, topic: str, include_raw_content: bool) -> Tuple[Dict[str, Any], bool]:
+    # Calls Tavily for a cache miss and stores the response; returns (results, served from an expired entry)
+    served_stale = False
+
+    def stale_entry() -> Optional[Dict[str, Any]]:
+        nonlocal served_stale
+        served_stale = True
+        return cache.get_stale(key)
+
+    results = resilience.call(
+        "tavily",
+        _get_client().search,
+        query,
+        max_results=max_results,
+        include_raw_content=include_raw_content,
+        topic=topic,
+        fallback=stale_entry,
+    )
+    if not served_stale:
+        cache.put(key, results)
+    return results, served_stale
+
+
+def search(
+    query: str,
+    max_results: int = 5,
+    topic: Literal["general", "news", "finance"] = "general",
+    include_raw_content: bool = False,
+) -> Dict[str, Any]:
+    """
+    Runs a Tavily search, serving repeated queries from the shared cache.
+    Concurrent misses for the same query share one Tavily call (search_flight).
+    While Tavily is failing, an expired cache entry for the query is served if one is still stored.
+    The returned dict is shared with the cache and must be treated as read-only.
+    """
+    cache = get_search_cache()
+    key = cache_key(query, max_results, topic, include_raw_content)
+    with span("tavily.search", "upstream", request_bytes=len(query)) as current:
+        results = cache.get(key)
+        current.set(cache_hit=results is not None)
+        if results is None:
+            results, stale = search_flight.do(key, _fetch, cache, key, query, max_results, topic, include_raw_content)
+            current.set(stale=stale)
+    return results
+
+
+async def search_async(
+    query: str,
+    max_results: int = 5,
+    topic: Literal["general", "news", "finance"] = "general",
+    include_raw_content: bool = False,
+    executor: Optional[Executor] = None,
+) -> Dict[str, Any]:
+    """
+    Asyncio form of search(). The Tavily call runs in `executor`; a coroutine whose query is already in
+    flight (from a thread or another task) waits for that call without holding a thread.
+    """
+    cache = get_search_cache()
+    key = cache_key(query, max_results, topic, include_raw_content)
+    with span("tavily.search", "upstream", request_bytes=len(query)) as current:
+        # A memory or SQLite lookup, cheap enough for the event loop
+        results = cache.get(key)
+        current.set(cache_hit=results is not None)
+        if results is None:
+            results, stale = await search_flight.do_async(
+                key, _fetch, cache, key, query, max_results, topic, include_raw_content, executor=executor)
+            current.set(stale=stale)
+    return results
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of the shared search cache."""
+    return get_search_cache().stats()
@@ -0,0 +1,492 @@
+# HTTP serving entry point for the travel planner: an asyncio server with a pool of ADK runners, a bounded
+# wait queue that answers 429/503 at once when full, per-upstream limits on model calls in flight, and a
+# graceful drain on SIGTERM/SIGINT.
+#
+# Usage: python -m my_agent.server [--host 127.0.0.1] [--port 8080] [--workers 8] [--queue-size 32]
+#
+#   POST /run       {"user_id": "...", "session_id": "... (optional)", "message": "..."}
+#                   -> {"session_id": "...", "reply": "...", "latency_ms": ...}
+#   GET  /healthz   200 while serving, 503 while draining
+#   GET  /stats     queue, runner, session and upstream counters
+import argparse
+import asyncio
+import collections
+import functools
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import replay
+from .resilience import concurrency_limit, resilience_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_APP_NAME = os.getenv("SERVER_APP_NAME", "vibe_travel")
+# Turns run at once; one pooled runner each
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+# Turns waiting for a free runner; beyond this new turns get 429 straight away
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+# A queued turn that has not got a runner after this long gets 503
+SERVER_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SERVER_QUEUE_TIMEOUT_SECONDS", "10"))
+SERVER_TURN_TIMEOUT_SECONDS = float(os.getenv("SERVER_TURN_TIMEOUT_SECONDS", "300"))
+# How long shutdown waits for turns in flight before cancelling them
+SERVER_DRAIN_SECONDS = float(os.getenv("SERVER_DRAIN_SECONDS", "30"))
+SERVER_SESSION_TTL_SECONDS = float(os.getenv("SERVER_SESSION_TTL_SECONDS", "3600"))
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "10000"))
+# Threads for the synchronous tools, so they do not block the event loop
+SERVER_TOOL_THREADS = int(os.getenv("SERVER_TOOL_THREADS", "16"))
+SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", str(64 * 1024)))
+SERVER_IDLE_TIMEOUT_SECONDS = float(os.getenv("SERVER_IDLE_TIMEOUT_SECONDS", "30"))
+# Pending connections the kernel holds; kept large so a burst is answered with 429s, not SYN retries
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "1024"))
+
+# Upstream whose in-flight limit (UPSTREAM_CONCURRENCY in resilience.py) applies to the agents' model calls
+MODEL_UPSTREAM = "gemini"
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+            413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+            503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class Rejected(Exception):
+    """A turn the server will not run, answered with `status` (and Retry-After when set)."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ModelSlots:
+    """The slots shared by every gated model, with a count of the calls holding one."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+
+
+@functools.lru_cache(maxsize=None)
+def _gated_llm_class():
+    from google.adk.models.base_llm import BaseLlm
+    from pydantic import PrivateAttr
+
+    class GatedLlm(BaseLlm):
+        """Wraps an agent's model so each call holds one of a bounded number of slots while it runs."""
+
+        inner: BaseLlm
+        _slots: ModelSlots = PrivateAttr()
+
+        def __init__(self, inner: BaseLlm, slots: ModelSlots):
+            super().__init__(model=inner.model, inner=inner)
+            self._slots = slots
+
+        @property
+        def capabilities(self):
+            return self.inner.capabilities
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            async with self._slots.semaphore:
+                self._slots.in_flight += 1
+                try:
+                    async for response in self.inner.generate_content_async(llm_request, stream):
+                        yield response
+                finally:
+                    self._slots.in_flight -= 1
+
+        def connect(self, llm_request):
+            return self.inner.connect(llm_request)
+
+    return GatedLlm
+
+
+def llm_agents(root_agent) -> List[Any]:
+    """Every LlmAgent reachable from `root_agent`, through sub-agents and agents wrapped as tools."""
+    from google.adk.agents import LlmAgent
+
+    found, pending, seen = [], [root_agent], set()
+    while pending:
+        agent = pending.pop()
+        if id(agent) in seen:
+            continue
+        seen.add(id(agent))
+        if isinstance(agent, LlmAgent):
+            found.append(agent)
+            pending.extend(tool.agent for tool in agent.tools if hasattr(tool, "agent"))
+        pending.extend(agent.sub_agents)
+    return found
+
+
+def gate_models(root_agent, limit: int) -> Optional[ModelSlots]:
+    """
+    Puts the model of every agent in `root_agent`'s tree behind one shared set of `limit` slots for
+    calls in flight. The agents are changed in place, so this is meant for the serving process. Returns
+    the slots, or None when limit is 0 (unlimited).
+    """
+    if limit <= 0:
+        return None
+    GatedLlm = _gated_llm_class()
+    slots = ModelSlots(limit)
+    for agent in llm_agents(root_agent):
+        if not isinstance(agent.model, GatedLlm):
+            agent.model = GatedLlm(agent.canonical_model, slots)
+    return slots
+
+
+class SessionPool:
+    """
+    ADK sessions of the users being served, kept in one InMemorySessionService. Sessions idle for longer
+    than `ttl` are deleted, as are the least recently used ones beyond `max_sessions`.
+    """
+
+    def __init__(self, session_service, app_name: str, ttl: float = SERVER_SESSION_TTL_SECONDS,
+                 max_sessions: int = SERVER_MAX_SESSIONS):
+        self.service = session_service
+        self.app_name = app_name
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._last_used: "collections.OrderedDict[Tuple[str, str], float]" = collections.OrderedDict()
+        self._busy: set = set()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._last_used)
+
+    async def checkout(self, user_id: str, session_id: str) -> None:
+        """Marks the session busy, creating it on first use. Raises Rejected(409) if a turn is already running in it."""
+        key = (user_id, session_id)
+        if key in self._busy:
+            raise Rejected(409, f"a turn is already running in session {session_id}")
+        self._busy.add(key)
+        try:
+            if key not in self._last_used:
+                await self.service.create_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+            self._last_used[key] = time.monotonic()
+            self._last_used.move_to_end(key)
+        except BaseException:
+            self._busy.discard(key)
+            raise
+
+    async def checkin(self, user_id: str, session_id: str) -> None:
+        key = (user_id, session_id)
+        self._busy.discard(key)
+        if key in self._last_used:
+            self._last_used[key] = time.monotonic()
+            self._last_used.move_to_end(key)
+        await self._evict()
+
+    async def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for key, last_used in list(self._last_used.items()):
+            if len(self._last_used) <= self.max_sessions and last_used > cutoff:
+                break  # Oldest first, so the rest are newer
+            if key in self._busy:
+                continue
+            del self._last_used[key]
+            self.evicted += 1
+            await self.service.delete_session(app_name=self.app_name, user_id=key[0], session_id=key[1])
+
+
+class AgentServer:
+    """
+    Runs turns of `agent` for HTTP clients. Each turn takes a runner from a pool of `workers`; up to
+    `queue_size` more wait for one, and further turns are rejected with 429 instead of queueing without
+    bound. Turns still waiting after `queue_timeout` seconds, and any turn arriving while the server
+    drains, get 503.
+    """
+
+    def __init__(self, agent, workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE,
+                 queue_timeout: float = SERVER_QUEUE_TIMEOUT_SECONDS, turn_timeout: float = SERVER_TURN_TIMEOUT_SECONDS,
+                 model_concurrency: Optional[int] = None, app_name: str = SERVER_APP_NAME):
+        from google.adk.agents.run_config import RunConfig, ToolThreadPoolConfig
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+
+        self.agent = agent
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.turn_timeout = turn_timeout
+        self.model_limit = concurrency_limit(MODEL_UPSTREAM) if model_concurrency is None else model_concurrency
+        replay.attach_agent(agent)  # Records or replays the model calls while a trace is being recorded or replayed
+        self.model_slots = gate_models(agent, self.model_limit)
+        self.sessions = SessionPool(InMemorySessionService(), app_name)
+        self.run_config = RunConfig(tool_thread_pool_config=ToolThreadPoolConfig(max_workers=SERVER_TOOL_THREADS))
+        self._runners: List[Any] = [Runner(app_name=app_name, agent=agent, session_service=self.sessions.service)
+                                    for _ in range(workers)]
+        self._free: List[Any] = list(self._runners)
+        # Turns waiting for a runner, first come first served (an asyncio.Queue lets new arrivals jump the line)
+        self._waiters: collections.deque = collections.deque()
+
+        self.draining = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._running = 0
+        self._idle_connections: set = set()
+        self._turns_done = asyncio.Event()
+        self._turns_done.set()
+        self._turn_tasks: set = set()
+        self._latencies: collections.deque = collections.deque(maxlen=1000)
+        self._avg_turn_seconds = 1.0
+        self.responses: Dict[int, int] = {}
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> int:
+        """Starts listening and returns the bound port (useful with port 0)."""
+        self._server = await asyncio.start_server(self._handle_connection, host, port, backlog=SERVER_BACKLOG)
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info("server - listening on %s:%s with %s runners and a queue of %s", host, port, self.workers, self.queue_size)
+        return port
+
+    async def drain(self, timeout: float = SERVER_DRAIN_SECONDS) -> bool:
+        """
+        Stops accepting connections and turns, waits up to `timeout` seconds for the turns in flight,
+        cancels any still running and closes the runners. Returns False if turns had to be cancelled.
+        """
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._idle_connections):
+            writer.close()
+        finished = True
+        try:
+            if not self._turns_done.is_set():
+                await asyncio.wait_for(self._turns_done.wait(), timeout)
+        except asyncio.TimeoutError:
+            finished = False
+            logger.warning("server - drain timed out, cancelling %s turn(s)", len(self._turn_tasks))
+            for task in list(self._turn_tasks):
+                task.cancel()
+            await asyncio.gather(*self._turn_tasks, return_exceptions=True)
+        for runner in self._runners:
+            await runner.close()
+        logger.info("server - drained")
+        return finished
+
+    async def _take_runner(self):
+        if self.draining:
+            raise Rejected(503, "server is shutting down")
+        if self._free and not self._waiters:
+            return self._free.pop()
+        if len(self._waiters) >= self.queue_size:
+            # A rough wait: the queue ahead of this turn divided over the runners
+            retry_after = max(1.0, self._avg_turn_seconds * (len(self._waiters) + 1) / self.workers)
+            raise Rejected(429, f"{len(self._waiters)} turns are already waiting", retry_after)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Rejected(503, f"no runner became free within {self.queue_timeout:g}s", self._avg_turn_seconds)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._return_runner(waiter.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _return_runner(self, runner) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(runner)
+                return
+        self._free.append(runner)
+
+    async def run_turn(self, user_id: str, session_id: str, message: str) -> str:
+        """Runs one user turn and returns the root agent's final reply."""
+        with replay.entry("turn", user_id=user_id, session_id=session_id, message=message):
+            return await self._run_turn(user_id, session_id, message)
+
+    async def _run_turn(self, user_id: str, session_id: str, message: str) -> str:
+        from google.genai import types
+
+        await self.sessions.checkout(user_id, session_id)
+        task = asyncio.current_task()
+        # Queued turns count too, so a drain also waits for the turns admitted before it began
+        self._turn_tasks.add(task)
+        self._turns_done.clear()
+        try:
+            runner = await self._take_runner()
+            self._running += 1
+            start = time.monotonic()
+            try:
+                content = types.Content(role="user", parts=[types.Part(text=message)])
+                replies = []
+
+                async def run():
+                    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content,
+                                                        run_config=self.run_config):
+                        if event.author == self.agent.name and event.is_final_response() and event.content:
+                            replies.extend(part.text for part in event.content.parts or [] if part.text)
+
+                try:
+                    await asyncio.wait_for(run(), self.turn_timeout)
+                except asyncio.TimeoutError:
+                    raise Rejected(504, f"the turn did not finish within {self.turn_timeout:g}s")
+                return "\n".join(replies)
+            finally:
+                elapsed = time.monotonic() - start
+                self._latencies.append(elapsed)
+                self._avg_turn_seconds = 0.9 * self._avg_turn_seconds + 0.1 * elapsed
+                self._running -= 1
+                self._return_runner(runner)
+        finally:
+            self._turn_tasks.discard(task)
+            if not self._turn_tasks:
+                self._turns_done.set()
+            await self.sessions.checkin(user_id, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000, 1) if latencies else None
+
+        return {
+            "draining": self.draining,
+            "running": self._running,
+            "waiting": len(self._waiters),
+            "free_runners": len(self._free),
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "sessions": len(self.sessions),
+            "sessions_evicted": self.sessions.evicted,
+            "model_in_flight": self.model_slots.in_flight if self.model_slots is not None else None,
+            "model_limit": self.model_limit or None,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "turn_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+            "upstreams": resilience_stats(),
+        }
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        if path == "/healthz":
+            return (503 if self.draining else 200), {"status": "draining" if self.draining else "ok"}, {}
+        if path == "/stats":
+            return 200, self.stats(), {}
+        if path != "/run":
+            return 404, {"error": f"no route for {path}"}, {}
+        if method != "POST":
+            return 405, {"error": "use POST"}, {"Allow": "POST"}
+        try:
+            request = json.loads(body or b"{}")
+            message = request["message"]
+            if not isinstance(message, str) or not message.strip():
+                raise ValueError("message must be a non-empty string")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"expected a JSON object with a message: {e}"}, {}
+        user_id = str(request.get("user_id") or "anonymous")
+        session_id = str(request.get("session_id") or uuid.uuid4().hex)
+        start = time.monotonic()
+        try:
+            reply = await self.run_turn(user_id, session_id, message)
+        except Rejected as e:
+            headers = {"Retry-After": str(int(e.retry_after + 0.999))} if e.retry_after else {}
+            return e.status, {"error": str(e), "session_id": session_id}, headers
+        except Exception as e:
+            logger.exception("server - turn failed in session %s", session_id)
+            return 500, {"error": f"turn failed: {e}", "session_id": session_id}, {}
+        return 200, {"session_id": session_id, "reply": reply, "latency_ms": round((time.monotonic() - start) * 1000, 1)}, {}
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await asyncio.wait_for(reader.readline(), SERVER_IDLE_TIMEOUT_SECONDS)
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise ValueError("malformed request line")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), SERVER_IDLE_TIMEOUT_SECONDS)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        if length > SERVER_MAX_BODY_BYTES:
+            raise OverflowError(f"request body over {SERVER_MAX_BODY_BYTES} bytes")
+        body = await asyncio.wait_for(reader.readexactly(length), SERVER_IDLE_TIMEOUT_SECONDS) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], headers: Dict[str, str], keep_alive: bool) -> None:
+        self.responses[status] = self.responses.get(status, 0) + 1
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while not self.draining:
+                self._idle_connections.add(writer)
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, OverflowError) as e:
+                    self._respond(writer, 413 if isinstance(e, OverflowError) else 400, {"error": str(e)}, {}, False)
+                    await writer.drain()
+                    break
+                finally:
+                    self._idle_connections.discard(writer)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload, extra = await self._dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and not self.draining
+                self._respond(writer, status, payload, extra, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # Idle or half-closed keep-alive connection
+        finally:
+            writer.close()
+
+
+async def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS,
+                queue_size: int = SERVER_QUEUE_SIZE, drain_seconds: float = SERVER_DRAIN_SECONDS) -> None:
+    """Serves my_agent.agent2.root_agent until SIGTERM or SIGINT, then drains."""
+    from .agent2 import root_agent
+
+    server = AgentServer(root_agent, workers=workers, queue_size=queue_size)
+    bound = await server.start(host, port)
+    print(f"Serving {root_agent.name} on http://{host}:{bound} ({workers} runners, queue of {queue_size})")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows: Ctrl+C still ends the process, without the drain
+            pass
+    await stop.wait()
+    print(f"Draining (up to {drain_seconds:g}s)...")
+    finished = await server.drain(drain_seconds)
+    print("Stopped." if finished else "Stopped; some turns were cancelled.")
+
+
+def main(argv: List[str] = None) -> int:
+    from .tracing import configure_logging
+
+    parser = argparse.ArgumentParser(description="Serve the travel planner agent over HTTP.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="turns run at once")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE, help="turns waiting before new ones get 429")
+    parser.add_argument("--drain-seconds", type=float, default=SERVER_DRAIN_SECONDS)
+    args = parser.parse_args(argv)
+    configure_logging()
+    asyncio.run(serve(args.host, args.port, args.workers, args.queue_size, args.drain_seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# Buffered bulk writer that coalesces appended rows per spreadsheet
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+SHEETS_APPEND_MAX_ROWS = int(os.getenv("SHEETS_APPEND_MAX_ROWS", "50"))
+SHEETS_APPEND_MAX_DELAY_SECONDS = float(os.getenv("SHEETS_APPEND_MAX_DELAY_SECONDS", "1.0"))
+# Spreadsheets flushed at once, so a slow or throttled spreadsheet does not hold up the acks of the others
+SHEETS_APPEND_FLUSH_WORKERS = int(os.getenv("SHEETS_APPEND_FLUSH_WORKERS", "4"))
+
+# flush_rows(spreadsheet_id, rows) writes all rows in one go and returns details for the acknowledgement
+FlushRows = Callable[[str, List[Dict[str, Any]]], Dict[str, Any]]
+
+
+class BufferedSheetWriter:
+    """
+    Collects rows per spreadsheet ID and writes them with a single `flush_rows` call once
+    `max_rows` rows are waiting or the oldest row has waited `max_delay` seconds.
+    A background thread handles the time threshold and hands due spreadsheets to `workers` flusher
+    threads, so different spreadsheets are written concurrently; flush() forces a write.
+
+    submit() returns a Future that resolves only after the rows were written (the durable
+    acknowledgement) and fails with the write error otherwise. When a multi-row write fails, the
+    rows are written again one at a time, so one bad row only fails its own Future. Rows for the
+    same spreadsheet are written in submission order. cancel() takes back a row not yet being written.
+    """
+
+    def __init__(self, flush_rows: FlushRows, max_rows: int = SHEETS_APPEND_MAX_ROWS,
+                 max_delay: float = SHEETS_APPEND_MAX_DELAY_SECONDS, workers: int = SHEETS_APPEND_FLUSH_WORKERS):
+        self._flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._buffers: Dict[str, List[Tuple[Dict[str, Any], Future]]] = {}
+        self._first_enqueued: Dict[str, float] = {}
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self._flushing: Set[str] = set() # Spreadsheets handed to the flusher pool and not written yet
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheet-flush")
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_cancelled = 0
+        self.flushes = 0
+
+    def submit(self, spreadsheet_id: str, row: Dict[str, Any]) -> Future:
+        """Queues one RowData for `spreadsheet_id`; the Future resolves once it has been written."""
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BufferedSheetWriter is closed")
+            buffer = self._buffers.setdefault(spreadsheet_id, [])
+            if not buffer:
+                self._first_enqueued[spreadsheet_id] = time.monotonic()
+            buffer.append((row, future))
+            self._write_locks.setdefault(spreadsheet_id, threading.Lock())
+            # Wake the flusher for a new deadline (first row) or a full buffer
+            if len(buffer) == 1 or len(buffer) >= self.max_rows:
+                self._condition.notify()
+        return future
+
+    def cancel(self, spreadsheet_id: str, future: Future) -> bool:
+        """
+        Takes the row of `future` out of the buffer and cancels its Future. Returns False when the row
+        is already being written (or was written), in which case its Future still resolves.
+        """
+        with self._condition:
+            buffer = self._buffers.get(spreadsheet_id, [])
+            for i, (_, queued) in enumerate(buffer):
+                if queued is future:
+                    del buffer[i]
+                    if not buffer:
+                        self._buffers.pop(spreadsheet_id, None)
+                        self._first_enqueued.pop(spreadsheet_id, None)
+                    self.rows_cancelled += 1
+                    break
+            else:
+                return False
+        future.cancel()
+        return True
+
+    def flush(self, spreadsheet_id: Optional[str] = None) -> None:
+        """Writes buffered rows now (for one spreadsheet, or all of them) and waits for the writes."""
+        with self._condition:
+            ids = [spreadsheet_id] if spreadsheet_id else list(self._buffers)
+        for sheet_id in ids:
+            self._write(sheet_id)
+
+    def close(self) -> None:
+        """Stops the background thread after writing everything still buffered."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        self._pool.shutdown(wait=True)
+
+    def pending(self) -> int:
+        with self._condition:
+            return sum(len(buffer) for buffer in self._buffers.values())
+
+    def _due(self, now: float) -> Tuple[List[str], Optional[float]]:
+        # Caller holds self._condition. Returns the spreadsheets to flush and the wait until the next deadline.
+        due, wait = [], None
+        for sheet_id, buffer in self._buffers.items():
+            if not buffer or sheet_id in self._flushing:
+                continue
+            remaining = self._first_enqueued[sheet_id] + self.max_delay - now
+            if len(buffer) >= self.max_rows or remaining <= 0:
+                due.append(sheet_id)
+            elif wait is None or remaining < wait:
+                wait = remaining
+        return due, wait
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                due, wait = self._due(time.monotonic())
+                while not due and not self._closed:
+                    self._condition.wait(timeout=wait)
+                    due, wait = self._due(time.monotonic())
+                if self._closed and not due:
+                    return
+                self._flushing.update(due)
+            for sheet_id in due:
+                self._pool.submit(self._write_due, sheet_id)
+
+    def _write_due(self, spreadsheet_id: str) -> None:
+        try:
+            self._write(spreadsheet_id)
+        finally:
+            with self._condition:
+                self._flushing.discard(spreadsheet_id)
+                # Rows that arrived during the write may be due already
+                self._condition.notify()
+
+    def _write(self, spreadsheet_id: str) -> None:
+        with self._condition:
+            lock = self._write_locks.get(spreadsheet_id)
+        if lock is None:
+            return
+        # The per-spreadsheet lock keeps explicit flushes and the background thread from reordering appends
+        with lock:
+            with self._condition:
+                batch = self._buffers.pop(spreadsheet_id, [])
+                self._first_enqueued.pop(spreadsheet_id, None)
+            if not batch:
+                return
+            try:
+                details = self._flush_rows(spreadsheet_id, [row for row, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    self._failed(spreadsheet_id, batch, e)
+                    return
+                logger.warning("BufferedSheetWriter - Failed to append %s rows to %s, writing them one by one: %s",
+                               len(batch), spreadsheet_id, e)
+                for entry in batch:
+                    try:
+                        details = self._flush_rows(spreadsheet_id, [entry[0]])
+                    except Exception as row_error:
+                        self._failed(spreadsheet_id, [entry], row_error)
+                    else:
+                        self._written(spreadsheet_id, [entry], details)
+                return
+            self._written(spreadsheet_id, batch, details)
+
+    def _written(self, spreadsheet_id: str, batch: List[Tuple[Dict[str, Any], Future]], details: Optional[Dict[str, Any]]) -> None:
+        with self._condition:
+            self.rows_written += len(batch)
+            self.flushes += 1
+        ack = dict(details or {}, spreadsheet_id=spreadsheet_id, rows_in_batch=len(batch))
+        for _, future in batch:
+            future.set_result(ack)
+
+    def _failed(self, spreadsheet_id: str, batch: List[Tuple[Dict[str, Any], Future]], error: Exception) -> None:
+        logger.error("BufferedSheetWriter - Failed to append %s rows to %s: %s", len(batch), spreadsheet_id, error)
+        with self._condition:
+            self.rows_failed += len(batch)
+        for _, future in batch:
+            future.set_exception(error)
+
+
+_writer: Optional[BufferedSheetWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_sheet_writer(flush_rows: FlushRows) -> BufferedSheetWriter:
+    """Process-wide writer, created on first use; buffered rows are flushed when the interpreter exits."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BufferedSheetWriter(flush_rows)
+                atexit.register(_writer.close)
+    return _writer
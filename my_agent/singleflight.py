@@ -0,0 +1,255 @@
+# Request coalescing: concurrent identical calls share one in-flight execution and its result
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from .tracing import current_span
+
+
+logger = logging.getLogger(__name__)
+
+
+# Longest a follower waits on the shared call (for a stream: for its next chunk) before it stops waiting:
+# it then makes the call itself, or fails with LeaderStalled if it already received part of a stream
+SINGLEFLIGHT_MAX_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_MAX_WAIT_SECONDS", "120"))
+
+# Runs do_async() work submitted without an executor, and finishes shared streams whose leading
+# consumer stopped reading while others still wait for the rest
+_background = ThreadPoolExecutor(max_workers=8, thread_name_prefix="singleflight")
+
+_flights: Dict[str, "SingleFlight"] = {}
+_flights_lock = threading.Lock()
+
+
+class LeaderStalled(TimeoutError):
+    """Raised to a follower of a shared stream that stopped making progress after the follower got part of it."""
+
+
+class _Broadcast:
+    """Chunks of one shared stream: every reader replays what was produced so far, then waits for more."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: Any) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def read(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Yields every chunk; raises LeaderStalled if no chunk arrives, and the stream does not end, within `timeout`."""
+        i = 0
+        while True:
+            with self._cond:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while i >= len(self.chunks) and not self.done:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise LeaderStalled(f"the shared stream made no progress for {timeout:g}s")
+                    self._cond.wait(remaining)
+                if i < len(self.chunks):
+                    chunk = self.chunks[i]
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            i += 1
+            yield chunk
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution. The first caller (the leader) runs
+    the work; callers arriving while it is in flight wait for it and get the same result or exception.
+    Threads and asyncio tasks share the same in-flight table, so either kind can follow the other.
+    Nothing is remembered once a call completes; that is the caches' job.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.errors = 0
+        self.stalled = 0 # Followers that gave up waiting on a stalled leader
+        self.max_wait = SINGLEFLIGHT_MAX_WAIT_SECONDS
+        with _flights_lock:
+            _flights[name] = self
+
+    def _join(self, table: Dict[Hashable, Any], key: Hashable, factory: Callable[[], Any]):
+        # Returns (entry, is_leader) for `key`, creating the entry when nothing is in flight
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = factory()
+                self.leaders += 1
+                return entry, True
+            self.followers += 1
+            if isinstance(entry, _Broadcast):
+                entry.followers += 1
+        span = current_span()
+        if span is not None:
+            span.set(coalesced=True)
+        logger.debug("singleflight - %s call collapsed into the one in flight", self.name)
+        return entry, False
+
+    def _settle(self, key: Hashable, future: Future, error: Optional[BaseException], result: Any = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _stalled(self) -> None:
+        with self._lock:
+            self.stalled += 1
+        logger.warning("singleflight - %s call in flight for over %gs, calling independently", self.name, self.max_wait)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Returns fn(*args, **kwargs), sharing the execution with concurrent calls for the same key.
+        A follower still waiting after max_wait seconds calls fn itself.
+        """
+        future, leader = self._join(self._calls, key, Future)
+        if not leader:
+            try:
+                return future.result(timeout=self.max_wait)
+            except concurrent.futures.TimeoutError:
+                self._stalled()
+                return fn(*args, **kwargs)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, e)
+            raise
+        self._settle(key, future, None, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args, executor: Optional[Executor] = None, **kwargs) -> Any:
+        """
+        Asyncio counterpart of do() for blocking work: the leader submits fn(*args, **kwargs) to `executor`
+        (default: a small shared pool) and every caller awaits it without holding a thread. The work is not
+        tied to any event loop, so a caller that is cancelled or whose loop ends does not cancel it for the others.
+        """
+        import asyncio # Only coroutines get here, so asyncio is already loaded; importing it up front costs ~20 ms
+
+        future, leader = self._join(self._calls, key, Future)
+        if leader:
+            work = (executor or _background).submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+            def settle(work: Future) -> None:
+                error = work.exception()
+                self._settle(key, future, error, None if error is not None else work.result())
+
+            work.add_done_callback(settle)
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.max_wait)
+        except asyncio.TimeoutError:
+            self._stalled()
+            return await asyncio.get_running_loop().run_in_executor(
+                executor or _background, contextvars.copy_context().run, lambda: fn(*args, **kwargs))
+
+    def stream(self, key: Hashable, produce: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Yields the chunks of produce(), sharing one stream between concurrent calls for the same key.
+        Later callers first get the chunks produced so far, then follow along as new ones arrive.
+        If the leading caller stops reading early, the rest is produced in the background for the others.
+        A follower that waits max_wait seconds for a chunk runs produce() itself if it has received nothing
+        yet, and otherwise fails with LeaderStalled (restarting would repeat chunks it already yielded).
+        """
+        broadcast, leader = self._join(self._streams, key, _Broadcast)
+        if not leader:
+            received = False
+            try:
+                for chunk in broadcast.read(self.max_wait):
+                    received = True
+                    yield chunk
+                return
+            except LeaderStalled:
+                if received:
+                    with self._lock:
+                        self.stalled += 1
+                    raise
+                self._stalled()
+            finally:
+                # Done, stalled or closed early (GeneratorExit): either way the leader no longer produces for it
+                with self._lock:
+                    broadcast.followers -= 1
+            yield from produce()
+            return
+        source = produce()
+        try:
+            for chunk in source:
+                broadcast.publish(chunk)
+                yield chunk
+        except GeneratorExit:
+            with self._lock:
+                abandoned = broadcast.followers == 0
+                if abandoned:
+                    self._streams.pop(key, None)
+            if abandoned:
+                source.close()
+                broadcast.finish()
+            else:
+                _background.submit(contextvars.copy_context().run, self._drain, key, broadcast, source)
+            raise
+        except BaseException as e:
+            self._end_stream(key, broadcast, e)
+            raise
+        self._end_stream(key, broadcast)
+
+    def _drain(self, key: Hashable, broadcast: _Broadcast, source: Iterator[Any]) -> None:
+        try:
+            for chunk in source:
+                broadcast.publish(chunk)
+        except BaseException as e:
+            self._end_stream(key, broadcast, e)
+            return
+        self._end_stream(key, broadcast)
+
+    def _end_stream(self, key: Hashable, broadcast: _Broadcast, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._streams.pop(key, None)
+            if error is not None:
+                self.errors += 1
+        broadcast.finish(error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.leaders + self.followers
+            return {
+                "executions": self.leaders,
+                "collapsed": self.followers,
+                "collapse_rate": self.followers / calls if calls else 0.0,
+                "errors": self.errors,
+                "stalled": self.stalled,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """Executions and collapsed calls of every coalescing point in this process."""
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
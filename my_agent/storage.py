@@ -0,0 +1,26 @@
+# Local on-disk storage shared by the caches and stores in this package
+import os
+import sqlite3
+
+
+# Directory for every local database/cache file. Defaults to ~/.cache/vibe_travel
+DATA_DIR = os.getenv("VIBE_TRAVEL_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "vibe_travel")
+
+
+def data_path(filename: str) -> str:
+    """Returns the absolute path of `filename` inside DATA_DIR, creating the directory if needed."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite database that can be shared by threads (callers serialize access with their own lock)
+    and by several worker processes (WAL journal, generous busy timeout).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,125 @@
+# Streaming Gemini generation with time-to-first-chunk measurement
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from . import resilience
+from .tracing import end_span, start_span
+
+
+logger = logging.getLogger(__name__)
+
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+
+@dataclass
+class StreamStats:
+    """Latency of one streamed generation, filled in while the stream is consumed."""
+    first_chunk_seconds: Optional[float] = None
+    total_seconds: Optional[float] = None
+    chunks: int = 0
+    chars: int = 0
+    cache: Optional[str] = None # "exact" or "similar" when the text was served from the itinerary cache
+    coalesced: bool = False # True when the text was shared from an identical generation already in flight
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            "first_chunk_seconds": None if self.first_chunk_seconds is None else round(self.first_chunk_seconds, 3),
+            "total_seconds": None if self.total_seconds is None else round(self.total_seconds, 3),
+            "chunks": self.chunks,
+            "chars": self.chars,
+            "cache": self.cache,
+            "coalesced": self.coalesced,
+        }
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _genai():
+    """google.generativeai, imported and configured with GOOGLE_API_KEY on first use (the import is slow)."""
+    global _configured
+    import google.generativeai as genai
+
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _configured = True
+    return genai
+
+
+def _default_model(model_name: str):
+    return _genai().GenerativeModel(model_name)
+
+
+# Builds the model stream_generate calls for a model name; replay.py swaps it to record or replay generations
+model_factory: Callable[[str], Any] = _default_model
+
+
+def _chunk_text(chunk) -> str:
+    # chunk.text raises when a chunk carries no text part (e.g. only safety or finish metadata)
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def _open_stream(model, prompt: str) -> Iterator:
+    # Pulls the first chunk too: rate limit and overload errors surface there, and until a chunk has been
+    # yielded the whole request can still be retried without repeating text to the consumer
+    response = iter(model.generate_content(prompt, stream=True))
+    for first in response:
+        return itertools.chain((first,), response)
+    return response
+
+
+def stream_generate(prompt: str, stats: Optional[StreamStats] = None, model_name: str = GEMINI_MODEL) -> Iterator[str]:
+    """
+    Yields text chunks from Gemini as they arrive, recording latency in `stats` if given. The stats' clock is
+    not restarted: timings passed in from cached_stream include the research done before the generation.
+    """
+    stats = stats if stats is not None else StreamStats()
+    started = time.perf_counter()
+    first_chunk_at = None
+    # The caller consumes this generator, so the span is closed by hand instead of with a `with` block
+    current = start_span("gemini.generate_content", "model", model=model_name, request_bytes=len(prompt))
+    try:
+        model = model_factory(model_name)
+        for chunk in resilience.call("gemini", _open_stream, model, prompt):
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            if stats.first_chunk_seconds is None:
+                stats.first_chunk_seconds = first_chunk_at - stats._start
+            stats.chunks += 1
+            stats.chars += len(text)
+            yield text
+    except GeneratorExit: # The consumer stopped reading early
+        end_span(current)
+        raise
+    except BaseException as e:
+        end_span(current, e)
+        raise
+    finished = time.perf_counter()
+    stats.total_seconds = finished - stats._start
+    # The span and log line time the model call alone
+    model_first_chunk = (first_chunk_at or finished) - started
+    current.set(response_bytes=stats.chars, first_chunk_ms=round(model_first_chunk * 1000, 3))
+    end_span(current)
+    logger.info("stream_generate - first chunk after %.3fs, done after %.3fs (%s chunks)",
+                model_first_chunk, finished - started, stats.chunks)
+
+
+def collect(chunks: Iterator[str]) -> str:
+    """Joins a chunk stream back into the full response text."""
+    return "".join(chunks).strip()
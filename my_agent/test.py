@@ -1,35 +1,31 @@
-import os
-from google.adk.agents.llm_agent import Agent
-from tavily import TavilyClient
+import sys
 from dotenv import load_dotenv
-import google.generativeai as genai
+from . import batch, replay
+from .context import compact_results
+from .search import search
+from .research import itinerary_queries, research
+from .itinerary_cache import cached_stream
+from .streaming import StreamStats, collect, stream_generate
+from .tracing import configure_logging
+from typing import Iterator, Optional
 
 
 # --- Load environment variables
 load_dotenv(override=True)
 
-tavily_key = os.getenv("TAVILY_API_KEY")
-gemini_key = os.getenv("GOOGLE_API_KEY")
-
-
-# --- Initialize Gemini and Tavily
-genai.configure(api_key=gemini_key)
-tavily_client = TavilyClient(api_key=tavily_key)
+# --- Gemini is configured with GOOGLE_API_KEY on first use (streaming.py); Tavily is shared through search.py
 
 # --- Tool definitions
 def internet_search(query: str) -> str:
     """Search the internet for travel information."""
-    results = tavily_client.search(query, max_results=5)
-    summaries = [
-        f"- [{r['title']}]({r['url']}): {r['content'][:150]}..."
-        for r in results.get("results", [])
-    ]
-    return "\n".join(summaries)
+    results = search(query, max_results=5)
+    return compact_results(results, query).text
 
-def get_trip_itinerary(city: str, interests: list[str], budget: int, days: int) -> dict:
-    """Use Gemini and Tavily to plan a personalized itinerary."""
-    search_query = f"{city} {', '.join(interests)} itinerary ideas, budget {budget} USD, {days} days"
-    context = internet_search(search_query)
+def _itinerary_prompt(city: str, interests: list[str], budget: int, days: int) -> str:
+    # Several focused searches run concurrently instead of one broad query
+    findings = research(itinerary_queries(city, interests, budget, days))
+    # Deduplicated, relevance-ranked and packed into the context token budget
+    context = compact_results(findings, f"{city} {' '.join(interests)} {days} days ${budget}").text
 
     prompt = f"""
     You are an expert travel planner.
@@ -47,21 +43,50 @@ def get_trip_itinerary(city: str, interests: list[str], budget: int, days: int)
     - Approximate daily costs
     - Any travel tips or advice
     """
+    return prompt
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    return {"city": city, "itinerary": response.text.strip()}
+def stream_trip_itinerary(city: str, interests: list[str], budget: int, days: int, stats: Optional[StreamStats] = None) -> Iterator[str]:
+    """
+    Same as get_trip_itinerary, but yields the itinerary text in chunks as Gemini produces it.
+    Trips matching (or nearly matching) an earlier request are served from the itinerary cache.
+    """
+    def generate(stats: StreamStats) -> Iterator[str]:
+        prompt = _itinerary_prompt(city, interests, budget, days)
+        yield from stream_generate(prompt, stats=stats)
 
-# --- Define the main agent
-agent = Agent(
-    model="gemini-2.5-flash",
-    name="trip_planner_agent",
-    description="An AI travel planner that uses Tavily for live info and Gemini for reasoning.",
-    tools=[internet_search, get_trip_itinerary],
-)
+    with replay.entry("itinerary", city=city, interests=interests, budget=budget, days=days):
+        yield from cached_stream("itinerary", city, interests, budget, days, generate, stats)
 
-# --- Interactive CLI
+def get_trip_itinerary(city: str, interests: list[str], budget: int, days: int) -> dict:
+    """Use Gemini and Tavily to plan a personalized itinerary."""
+    stats = StreamStats()
+    itinerary = collect(stream_trip_itinerary(city, interests, budget, days, stats=stats))
+    return {"city": city, "itinerary": itinerary, "timing": stats.as_dict()}
+
+# --- Define the main agent (built on first access, so the CLI and batch workers do not load google.adk)
+def _build_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash",
+        name="trip_planner_agent",
+        description="An AI travel planner that uses Tavily for live info and Gemini for reasoning.",
+        tools=[internet_search, get_trip_itinerary],
+    )
+
+def __getattr__(name: str):
+    if name == "agent":
+        globals()["agent"] = agent = _build_agent()
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Interactive CLI (run with: python -m my_agent.test)
 if __name__ == "__main__":
+    configure_logging()
+    # With arguments, run non-interactively over a JSONL file of trips (see batch.py for the format)
+    if len(sys.argv) > 1:
+        sys.exit(batch.main(sys.argv[1:], default_mode="itinerary"))
+
     print("\n🌍 Welcome to Vibe Travel Agent ✈️\n")
 
     city = input("🗺️ Enter destination city: ").strip()
@@ -71,9 +96,12 @@ if __name__ == "__main__":
     days = int(input("🗓️  How many days is your trip? ").strip())
 
     print("\n✨ Generating your custom itinerary... please wait ✨\n")
+    print(f"\n🌟 Trip Itinerary for {city} 🌟\n")
 
-    result = get_trip_itinerary(city=city, interests=interests, budget=budget, days=days)
+    # Print the itinerary as it is generated instead of waiting for the whole plan
+    stats = StreamStats()
+    for chunk in stream_trip_itinerary(city=city, interests=interests, budget=budget, days=days, stats=stats):
+        print(chunk, end="", flush=True)
 
-    print(f"\n🌟 Trip Itinerary for {city} 🌟\n")
-    print(result["itinerary"])
+    print(f"\n\n⏱️  First output after {stats.first_chunk_seconds or 0:.1f}s, complete after {stats.total_seconds:.1f}s")
     print("\n✅ Done! Enjoy your trip 🌍")
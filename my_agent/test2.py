@@ -1,37 +1,31 @@
-from google.adk.agents.llm_agent import Agent
-from tavily import TavilyClient
 from dotenv import load_dotenv
-import google.generativeai as genai
-import os
+from . import batch, replay
+from .context import compact_results
+from .search import search
+from .research import destination_queries, research
+from .itinerary_cache import cached_stream
+from .streaming import StreamStats, collect, stream_generate
+from .tracing import configure_logging
+from typing import Iterator, Optional
+import sys
 
 # --- Load environment variables
 load_dotenv(override=True)
 
-tavily_key = os.getenv("TAVILY_API_KEY")
-gemini_key = os.getenv("GOOGLE_API_KEY")
-
-genai.configure(api_key=gemini_key)
-tavily_client = TavilyClient(api_key=tavily_key)
+# Gemini is configured with GOOGLE_API_KEY on first use (streaming.py)
 
 # --- Tool: Internet Search
 def internet_search(query: str) -> str:
     """Search the internet for travel information."""
-    results = tavily_client.search(query, max_results=5)
-    summaries = [
-        f"- [{r['title']}]({r['url']}): {r['content'][:200]}..."
-        for r in results.get("results", [])
-    ]
-    return "\n".join(summaries)
+    results = search(query, max_results=5)
+    return compact_results(results, query).text
 
 # --- Tool: Generate trip plan dynamically
-def plan_smart_trip(home_city: str, interests: list[str], budget: int, days: int) -> dict:
-    """Find an ideal destination and itinerary based on the user's situation."""
-    search_query = (
-        f"best destinations near {home_city} for {', '.join(interests)}, "
-        f"budget {budget} USD, {days}-day trip, "
-        "including travel costs, weather, and season."
-    )
-    context = internet_search(search_query)
+def _smart_trip_prompt(home_city: str, interests: list[str], budget: int, days: int) -> str:
+    # Several focused searches (destinations, food, transport, costs, weather) run concurrently
+    findings = research(destination_queries(home_city, interests, budget, days))
+    # Deduplicated, relevance-ranked and packed into the context token budget
+    context = compact_results(findings, f"{home_city} {' '.join(interests)} {days} days ${budget}").text
 
     prompt = f"""
     You are an expert travel planner.
@@ -55,21 +49,50 @@ def plan_smart_trip(home_city: str, interests: list[str], budget: int, days: int
     - 💰 Estimated total cost
     - 🧳 Tips & Notes
     """
+    return prompt
+
+def stream_smart_trip(home_city: str, interests: list[str], budget: int, days: int, stats: Optional[StreamStats] = None) -> Iterator[str]:
+    """
+    Same as plan_smart_trip, but yields the trip plan text in chunks as Gemini produces it.
+    Trips matching (or nearly matching) an earlier request are served from the itinerary cache.
+    """
+    def generate(stats: StreamStats) -> Iterator[str]:
+        prompt = _smart_trip_prompt(home_city, interests, budget, days)
+        yield from stream_generate(prompt, stats=stats)
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    return {"home": home_city, "trip_plan": response.text.strip()}
+    with replay.entry("smart_trip", home_city=home_city, interests=interests, budget=budget, days=days):
+        yield from cached_stream("smart_trip", home_city, interests, budget, days, generate, stats)
 
-# --- Define the main agent
-agent = Agent(
-    model="gemini-2.5-flash",
-    name="vibe_travel_agent",
-    description="An AI travel planner that chooses destinations automatically based on interests, budget, and time.",
-    tools=[internet_search, plan_smart_trip],
-)
+def plan_smart_trip(home_city: str, interests: list[str], budget: int, days: int) -> dict:
+    """Find an ideal destination and itinerary based on the user's situation."""
+    stats = StreamStats()
+    trip_plan = collect(stream_smart_trip(home_city, interests, budget, days, stats=stats))
+    return {"home": home_city, "trip_plan": trip_plan, "timing": stats.as_dict()}
+
+# --- Define the main agent (built on first access, so the CLI and batch workers do not load google.adk)
+def _build_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash",
+        name="vibe_travel_agent",
+        description="An AI travel planner that chooses destinations automatically based on interests, budget, and time.",
+        tools=[internet_search, plan_smart_trip],
+    )
+
+def __getattr__(name: str):
+    if name == "agent":
+        globals()["agent"] = agent = _build_agent()
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# --- Interactive CLI
+# --- Interactive CLI (run with: python -m my_agent.test2)
 if __name__ == "__main__":
+    configure_logging()
+    # With arguments, run non-interactively over a JSONL file of trips (see batch.py for the format)
+    if len(sys.argv) > 1:
+        sys.exit(batch.main(sys.argv[1:], default_mode="smart_trip"))
+
     print("\n🌍 Welcome to Vibe Travel Agent ✈️\n")
 
     home_city = input("🏠 Enter your current location: ").strip()
@@ -79,10 +102,12 @@ if __name__ == "__main__":
     days = int(input("🗓️  How many days can you travel? ").strip())
 
     print("\n✨ Finding the perfect destination and itinerary... please wait ✨\n")
+    print(f"\n🌟 Vibe Travel Plan 🌟\n")
 
-    result = plan_smart_trip(home_city=home_city, interests=interests, budget=budget, days=days)
+    # Print the plan as it is generated instead of waiting for the whole response
+    stats = StreamStats()
+    for chunk in stream_smart_trip(home_city=home_city, interests=interests, budget=budget, days=days, stats=stats):
+        print(chunk, end="", flush=True)
 
-    print(f"\n🌟 Vibe Travel Plan 🌟\n")
-    print(result["trip_plan"])
+    print(f"\n\n⏱️  First output after {stats.first_chunk_seconds or 0:.1f}s, complete after {stats.total_seconds:.1f}s")
     print("\n✅ Done! Your trip plan is ready 🌍")
-t
\ No newline at end of file
@@ -1,70 +1,215 @@
 # For Google Sheets
+import logging
 import os
-from typing import Any, Dict, Optional
-from google.oauth2.service_account import Credentials # Example for service account
-from googleapiclient.discovery import build
-from google.adk.tools import FunctionTool
-import re # Import regular expressions
+import re
+import threading
+from concurrent import futures
+from typing import Any, Dict, List, Optional, Tuple
+from . import resilience
+from .artifacts import MissingArtifact, resolve
+from .drive_files import MAX_BATCH_SIZE, delete_files, get_created_files, record_created
+from .google_clients import get_service
+from .docs_markdown import compile_sections, pack_requests
+from .docs_sections import DOCUMENT_FIELDS, content_hash, get_doc_manifests, plan_section_updates
+from .sheet_writer import get_sheet_writer
+from .tracing import lazy_tools, span
+
+
+logger = logging.getLogger(__name__)
 
 
-SHEETS_SERVICE_ACCOUNT_KEY_PATH = os.getenv("SHEETS_SERVICE_ACCOUNT_KEY_PATH") # Path to your service account JSON
 USER_EMAIL_TO_SHARE_WITH = os.getenv("USER_EMAIL_TO_SHARE_WITH") # Email of the user to make owner of created files
 
-def _get_sheets_service():
-    """Helper function to authenticate and build Sheets and Drive API service clients."""
-    # IMPORTANT: Implement proper authentication. Service account is common for backend services.
-    # Ensure your service account has permissions to edit Google Sheets.
-    # You might need to share the target Google Sheet with the service account's email address.
-    # Also needs Drive API permissions if sharing.
-    
-    print(f"DEBUG: Value of SHEETS_SERVICE_ACCOUNT_KEY_PATH from env: '{SHEETS_SERVICE_ACCOUNT_KEY_PATH}'") # Debug print
-    # Example using service account credentials:
-    if not SHEETS_SERVICE_ACCOUNT_KEY_PATH:
-        print("ERROR: _get_sheets_service - SHEETS_SERVICE_ACCOUNT_KEY_PATH environment variable is not set or is empty. Please check your .env file.")
+def _get_services(*names: str) -> Optional[tuple]:
+    """
+    Returns the shared API clients for the requested services ('sheets', 'drive', 'docs'), in order.
+    Clients come from the process-wide registry in google_clients.py, so only the services a tool
+    actually needs are built, and each of them only once. Returns None if any of them is unavailable.
+    """
+    services = tuple(get_service(name) for name in names)
+    if not all(services):
         return None
+    return services
     
-    # Determine if the path from .env is absolute or relative
-    if os.path.isabs(SHEETS_SERVICE_ACCOUNT_KEY_PATH):
-        service_account_file_path = SHEETS_SERVICE_ACCOUNT_KEY_PATH
+
+FINANCE_TAB_NAME = "Finance Planner"
+FINANCE_HEADERS = ["Source", "Destination", "Flights", "Hotels", "Itinerary", "Food", "Total Estimated Cost", "Budget", "Remaining/Surplus", "Financial Summary"]
+# Cell properties written for every exported row; properties listed here but not set on a cell are cleared
+_FINANCE_CELL_FIELDS = 'userEnteredValue,userEnteredFormat.textFormat.bold,userEnteredFormat.wrapStrategy'
+
+# Amounts the model passes as text ("1200", "$1,200.50"), which USER_ENTERED input used to turn into numbers
+_NUMBER_TEXT = re.compile(r"^\s*[-+]?[$€£]?\s*(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?\s*$")
+
+
+def _execute(request):
+    """Runs a googleapiclient request through the rate limiter, retries and circuit breaker of its API."""
+    # Reads and deletes are safe to repeat; POSTs (creates, batchUpdates) are only retried when rejected outright
+    idempotent = getattr(request, "method", "POST") != "POST"
+    return resilience.call(resilience.google_upstream(getattr(request, "methodId", None)), request.execute, idempotent=idempotent)
+
+
+class _RoundTrips:
+    """Counts the Google API HTTP round trips made by one tool call and traces each of them."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def execute(self, request):
+        with self._lock:
+            self.count += 1
+        # methodId is e.g. "sheets.spreadsheets.batchUpdate"
+        with span(getattr(request, "methodId", None) or "google.execute", "upstream", request_bytes=len(request.body or "")):
+            return _execute(request)
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    match = _NUMBER_TEXT.match(value) if isinstance(value, str) else None
+    if match is None:
+        return None
+    number = float(match.group(1).replace(",", "") + (match.group(2) or ""))
+    return -number if value.strip().startswith("-") else number
+
+
+def _cell(value: Any, bold: bool = False, wrap: bool = False) -> Dict[str, Any]:
+    """CellData for the Sheets API: numbers, and amounts given as text, are numeric; everything else is text."""
+    number = _as_number(value)
+    if number is not None:
+        cell = {'userEnteredValue': {'numberValue': number}}
     else:
-        # If relative, assume it's relative to the current file's directory (tools.py) for robustness
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        service_account_file_path = os.path.join(base_dir, SHEETS_SERVICE_ACCOUNT_KEY_PATH)
+        cell = {'userEnteredValue': {'stringValue': str(value)}}
+    user_format: Dict[str, Any] = {}
+    if bold:
+        user_format['textFormat'] = {'bold': True}
+    if wrap:
+        user_format['wrapStrategy'] = 'WRAP'
+    if user_format:
+        cell['userEnteredFormat'] = user_format
+    return cell
 
-    
-    print(f"INFO: _get_sheets_service - Attempting to load service account credentials from: {service_account_file_path}") 
+
+def _finance_header_row() -> Dict[str, Any]:
+    return {'values': [_cell(header, bold=True) for header in FINANCE_HEADERS]}
+
+
+def _finance_data_row(financial_data: Dict[str, float], source: str, destination: str, financial_summary: str) -> Dict[str, Any]:
+    """RowData for one financial plan, with text wrapping on the Financial Summary cell."""
+    from .budget import plan_totals, summary_text # numpy is only loaded once a plan is exported
+
+    financial_data = {key: value if _as_number(value) is None else _as_number(value) for key, value in financial_data.items()}
+    flight_cost = financial_data.get("Flights", 0.0)
+    hotel_cost = financial_data.get("Hotels", 0.0)
+    itinerary_cost = financial_data.get("Itinerary", 0.0)
+    food_cost = financial_data.get("Food", 0.0)
+    budget_amount = financial_data.get("Budget", 0.0)
+
+    total_estimated_cost, remaining_surplus = plan_totals(financial_data)
+    if not financial_summary:
+        financial_summary = summary_text(source, destination, financial_data, budget_amount)
+
+    data_row = [source, destination, flight_cost, hotel_cost, itinerary_cost, food_cost, total_estimated_cost, budget_amount, remaining_surplus]
+    return {'values': [_cell(value) for value in data_row] + [_cell(financial_summary, wrap=True)]}
+
+
+def _share_with_user(drive_service, file_id: str, round_trips: "_RoundTrips") -> Optional[str]:
+    """
+    Grants USER_EMAIL_TO_SHARE_WITH writer access to a file. Returns None once shared, or the error;
+    like before, a failed share is reported with the result but does not fail the export.
+    """
+    permission = {
+        'type': 'user',
+        'role': 'writer',
+        'emailAddress': USER_EMAIL_TO_SHARE_WITH
+    }
     try:
-            if not os.path.exists(service_account_file_path):
-                print(f"ERROR: _get_sheets_service - Service account file not found at: {service_account_file_path}")
-                return None
-            
-            scopes = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive.file', # Scope for Drive API to manage permissions
-                'https://www.googleapis.com/auth/documents' # Scope for Google Docs API
-            ]
-            creds = Credentials.from_service_account_file(
-                service_account_file_path,
-                scopes=scopes
-            )
-            sheets_service = build('sheets', 'v4', credentials=creds)
-            drive_service = build('drive', 'v3', credentials=creds)
-            docs_service = build('docs', 'v1', credentials=creds) # Build Docs service
-            print("INFO: _get_sheets_service - Google Sheets, Drive, and Docs services created successfully.")
-            return sheets_service, drive_service, docs_service
-    except Exception as e:
-        print(f"ERROR: _get_sheets_service - Failed to create Google Sheets service: {e}")
+        round_trips.execute(drive_service.permissions().create(fileId=file_id, body=permission, sendNotificationEmail=False))
+        logger.info("Shared file %s with %s as writer.", file_id, USER_EMAIL_TO_SHARE_WITH)
         return None
-    
+    except Exception as e_share:
+        logger.warning("Failed to share file %s with %s: %s", file_id, USER_EMAIL_TO_SHARE_WITH, e_share)
+        return str(e_share)
+
+
+def share_created_file(file_id: str) -> Optional[str]:
+    """
+    Shares a file an export created with USER_EMAIL_TO_SHARE_WITH (again), for an export interrupted between
+    its create and its share. Returns None once shared or with nobody to share with, else the error.
+    """
+    if not USER_EMAIL_TO_SHARE_WITH:
+        return None
+    services = _get_services('drive')
+    if not services:
+        return "Google Drive API service not available."
+    drive_service, = services
+    return _share_with_user(drive_service, file_id, _RoundTrips())
+
+
+def _existing_tabs(sheets_service, spreadsheet_id: str, round_trips: _RoundTrips) -> Dict[str, int]:
+    """Title -> sheetId of every tab in the spreadsheet, from a single field-masked metadata lookup."""
+    sheet_metadata = round_trips.execute(
+        sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id, fields='sheets.properties(sheetId,title)')
+    )
+    return {
+        sheet.get("properties", {}).get("title"): sheet.get("properties", {}).get("sheetId")
+        for sheet in sheet_metadata.get('sheets', [])
+    }
+
+
+def _add_finance_tab_request(existing_tabs: Dict[str, int]) -> Tuple[int, Dict[str, Any]]:
+    """addSheet request for the Finance Planner tab with a free sheetId chosen up front, so later requests in the same batch can target it."""
+    finance_tab_sheet_id = max([sheet_id for sheet_id in existing_tabs.values() if sheet_id is not None], default=-1) + 1
+    return finance_tab_sheet_id, {'addSheet': {'properties': {'title': FINANCE_TAB_NAME, 'sheetId': finance_tab_sheet_id}}}
+
+
+# spreadsheet ID -> sheetId of its Finance Planner tab, so buffered appends skip the metadata lookup
+_finance_tab_ids: Dict[str, int] = {}
+SHEETS_APPEND_ACK_TIMEOUT_SECONDS = float(os.getenv("SHEETS_APPEND_ACK_TIMEOUT_SECONDS", "60"))
+
+
+def _flush_finance_rows(spreadsheet_id: str, rows: list) -> Dict[str, Any]:
+    """
+    Appends buffered financial plan rows to the Finance Planner tab with a single batchUpdate
+    (one multi-row appendCells; the summary wrap format travels with the cells).
+    Used as the flush function of the buffered sheet writer.
+    """
+    services = _get_services('sheets')
+    if not services:
+        raise RuntimeError("Google Sheets API service not available.")
+    sheets_service, = services
+    round_trips = _RoundTrips()
+
+    requests = []
+    finance_tab_sheet_id = _finance_tab_ids.get(spreadsheet_id)
+    if finance_tab_sheet_id is None:
+        existing_tabs = _existing_tabs(sheets_service, spreadsheet_id, round_trips)
+        finance_tab_sheet_id = existing_tabs.get(FINANCE_TAB_NAME)
+        if finance_tab_sheet_id is None:
+            finance_tab_sheet_id, add_tab = _add_finance_tab_request(existing_tabs)
+            requests.append(add_tab)
+            rows = [_finance_header_row()] + rows
+
+    requests.append({'appendCells': {'sheetId': finance_tab_sheet_id, 'rows': rows, 'fields': _FINANCE_CELL_FIELDS}})
+    try:
+        round_trips.execute(sheets_service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': requests}))
+    except Exception:
+        _finance_tab_ids.pop(spreadsheet_id, None) # The tab may have been deleted or renamed; look it up again next time
+        raise
+    _finance_tab_ids[spreadsheet_id] = finance_tab_sheet_id
+    logger.info("Appended %s rows to tab '%s' in spreadsheet ID %s.", len(rows), FINANCE_TAB_NAME, spreadsheet_id)
+    return {"round_trips": round_trips.count}
+
 
 def export_trip_plan_to_google_sheet(
-    financial_data: Dict[str, float], # Expects keys like "Flights", "Hotels", "Itinerary", "Food", "Budget"
-    source: str,
-    destination: str,
-    financial_summary: str,  # Add this parameter
+    financial_data: Optional[Dict[str, float]] = None, # Expects keys like "Flights", "Hotels", "Itinerary", "Food", "Budget"
+    source: str = "",
+    destination: str = "",
+    financial_summary: Optional[str] = None,  # Add this parameter
     spreadsheet_id: Optional[str] = None,
     spreadsheet_title: Optional[str] = "New Travel Plan",
-    append_data: bool = False # New parameter to control append behavior
+    append_data: bool = False, # New parameter to control append behavior
+    tool_context: Any = None
 ) -> Dict[str, Any]:
     """
     Exports a financial plan to a Google Sheet.
@@ -74,349 +219,189 @@ def export_trip_plan_to_google_sheet(
     The financial_data dictionary contains the cost breakdown and budget.
     Source and destination are passed as separate string arguments.
     If append_data is True and spreadsheet_id is provided, data is appended to the "Finance Planner" tab.
+    Appends are buffered per spreadsheet and written together with other pending rows;
+    the call returns once its row has actually been written, or with status "pending" if the
+    write is still in progress after SHEETS_APPEND_ACK_TIMEOUT_SECONDS.
+    financial_data and financial_summary can be left out to use the ones calculate_trip_budget saved
+    for this conversation (artifacts "financial_data" and "financial_summary").
     """
-    services = _get_sheets_service()
-    if not services or not all(services): # Check all three services
-        return {"status": "error", "message": "Google API services (Sheets, Drive, or Docs) not available."}
-    sheets_service, drive_service, _ = services # Docs service not used in this function
-
-    sheet_id_to_use = spreadsheet_id
-    actual_spreadsheet_title = spreadsheet_title if spreadsheet_title else "Finance Planner"
-    new_sheet_created_url = None
-
-    if not sheet_id_to_use: # If no sheet ID provided, always create a new one
+    try:
+        financial_data = resolve(tool_context, financial_data, "financial_data")
+        financial_summary = resolve(tool_context, financial_summary, "financial_summary") or ""
+    except MissingArtifact as e:
+        return {"status": "error", "message": str(e)}
+    if not isinstance(financial_data, dict):
+        return {"status": "error", "message": "No financial_data given and none saved for this conversation; call calculate_trip_budget first."}
+    if append_data and spreadsheet_id:
+        data_row = _finance_data_row(financial_data, source, destination, financial_summary)
+        writer = get_sheet_writer(_flush_finance_rows)
+        written = writer.submit(spreadsheet_id, data_row)
         try:
-            append_data = False # Cannot append to a sheet that doesn't exist yet
-            # Create a new spreadsheet
-            spreadsheet_body = {
-                'properties': {
-                    'title': actual_spreadsheet_title
-                }
+            ack = written.result(timeout=SHEETS_APPEND_ACK_TIMEOUT_SECONDS)
+        except futures.TimeoutError:
+            # A row left buffered would still be written later, and appended twice if the call is retried
+            if writer.cancel(spreadsheet_id, written):
+                logger.error("Append to Google Sheet '%s' timed out before it was written; cancelled", spreadsheet_id)
+                return {"status": "error", "message": f"Appending to Google Sheet timed out after {SHEETS_APPEND_ACK_TIMEOUT_SECONDS:g}s; nothing was written."}
+            logger.warning("Append to Google Sheet '%s' is still being written after %gs", spreadsheet_id, SHEETS_APPEND_ACK_TIMEOUT_SECONDS)
+            return {
+                "status": "pending",
+                "message": "The financial plan is still being appended; do not append it again.",
+                "spreadsheet_url": f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}",
             }
-            print(f"INFO: Attempting to create new spreadsheet with title: {actual_spreadsheet_title}")
-            spreadsheet = sheets_service.spreadsheets().create(body=spreadsheet_body).execute()
-            sheet_id_to_use = spreadsheet.get('spreadsheetId')
-            new_sheet_created_url = spreadsheet.get('spreadsheetUrl')
-            print(f"INFO: Created new spreadsheet with ID: {sheet_id_to_use}, URL: {new_sheet_created_url}")
-
-
-            # Share the newly created sheet
-            if sheet_id_to_use and USER_EMAIL_TO_SHARE_WITH:
-                try:
-                    permission = {
-                        # Grant ownership to the specified user
-                        'type': 'user',
-                        'role': 'writer', # Changed from 'owner' to 'writer'
-                        'emailAddress': USER_EMAIL_TO_SHARE_WITH
-                    }
-                    drive_service.permissions().create(fileId=sheet_id_to_use, body=permission, sendNotificationEmail=False).execute() # Removed transferOwnership
-                    print(f"INFO: Shared spreadsheet {sheet_id_to_use} with {USER_EMAIL_TO_SHARE_WITH} as writer.")
-                except Exception as e_share:
-                    print(f"WARNING: Failed to share spreadsheet {sheet_id_to_use} with {USER_EMAIL_TO_SHARE_WITH}: {str(e_share)}")
         except Exception as e:
-            print(f"ERROR: Failed to create new spreadsheet: {str(e)}")
-            return {"status": "error", "message": f"Failed to create new spreadsheet: {str(e)}"}
-
-    if not sheet_id_to_use:
-        return {"status": "error", "message": "Spreadsheet ID is missing and new sheet creation might have failed."}
+            logger.error("Failed to append to Google Sheet '%s': %s", spreadsheet_id, e)
+            return {"status": "error", "message": f"Failed to append to Google Sheet: {str(e)}"}
+        return {
+            "status": "success",
+            "message": f"Financial plan appended to tab '{FINANCE_TAB_NAME}' together with {ack['rows_in_batch'] - 1} other pending rows.",
+            "spreadsheet_url": f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}",
+            "round_trips": ack["round_trips"]
+        }
 
-    finance_tab_name = "Finance Planner"
+    services = _get_services('sheets', 'drive')
+    if not services:
+        return {"status": "error", "message": "Google API services (Sheets or Drive) not available."}
+    sheets_service, drive_service = services
+
+    round_trips = _RoundTrips()
+    data_row = _finance_data_row(financial_data, source, destination, financial_summary)
+
+    if not spreadsheet_id: # If no sheet ID provided, always create a new one
+        # The tab, header, data row and formatting all go into the create request itself,
+        # so no default "Sheet1" is created and nothing has to be fixed up afterwards.
+        actual_spreadsheet_title = spreadsheet_title if spreadsheet_title else "Finance Planner"
+        spreadsheet_body = {
+            'properties': {'title': actual_spreadsheet_title},
+            'sheets': [{
+                'properties': {'title': FINANCE_TAB_NAME, 'sheetId': 0},
+                'data': [{'startRow': 0, 'startColumn': 0, 'rowData': [_finance_header_row(), data_row]}]
+            }]
+        }
+        try:
+            logger.info("Attempting to create new spreadsheet with title: %s", actual_spreadsheet_title)
+            spreadsheet = round_trips.execute(
+                sheets_service.spreadsheets().create(body=spreadsheet_body, fields='spreadsheetId,spreadsheetUrl')
+            )
+        except Exception as e:
+            logger.error("Failed to create new spreadsheet: %s", e)
+            return {"status": "error", "message": f"Failed to create new spreadsheet: {str(e)}", "round_trips": round_trips.count}
+        new_sheet_id = spreadsheet.get('spreadsheetId')
+        logger.info("Created new spreadsheet with ID: %s, URL: %s", new_sheet_id, spreadsheet.get('spreadsheetUrl'))
+        if new_sheet_id:
+            record_created(new_sheet_id, "spreadsheet", actual_spreadsheet_title, tool_context)
+
+        # The share needs the new file ID, so it is the one call after the create; the result waits for
+        # it, so the user can open the URL it returns
+        share_error = None
+        if new_sheet_id and USER_EMAIL_TO_SHARE_WITH:
+            share_error = _share_with_user(drive_service, new_sheet_id, round_trips)
+
+        result = {
+            "status": "success",
+            "message": f"Financial plan exported to tab '{FINANCE_TAB_NAME}'. Cells updated: {2 * len(FINANCE_HEADERS)}.",
+            "spreadsheet_url": spreadsheet.get('spreadsheetUrl') or f"https://docs.google.com/spreadsheets/d/{new_sheet_id}",
+            "round_trips": round_trips.count
+        }
+        if share_error:
+            result["share_error"] = share_error
+        return result
 
     try:
-        sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=sheet_id_to_use).execute()
-        existing_sheets = {sheet.get("properties", {}).get("title"): sheet.get("properties", {}).get("sheetId") for sheet in sheet_metadata.get('sheets', [])}
-        finance_tab_sheet_id = None
-
-        if finance_tab_name not in existing_sheets:
-            add_sheet_request_body = {'requests': [{'addSheet': {'properties': {'title': finance_tab_name}}}]}
-            response = sheets_service.spreadsheets().batchUpdate(spreadsheetId=sheet_id_to_use, body=add_sheet_request_body).execute()
-            # Extract sheetId from response for the newly created tab
-            new_sheet_properties = response.get('replies')[0].get('addSheet').get('properties')
-            if new_sheet_properties:
-                finance_tab_sheet_id = new_sheet_properties.get('sheetId')
-                print(f"INFO: Created tab '{finance_tab_name}' with sheetId {finance_tab_sheet_id} in spreadsheet ID {sheet_id_to_use}.")
-            else:
-                # Fallback if sheetId cannot be extracted, though unlikely if creation succeeded
-                print(f"WARNING: Created tab '{finance_tab_name}', but could not get its sheetId immediately. Formatting may not be applied.")
-                # Re-fetch metadata to find it (less efficient but a fallback)
-                sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=sheet_id_to_use).execute()
-                existing_sheets = {
-                    sheet.get("properties", {}).get("title"): sheet.get("properties", {}).get("sheetId") 
-                    for sheet in sheet_metadata.get('sheets', []) if sheet.get("properties")}
-                finance_tab_sheet_id = existing_sheets.get(finance_tab_name)
-        else:
-            finance_tab_sheet_id = existing_sheets[finance_tab_name]
-            print(f"INFO: Tab '{finance_tab_name}' already exists with sheetId {finance_tab_sheet_id}.")
-
-        # Clean up "Sheet1" if it exists and is not our finance_tab_name
-        if finance_tab_sheet_id is not None: # Ensure we have a valid finance_tab_sheet_id
-            try:
-                all_sheets_metadata_response = sheets_service.spreadsheets().get(spreadsheetId=sheet_id_to_use, fields="sheets(properties(sheetId,title))").execute()
-                all_sheets_properties = all_sheets_metadata_response.get('sheets', [])
-                
-                delete_sheet_requests = []
-                for sheet_props_item in all_sheets_properties:
-                    props = sheet_props_item.get('properties', {})
-                    current_sheet_id_to_check = props.get('sheetId')
-                    current_sheet_title_to_check = props.get('title')
-                    
-                    # Only delete "Sheet1" if it's not the actual finance_tab_sheet_id (e.g. if Finance Planner was renamed from Sheet1)
-                    if current_sheet_title_to_check == "Sheet1" and current_sheet_id_to_check != finance_tab_sheet_id:
-                        delete_sheet_requests.append({'deleteSheet': {'sheetId': current_sheet_id_to_check}})
-                        print(f"INFO: Identified 'Sheet1' (ID: {current_sheet_id_to_check}) for deletion as it's not the target '{finance_tab_name}' tab.")
-
-                if delete_sheet_requests:
-                    sheets_service.spreadsheets().batchUpdate(
-                        spreadsheetId=sheet_id_to_use,
-                        body={'requests': delete_sheet_requests}
-                    ).execute()
-                    print(f"INFO: Successfully deleted 'Sheet1' tab(s) from spreadsheet ID {sheet_id_to_use}.")
-            except Exception as e_delete_sheet1:
-                print(f"WARNING: Could not clean up 'Sheet1' tab: {str(e_delete_sheet1)}")
-
-        # Prepare data for the sheet
-        headers = ["Source", "Destination", "Flights", "Hotels", "Itinerary", "Food", "Total Estimated Cost", "Budget", "Remaining/Surplus", "Financial Summary"]  # Add "Financial Summary"
-        
-        flight_cost = financial_data.get("Flights", 0.0)
-        hotel_cost = financial_data.get("Hotels", 0.0)
-        itinerary_cost = financial_data.get("Itinerary", 0.0)
-        food_cost = financial_data.get("Food", 0.0)
-        budget_amount = financial_data.get("Budget", 0.0)
-
-        total_estimated_cost = flight_cost + hotel_cost + itinerary_cost + food_cost
-        remaining_surplus = budget_amount - total_estimated_cost
-
-        data_row = [source, destination, flight_cost, hotel_cost, itinerary_cost, food_cost, total_estimated_cost, budget_amount, remaining_surplus, financial_summary]  # Add financial_summary
-
-        if append_data and spreadsheet_id: # Append only if ID is given and append is true
-                # Append the data_row to the existing sheet
-                body = {'values': [data_row]} # Note: data_row is already a list, wrap it in another list for rows
-                result = sheets_service.spreadsheets().values().append(
-                    spreadsheetId=sheet_id_to_use,
-                    range=f"'{finance_tab_name}'!A1", # Append will find the first empty row
-                    valueInputOption='USER_ENTERED',
-                    insertDataOption='INSERT_ROWS',
-                    body=body
-                ).execute()
-                print(f"INFO: Appended data to tab '{finance_tab_name}' in spreadsheet ID {sheet_id_to_use}.")
-                # Formatting for appended rows might need specific handling if different from headers/first data row
-                # For simplicity, this example doesn't re-apply all formatting to appended rows beyond what Sheets inherits.
-                # Text wrapping for the new summary cell in the appended row will be applied.
-        else:
-                # Write headers and the first data_row (or overwrite)
-                values_to_write = [headers, data_row]
-                body = {'values': values_to_write}
-                result = sheets_service.spreadsheets().values().update(
-                    spreadsheetId=sheet_id_to_use,
-                    range=f"'{finance_tab_name}'!A1", # Writing from cell A1
-                    valueInputOption='USER_ENTERED',
-                    body=body
-                ).execute()
-                print(f"INFO: Wrote/Overwrote data to tab '{finance_tab_name}' in spreadsheet ID {sheet_id_to_use}.")
-
-            # Apply formatting if finance_tab_sheet_id is known
-        if finance_tab_sheet_id:
-                financial_summary_column_index = headers.index("Financial Summary") 
-                active_formatting_requests = []
-
-                if not append_data or not spreadsheet_id: # Only apply header formatting if not appending or if it's a new sheet
-                    # Add request to make the header row bold
-                    active_formatting_requests.append({
-                        'updateCells': {
-                            'rows': [{
-                                'values': [ # For each cell in the header row
-                                    {'userEnteredFormat': {'textFormat': {'bold': True}}}
-                                ] * len(headers) # Apply to all header cells
-                            }],
-                            'fields': 'userEnteredFormat.textFormat.bold',
-                            'range': {
-                                'sheetId': finance_tab_sheet_id,
-                                'startRowIndex': 0,  # Header row (0-indexed)
-                                'endRowIndex': 1,    # Covers one row
-                                'startColumnIndex': 0, # Starts from the first column
-                                'endColumnIndex': len(headers) # Covers all header columns
-                            }
-                        }
-                    })
-
-                # Determine the row index for the financial summary cell to format
-                # If appending, it's the last row written. If not, it's the first data row (index 1).
-                summary_row_start_index = 1 # Default for new/overwrite
-                if append_data and spreadsheet_id and result.get('updates') and result['updates'].get('updatedRange'):
-                    # Try to get the actual appended row index from the response
-                    # Format: 'SheetName'!A<start_row>:J<end_row>
-                    updated_range_str = result['updates']['updatedRange']
-                    match = re.search(r"A(\d+):", updated_range_str)
-                    if match:
-                        summary_row_start_index = int(match.group(1)) - 1 # API is 0-indexed
-                
-                # Apply text wrapping to the Financial Summary cell (current or appended row)
-                active_formatting_requests.append({
-                    'updateCells': {
-                        'rows': [{'values': [{'userEnteredFormat': {'wrapStrategy': 'WRAP'}}]}],
-                        'fields': 'userEnteredFormat.wrapStrategy',
-                        'range': {
-                            'sheetId': finance_tab_sheet_id,
-                            'startRowIndex': summary_row_start_index,
-                            'endRowIndex': summary_row_start_index + 1,
-                            'startColumnIndex': financial_summary_column_index,
-                            'endColumnIndex': financial_summary_column_index + 1
-                        }
-                    }
-                })
-                if active_formatting_requests:
-                    sheets_service.spreadsheets().batchUpdate(
-                        spreadsheetId=sheet_id_to_use,
-                        body={'requests': active_formatting_requests}
-                    ).execute()
-                    print(f"INFO: Applied formatting (text wrapping for summary, bold headers) to tab '{finance_tab_name}'.")
+        # One metadata lookup, then a single batchUpdate that adds the tab if needed, removes the
+        # default "Sheet1", writes the rows and applies formatting.
+        existing_tabs = _existing_tabs(sheets_service, spreadsheet_id, round_trips)
+
+        requests = []
+        finance_tab_sheet_id = existing_tabs.get(FINANCE_TAB_NAME)
+        if finance_tab_sheet_id is None:
+            finance_tab_sheet_id, add_tab = _add_finance_tab_request(existing_tabs)
+            requests.append(add_tab)
+            logger.info("Adding tab '%s' with sheetId %s to spreadsheet ID %s.", FINANCE_TAB_NAME, finance_tab_sheet_id, spreadsheet_id)
+
+        # Clean up "Sheet1" if it exists and is not our finance tab
+        if "Sheet1" in existing_tabs and existing_tabs["Sheet1"] != finance_tab_sheet_id:
+            requests.append({'deleteSheet': {'sheetId': existing_tabs["Sheet1"]}})
+
+        # Write headers and the data row (or overwrite them) starting at A1
+        rows = [_finance_header_row(), data_row]
+        requests.append({'updateCells': {
+            'start': {'sheetId': finance_tab_sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+            'rows': rows,
+            'fields': _FINANCE_CELL_FIELDS
+        }})
+
+        round_trips.execute(sheets_service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': requests}))
+        _finance_tab_ids[spreadsheet_id] = finance_tab_sheet_id
+        logger.info("Wrote data to tab '%s' in spreadsheet ID %s.", FINANCE_TAB_NAME, spreadsheet_id)
 
         return {
             "status": "success",
-            "message": f"Financial plan exported to tab '{finance_tab_name}'. Cells updated: {result.get('updatedCells')}.",
-            "spreadsheet_url": new_sheet_created_url if new_sheet_created_url else f"https://docs.google.com/spreadsheets/d/{sheet_id_to_use}"
+            "message": f"Financial plan exported to tab '{FINANCE_TAB_NAME}'. Cells updated: {len(rows) * len(FINANCE_HEADERS)}.",
+            "spreadsheet_url": f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}",
+            "round_trips": round_trips.count
         }
     except Exception as e:
-        print(f"ERROR: Failed to write to Google Sheet '{sheet_id_to_use}': {str(e)}")
-        return {"status": "error", "message": f"Failed to write to Google Sheet: {str(e)}"}
+        logger.error("Failed to write to Google Sheet '%s': %s", spreadsheet_id, e)
+        return {"status": "error", "message": f"Failed to write to Google Sheet: {str(e)}", "round_trips": round_trips.count}
 
 
-export_to_google_sheet_tool = FunctionTool(func=export_trip_plan_to_google_sheet)
-
-def _generate_text_requests_with_markdown(text_content: str, start_index: int) -> (list, int): # type: ignore
-    """
-    Parses text_content for markdown (bold, italics, bullets) and generates Google Docs API requests.
-    Returns a list of requests and the new current_index after this content.
-    """
-    requests = []
-    current_doc_index = start_index
-
-    for line_with_ending in text_content.splitlines(keepends=True):
-        line_content = line_with_ending.rstrip('\r\n')
-        has_newline = line_with_ending.endswith(('\n', '\r\n'))
-
-        line_start_index_for_paragraph_styling = current_doc_index
-        is_bullet_line = False
-
-        # Handle bullet points
-        bullet_marker_match = re.match(r"^(\*\s+)", line_content) # Only match lines starting with "* "
-        if bullet_marker_match:
-            is_bullet_line = True
-            # Insert the bullet marker text itself, but don't style it yet
-            # The createParagraphBullets will handle the visual bullet
-            # We just need to insert the text content after the marker
-            content_after_bullet = line_content[len(bullet_marker_match.group(1)):].lstrip()
-            text_to_process_inline = content_after_bullet
-        else:
-            text_to_process_inline = line_content
-
-        # Process inline markdown (bold, italics)
-        # Regex to find **bold** or *italic* or _italic_
-        # It captures the content inside the markdown
-        parts = re.split(r'(\*\*.*?\*\*|\*.*?\*|_.*?_)', text_to_process_inline)
- 
-        for part in parts:
-            if not part:
-                continue
- 
-            is_bold_segment = False
-            is_italic_segment = False
-            actual_text_to_insert = part
- 
-            if part.startswith('**') and part.endswith('**') and len(part) > 4:
-                actual_text_to_insert = part[2:-2]
-                is_bold_segment = True
-            elif (part.startswith('*') and part.endswith('*') and len(part) > 2) or \
-                 (part.startswith('_') and part.endswith('_') and len(part) > 2):
-                actual_text_to_insert = part[1:-1]
-                is_italic_segment = True
- 
-            if actual_text_to_insert:
-                requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': actual_text_to_insert}})
-                # Always apply text style to explicitly set/unset bold and italic for the segment
-                requests.append({'updateTextStyle': {
-                    'range': {'startIndex': current_doc_index, 'endIndex': current_doc_index + len(actual_text_to_insert)},
-                    'textStyle': {
-                        'bold': is_bold_segment,
-                        'italic': is_italic_segment
-                        # Other styles like underline, strikethrough, etc., default to false/unset
-                        # unless explicitly handled.
-                    },
-                    'fields': "bold,italic" # Specify that we are updating bold and italic properties
-                }})
-                current_doc_index += len(actual_text_to_insert)
- 
-        # Add the newline character if the original line had one
-        if has_newline:
-            requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': '\n'}})
-            current_doc_index += 1
-        # If it's a bullet line with no actual text content (e.g., "* "),
-        # and it didn't have a newline from the source (meaning it's the last line of input),
-        # we must insert a newline to make it a paragraph for the bullet style to apply correctly.
-        elif is_bullet_line and not text_to_process_inline and not has_newline:
-            requests.append({'insertText': {'location': {'index': current_doc_index}, 'text': '\n'}})
-            current_doc_index += 1
- 
-        # Apply bullet paragraph style if it was a bullet line.
-        # current_doc_index is now at the end of the paragraph (after its newline, if any).
-        # line_start_index_for_paragraph_styling is at the beginning of the paragraph's text content.
-        if is_bullet_line:
-            if current_doc_index > line_start_index_for_paragraph_styling: # Ensure the paragraph has content
-                requests.append({'createParagraphBullets': {
-                    'range': {
-                        'startIndex': line_start_index_for_paragraph_styling,
-                        'endIndex': current_doc_index # This range includes the paragraph's own newline
-                    },
-                    'bulletPreset': 'BULLET_DISC_CIRCLE_SQUARE' # Or other presets
-                }})
-    return requests, current_doc_index
-
 def export_trip_plan_to_google_doc(
-    flight_data: str,
-    hotel_data: str,
-    itinerary_data: str,
+    flight_data: Optional[str] = None,
+    hotel_data: Optional[str] = None,
+    itinerary_data: Optional[str] = None,
     food_recommendations_data: Optional[str] = None, # New parameter for food recommendations
-    document_title: Optional[str] = "Travel Plan Document"
+    document_title: Optional[str] = "Travel Plan Document",
+    document_id: Optional[str] = None,
+    tool_context: Any = None
 ) -> Dict[str, Any]:
     """
     Exports flight, hotel, and itinerary data to a new Google Doc,
     with each section under a respective heading.
+    Sections are best passed by reference: leave a section out to use the text saved for this
+    conversation under "flight_data", "hotel_data", "itinerary_data" or "food_data", or pass the
+    key of a saved text instead of the text itself.
+    With a document_id, the existing document is updated instead: only the sections whose content
+    changed since the last export are rewritten, and nothing is written if none did.
     """
-    services = _get_sheets_service() # Reusing this helper, it now returns docs_service too
-    if not services or not all(services):
-        return {"status": "error", "message": "Google API services (Sheets, Drive, or Docs) not available."}
-    _, drive_service, docs_service = services
-
+    try:
+        flight_data = resolve(tool_context, flight_data, "flight_data") or ""
+        hotel_data = resolve(tool_context, hotel_data, "hotel_data") or ""
+        itinerary_data = resolve(tool_context, itinerary_data, "itinerary_data") or ""
+        food_recommendations_data = resolve(tool_context, food_recommendations_data, "food_data")
+    except MissingArtifact as e:
+        return {"status": "error", "message": str(e)}
+    if document_id:
+        return _update_trip_doc(document_id, [
+            ("Flights", flight_data), ("Hotels", hotel_data), ("Itinerary", itinerary_data), ("Food", food_recommendations_data),
+        ])
+
+    services = _get_services('drive', 'docs')
+    if not services:
+        return {"status": "error", "message": "Google API services (Drive or Docs) not available."}
+    drive_service, docs_service = services
+
+    round_trips = _RoundTrips()
     new_doc_url = None
     doc_id = None
 
     try:
         # Create a new Google Doc
         doc_body = {'title': document_title}
-        print(f"INFO: Attempting to create new Google Doc with title: {document_title}")
-        doc = docs_service.documents().create(body=doc_body).execute()
+        logger.info("Attempting to create new Google Doc with title: %s", document_title)
+        doc = round_trips.execute(docs_service.documents().create(body=doc_body))
         doc_id = doc.get('documentId')
         new_doc_url = f"https://docs.google.com/document/d/{doc_id}/edit"
-        print(f"INFO: Created new Google Doc with ID: {doc_id}, URL: {new_doc_url}")
+        logger.info("Created new Google Doc with ID: %s, URL: %s", doc_id, new_doc_url)
+        if doc_id:
+            record_created(doc_id, "document", document_title, tool_context)
 
         # Share the newly created document
+        share_error = None
         if doc_id and USER_EMAIL_TO_SHARE_WITH:
-            try:
-                permission = {
-                    # Grant ownership to the specified user
-                    'type': 'user',
-                         'role': 'writer', # Changed from 'owner' to 'writer'
-                    'emailAddress': USER_EMAIL_TO_SHARE_WITH
-                }
-                drive_service.permissions().create(fileId=doc_id, body=permission, sendNotificationEmail=False).execute() # Removed transferOwnership
-                print(f"INFO: Shared Google Doc {doc_id} with {USER_EMAIL_TO_SHARE_WITH} as writer.")
-            except Exception as e_share:
-                print(f"WARNING: Failed to share Google Doc {doc_id} with {USER_EMAIL_TO_SHARE_WITH}: {str(e_share)}")
+            share_error = _share_with_user(drive_service, doc_id, round_trips)
 
         # Prepare content for the document
-        requests = []
-        current_index = 1 # Start inserting at the beginning of the document body
-
         sections = [
             ("Flights", flight_data),
             ("Hotels", hotel_data),
@@ -426,69 +411,66 @@ def export_trip_plan_to_google_doc(
         if food_recommendations_data:
             sections.append(("Food", food_recommendations_data))
 
-        for title, data_content in sections:
-            # Insert heading text
-            heading_text = f"{title}\n"
-            requests.append({
-                'insertText': {
-                    'location': {'index': current_index},
-                    'text': heading_text
-                }
-            })
-            # Apply Heading 1 style to the heading text
-            requests.append({
-                'updateParagraphStyle': {
-                    'range': {
-                        'startIndex': current_index,
-                        'endIndex': current_index + len(heading_text) -1 # -1 because \n is part of this paragraph but style applies to text before it
-                    },
-                    'paragraphStyle': {
-                        'namedStyleType': 'HEADING_1'
-                    },
-                    'fields': 'namedStyleType'
-                }
-            })
-            # Apply Bold style to the heading text
-            requests.append({
-                'updateTextStyle': {
-                    'range': {
-                        'startIndex': current_index,
-                        'endIndex': current_index + len(heading_text) - 1
-                    },
-                    'textStyle': {'bold': True},
-                    'fields': 'bold'
-                }
-            })
-            current_index += len(heading_text)
-
-         # Generate requests for data content with bolding
-            data_requests, new_current_index = _generate_text_requests_with_markdown(data_content, current_index)
-            requests.extend(data_requests)
-            current_index = new_current_index
-            
-            # Add a single newline for spacing after the section's data, if the data_content itself doesn't end with one.
-            # The _generate_text_requests_with_markdown should handle newlines from data_content.
-            if data_content and not data_content.endswith('\n'):
-                requests.append({'insertText': {'location': {'index': current_index}, 'text': "\n"}})
-                current_index += 1
-        docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': requests}).execute()
-        print(f"INFO: Content written to Google Doc {doc_id}")
+        # One insertText per section plus merged style ranges, split into ordered batches if the payload is large
+        document = compile_sections(sections, start_index=1) # Start inserting at the beginning of the document body
+        for batch in document.batches():
+            round_trips.execute(docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': batch}))
+        logger.info("Content written to Google Doc %s", doc_id)
+        get_doc_manifests().put(doc_id, {title: content_hash(markdown) for title, markdown in sections})
 
-        return {
+        result = {
             "status": "success",
             "message": f"Trip plan exported to Google Doc: {document_title}",
             "document_url": new_doc_url,
-            "document_id": doc_id
+            "document_id": doc_id,
+            "round_trips": round_trips.count
         }
+        if share_error:
+            result["share_error"] = share_error
+        return result
 
     except Exception as e:
-        print(f"ERROR: Failed to create or update Google Doc: {str(e)}")
+        logger.error("Failed to create or update Google Doc: %s", e)
         error_message = f"Failed to create or update Google Doc: {str(e)}"
         if doc_id and not new_doc_url: # If doc was created but content update failed
              error_message += f" Document was created with ID {doc_id} but content update failed."
         return {"status": "error", "message": error_message, "document_id": doc_id}
 
-export_to_google_doc_tool = FunctionTool(func=export_trip_plan_to_google_doc)
+
+def _update_trip_doc(document_id: str, sections: list) -> Dict[str, Any]:
+    """Rewrites the sections of an exported trip document whose content changed; see docs_sections.py."""
+    services = _get_services('docs')
+    if not services:
+        return {"status": "error", "message": "Google Docs API service not available."}
+    docs_service, = services
+
+    round_trips = _RoundTrips()
+    document_url = f"https://docs.google.com/document/d/{document_id}/edit"
+    manifests = get_doc_manifests()
+    try:
+        document = round_trips.execute(docs_service.documents().get(documentId=document_id, fields=DOCUMENT_FIELDS))
+        update = plan_section_updates(document, sections, manifests.get(document_id))
+        for i, batch in enumerate(pack_requests(update.requests)):
+            body = {'requests': batch}
+            if i == 0 and document.get('revisionId'):
+                # Fail instead of writing at stale indexes if the document was edited after the get
+                body['writeControl'] = {'requiredRevisionId': document['revisionId']}
+            round_trips.execute(docs_service.documents().batchUpdate(documentId=document_id, body=body))
+    except Exception as e:
+        logger.error("Failed to update Google Doc %s: %s", document_id, e)
+        return {"status": "error", "message": f"Failed to update Google Doc: {str(e)}", "document_id": document_id, "round_trips": round_trips.count}
+    manifests.put(document_id, update.manifest)
+    logger.info("Updated Google Doc %s: rewrote %s, unchanged %s", document_id, update.updated, update.unchanged)
+    return {
+        "status": "success",
+        "message": (f"Updated sections: {', '.join(update.updated)}." if update.updated else "The document is already up to date.")
+                   + (f" Unchanged: {', '.join(update.unchanged)}." if update.unchanged else ""),
+        "document_url": document_url,
+        "document_id": document_id,
+        "updated_sections": update.updated,
+        "unchanged_sections": update.unchanged,
+        "round_trips": round_trips.count
+    }
 
 
 def delete_google_file_by_id(file_id: str) -> Dict[str, Any]:
@@ -496,21 +478,55 @@ def delete_google_file_by_id(file_id: str) -> Dict[str, Any]:
     Deletes a file (like a Google Sheet or Google Doc) from Google Drive
     using its file ID. This action is permanent.
     """
-    services = _get_sheets_service() # Reusing this helper
-    if not services or not all(services):
-        return {"status": "error", "message": "Google API services (Sheets, Drive, or Docs) not available."}
-    _, drive_service, _ = services # We only need drive_service here
+    services = _get_services('drive')
+    if not services:
+        return {"status": "error", "message": "Google Drive API service not available."}
+    drive_service, = services
 
     try:
-        print(f"INFO: Attempting to delete file with ID: {file_id}")
-        drive_service.files().delete(fileId=file_id).execute()
-        print(f"INFO: Successfully deleted file with ID: {file_id}")
+        logger.info("Attempting to delete file with ID: %s", file_id)
+        _execute(drive_service.files().delete(fileId=file_id))
+        logger.info("Successfully deleted file with ID: %s", file_id)
+        get_created_files().mark_deleted([file_id])
         return {
             "status": "success",
             "message": f"File with ID '{file_id}' has been permanently deleted."
         }
     except Exception as e:
-        print(f"ERROR: Failed to delete file with ID '{file_id}': {str(e)}")
+        logger.error("Failed to delete file with ID '%s': %s", file_id, e)
         return {"status": "error", "message": f"Failed to delete file with ID '{file_id}': {str(e)}"}
 
-delete_google_file_tool = FunctionTool(func=delete_google_file_by_id)
\ No newline at end of file
+def delete_google_files_by_id(file_ids: List[str]) -> Dict[str, Any]:
+    """
+    Permanently deletes up to 100 files (Google Sheets or Google Docs) from Google Drive by their file IDs,
+    all in one batch request. Files that no longer exist are reported as not found. This action is permanent.
+    """
+    if not file_ids:
+        return {"status": "error", "message": "No file IDs given."}
+    if len(set(file_ids)) > MAX_BATCH_SIZE:
+        return {"status": "error", "message": f"At most {MAX_BATCH_SIZE} files can be deleted per call; got {len(set(file_ids))}."}
+    try:
+        totals = delete_files(file_ids)
+    except Exception as e:
+        logger.error("Failed to delete %s files: %s", len(file_ids), e)
+        return {"status": "error", "message": f"Failed to delete the files: {str(e)}"}
+    result = {
+        "status": "error" if totals["failed"] else "success",
+        "message": f"Permanently deleted {len(totals['deleted'])} of {totals['total']} files."
+                   + (f" {len(totals['not_found'])} were not found." if totals["not_found"] else "")
+                   + (f" {len(totals['failed'])} could not be deleted." if totals["failed"] else ""),
+        "deleted": totals["deleted"],
+    }
+    if totals["not_found"]:
+        result["not_found"] = totals["not_found"]
+    if totals["failed"]:
+        result["failed"] = totals["failed"]
+    return result
+
+# Tool name -> function; the FunctionTool objects are built on first access (see tracing.lazy_tools)
+__getattr__ = lazy_tools(__name__, {
+    "export_to_google_sheet_tool": export_trip_plan_to_google_sheet,
+    "export_to_google_doc_tool": export_trip_plan_to_google_doc,
+    "delete_google_file_tool": delete_google_file_by_id,
+    "delete_google_files_tool": delete_google_files_by_id,
+})
@@ -0,0 +1,350 @@
+# Lightweight tracing: timing spans for tools, sub-agents, model calls and upstream APIs
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .storage import data_path
+
+
+logger = logging.getLogger(__name__)
+
+# "none" (default), "jsonl" or "otel"
+TRACE_EXPORTER = os.getenv("VIBE_TRAVEL_TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("VIBE_TRAVEL_TRACE_FILE") # Defaults to traces.jsonl in the data dir
+# Size at which the JSON lines file is moved to <file>.1 (replacing the previous one) and a new file is started
+TRACE_MAX_BYTES = int(os.getenv("VIBE_TRAVEL_TRACE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+@dataclass
+class Span:
+    """One timed operation. Spans started while another span is active become its children."""
+    name: str
+    kind: str # "tool", "agent_tool", "model" or "upstream"
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_start")
+        return data
+
+
+class JsonLinesExporter:
+    """
+    Appends every finished span as one JSON object per line. Once the file reaches `max_bytes` it is
+    rotated to <path>.1, so at most about twice that is kept on disk (0 disables rotation).
+    """
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.as_dict(), default=str) + "\n"
+        size = len(line.encode("utf-8"))
+        with self._lock:
+            if self._file is not None and self.max_bytes and self._size + size > self.max_bytes:
+                self._file.close()
+                self._file = None
+                os.replace(self.path, self.path + ".1")
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1) # line buffered
+                self._size = self._file.tell()
+            self._file.write(line)
+            self._size += size
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class OpenTelemetryExporter:
+    """
+    Re-emits finished spans through the OpenTelemetry API, so they reach whatever SDK/exporter the
+    process configured (OTLP, console, ...). Requires the optional `opentelemetry-api` package.
+    """
+
+    def __init__(self, tracer_name: str = "vibe_travel"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def export(self, span: Span) -> None:
+        # Children finish (and are exported) before their parents, so the hierarchy is carried in the
+        # vibe_travel.trace_id / span_id / parent_id attributes rather than in OTel parent contexts.
+        attributes = {f"vibe_travel.{key}": value if isinstance(value, (str, bool, int, float)) else str(value)
+                      for key, value in span.attributes.items()}
+        attributes.update({"vibe_travel.kind": span.kind, "vibe_travel.trace_id": span.trace_id,
+                           "vibe_travel.span_id": span.span_id, "vibe_travel.parent_id": span.parent_id or ""})
+        start_ns = int(span.start_time * 1e9)
+        otel_span = self._tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        if span.status == "error":
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=start_ns + int((span.duration_ms or 0) * 1e6))
+
+    def close(self) -> None:
+        pass
+
+
+class _NoopExporter:
+    def export(self, span: Span) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def configure_logging() -> None:
+    """Log setup for the command line entry points; the level comes from VIBE_TRAVEL_LOG_LEVEL (default WARNING)."""
+    logging.basicConfig(level=os.getenv("VIBE_TRAVEL_LOG_LEVEL", "WARNING").upper(),
+                        format="%(levelname)s: %(name)s - %(message)s")
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("vibe_travel_span", default=None)
+
+
+def _default_exporter():
+    if TRACE_EXPORTER == "none":
+        return _NoopExporter()
+    if TRACE_EXPORTER == "otel":
+        try:
+            return OpenTelemetryExporter()
+        except ImportError:
+            logger.warning("tracing - opentelemetry-api is not installed; writing spans to a JSON lines file instead.")
+    return JsonLinesExporter(TRACE_FILE or data_path("traces.jsonl"))
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _default_exporter()
+    return _exporter
+
+
+def set_exporter(exporter) -> None:
+    """Replaces the span exporter. Any object with export(span) and close() works."""
+    global _exporter
+    with _exporter_lock:
+        previous, _exporter = _exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.close()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_span(name: str, kind: str, attributes: Dict[str, Any], parent: Optional[Span] = None) -> Span:
+    parent = parent if parent is not None else _current_span.get()
+    return Span(
+        name=name,
+        kind=kind,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        attributes=dict(attributes),
+    )
+
+
+def _finish(span: Span) -> None:
+    span.duration_ms = round((time.perf_counter() - span._start) * 1000, 3)
+    try:
+        get_exporter().export(span)
+    except Exception as e: # Tracing must never break the traced call
+        logger.warning("tracing - Failed to export span %s: %s", span.name, e)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("span %s (%s) %s in %.1f ms", span.name, span.kind, span.status, span.duration_ms)
+
+
+def start_span(name: str, kind: str = "upstream", **attributes: Any) -> Span:
+    """
+    Starts a span under the current one without making it current, for work that does not fit a
+    `with` block (e.g. a generator consumed by the caller). Pass it to end_span() when done.
+    """
+    return _new_span(name, kind, attributes)
+
+
+def end_span(current: Span, error: Any = None) -> None:
+    if error is not None:
+        current.fail(error)
+    _finish(current)
+
+
+@contextlib.contextmanager
+def span(name: str, kind: str = "upstream", **attributes: Any) -> Iterator[Span]:
+    """Times the enclosed block as a child of the current span; exceptions mark it as failed and propagate."""
+    current = _new_span(name, kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+def _payload_bytes(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+def _record_result(current: Span, result: Any) -> None:
+    current.set(response_bytes=_payload_bytes(result))
+    # Tools report failures as {"status": "error", "message": ...} instead of raising
+    if isinstance(result, dict) and result.get("status") == "error":
+        current.fail(result.get("message"))
+
+
+def _arguments(func: Callable, signature: inspect.Signature, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    bound = signature.bind_partial(*args, **kwargs)
+    return {name: value for name, value in bound.arguments.items() if name != "tool_context"}
+
+
+def traced_tool(func: Callable) -> Callable:
+    """
+    Wraps a tool function so every call is recorded as a "tool" span with its argument and result sizes.
+    functools.wraps keeps the name, docstring and signature that FunctionTool turns into the declaration.
+    """
+    signature = inspect.signature(func)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(func.__name__, "tool", request_bytes=_payload_bytes(_arguments(func, signature, args, kwargs))) as current:
+                result = await func(*args, **kwargs)
+                _record_result(current, result)
+                return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__, "tool", request_bytes=_payload_bytes(_arguments(func, signature, args, kwargs))) as current:
+            result = func(*args, **kwargs)
+            _record_result(current, result)
+            return result
+    return wrapper
+
+
+def lazy_tools(module_name: str, functions: Dict[str, Callable]) -> Callable[[str], Any]:
+    """
+    Module-level __getattr__ for a module exposing tools: the FunctionTool for each name in `functions`
+    (tool name -> traced function) is built on first access and stored on the module, so importing the
+    module does not load google.adk. Use as `__getattr__ = lazy_tools(__name__, {...})`.
+    """
+    def __getattr__(name: str):
+        if name in functions:
+            from google.adk.tools import FunctionTool
+
+            tool = FunctionTool(func=traced_tool(functions[name]))
+            setattr(sys.modules[module_name], name, tool)
+            return tool
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+    return __getattr__
+
+
+def _traced_agent_tool_class():
+    from google.adk.tools.agent_tool import AgentTool
+
+    class TracedAgentTool(AgentTool):
+        """AgentTool whose sub-agent runs inside an "agent_tool" span; spans from nested tools and models become its children."""
+
+        async def run_async(self, *, args: Dict[str, Any], tool_context) -> Any:
+            with span(self.name, "agent_tool", request_bytes=_payload_bytes(args)) as current:
+                result = await super().run_async(args=args, tool_context=tool_context)
+                _record_result(current, result)
+                return result
+
+    TracedAgentTool.__module__ = __name__
+    return TracedAgentTool
+
+
+# (invocation ID, agent name) -> span of the model call in progress
+_model_spans: Dict[Tuple[str, str], Span] = {}
+_model_spans_lock = threading.Lock()
+
+
+def before_model_span(callback_context, llm_request) -> None:
+    """before_model_callback that opens a "model" span for the agent's LLM call (including built-in google_search)."""
+    current = _new_span(f"model:{callback_context.agent_name}", "model",
+                        {"model": getattr(llm_request, "model", None), "contents": len(getattr(llm_request, "contents", None) or [])})
+    with _model_spans_lock:
+        _model_spans[(callback_context.invocation_id, callback_context.agent_name)] = current
+    return None
+
+
+def _pop_model_span(callback_context) -> Optional[Span]:
+    with _model_spans_lock:
+        return _model_spans.pop((callback_context.invocation_id, callback_context.agent_name), None)
+
+
+def after_model_span(callback_context, llm_response) -> None:
+    """after_model_callback that closes the span opened by before_model_span."""
+    current = _pop_model_span(callback_context)
+    if current is None:
+        return None
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        current.set(prompt_tokens=getattr(usage, "prompt_token_count", None),
+                    response_tokens=getattr(usage, "candidates_token_count", None))
+    if getattr(llm_response, "error_code", None):
+        current.fail(getattr(llm_response, "error_message", None) or llm_response.error_code)
+    _finish(current)
+    return None
+
+
+def model_error_span(callback_context, llm_request, error: Exception) -> None:
+    """
+    on_model_error_callback that closes the span of a model call that raised as failed; after_model_callback
+    does not run then. Returns None, so the error still propagates.
+    """
+    current = _pop_model_span(callback_context)
+    if current is not None:
+        current.fail(error)
+        _finish(current)
+    return None
+
+
+def __getattr__(name: str):
+    # TracedAgentTool subclasses google.adk's AgentTool, so it is only defined once something asks for it
+    if name == "TracedAgentTool":
+        globals()["TracedAgentTool"] = cls = _traced_agent_tool_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,8 @@
 # In this file I will utilize a langchain deepagnet  to generate trip plans based on user input.
-import os
 from typing import Literal
-from tavily import TavilyClient
 from deepagents import create_deep_agent
-
-tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+from my_agent.context import compact_results
+from my_agent.search import search
 
 def internet_search(
     query: str,
@@ -13,12 +11,14 @@ def internet_search(
     include_raw_content: bool = False,
 ):
     """Run a web search"""
-    return tavily_client.search(
+    results = search(
         query,
         max_results=max_results,
         include_raw_content=include_raw_content,
         topic=topic,
     )
+    # Raw page content is stripped of boilerplate and packed into the context token budget
+    return compact_results(results, query).text
 
 research_instructions = " Generate a detailed trip in between {day_1} and {day_2} for a traveler interested in {interests}. Include activities, places to visit, and dining options. " \
 "Find a suitable location that satisfied the user's interests. Provide a day-wise breakdown of the trip plan. Give an estimate of the budget give {budget} "